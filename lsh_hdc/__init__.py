@@ -8,6 +8,7 @@ import re
 import sys
 import random
 import collections
+import numpy as np
 from math import log1p
 from operator import itemgetter
 from heapq import nsmallest
@@ -16,13 +17,15 @@ from itertools import imap, izip, islice, chain, combinations
 from abc import abstractmethod
 from pymaptools.iter import cycle, take, shinglify, isiterable
 from lsh_hdc.utils import wrap_scalar, tsorted, fill_with_last
-from lsh_hdc.ext import hashable, VarlenHash, PHashCombiner as HashCombiner
+from lsh_hdc.ext import hashable, VarlenHash, PHashCombiner as HashCombiner, \
+    MersenneHashFamily, simhash_from_words, hash_combine_boost_64, mix_hashes
 
 # Various hash functions
 from metrohash import metrohash64, metrohash128
 from cityhash import CityHash64WithSeed
 from xxh import hash64 as xxh_hash64
-from lsh_hdc.ext import hash_md5_64, hash_builtin_64
+from lsh_hdc.ext import hash_md5_64, hash_builtin_64, \
+    hash_md5_64_many, hash_builtin_64_many, hash_many_with
 
 chash64 = metrohash64
 chash128 = metrohash128
@@ -40,6 +43,143 @@ HASH_FUNC_TABLE = {
 }
 
 
+def create_hash_many(hashfun, complex_types=False):
+    """Create a batch version of a scalar hash function
+
+    :param hashfun: hash function of the form ``hashfun(value, seed)``
+    :type hashfun: callable
+    :param complex_types: whether hash function supports hashing of complex types
+    :type complex_types: bool
+    :returns: a function of the form ``hash_many(values, seed=0)`` returning
+              an array of 64-bit hashes
+    :rtype: callable
+    """
+    def hash_many(values, seed=0):
+        return hash_many_with(hashfun, values, seed, complex_types)
+    return hash_many
+
+
+# batch versions of functions in HASH_FUNC_TABLE, compiled where possible
+HASH_MANY_TABLE = {
+    name: create_hash_many(hashfun, complex_types)
+    for name, (hashfun, complex_types) in HASH_FUNC_TABLE.iteritems()
+}
+HASH_MANY_TABLE.update({
+    "builtin":   hash_builtin_64_many,
+    "md5":       hash_md5_64_many,
+})
+
+
+def hash_many(values, seed=0, hashfun='metrohash'):
+    """Hash a sequence of values into an array of 64-bit integers
+
+    Gives the same values as applying ``HASH_FUNC_TABLE[hashfun]`` to each
+    value (after ``hashable`` conversion where needed).
+
+    :param values: a sequence of values (usually strings) to hash
+    :type values: collections.Sequence
+    :param seed: hash seed
+    :type seed: int
+    :param hashfun: name of a hash function in ``HASH_FUNC_TABLE``
+    :type hashfun: str
+    :returns: an array of 64-bit hashes
+    :rtype: numpy.ndarray
+
+    ::
+
+        >>> hash_many(['a', 'b'], seed=1, hashfun='md5').dtype
+        dtype('uint64')
+    """
+    return HASH_MANY_TABLE[hashfun](values, seed)
+
+
+def hash_wide_many(values, bits, seed=0, hashfun='metrohash'):
+    """Hash a sequence of values into wide hashes made of 64-bit words
+
+    Each word is produced by a differently seeded batch hash function.
+
+    :param values: a sequence of values to hash
+    :type values: collections.Sequence
+    :param bits: number of bits in each hash
+    :type bits: int
+    :param seed: hash seed
+    :type seed: int
+    :param hashfun: name of a hash function in ``HASH_FUNC_TABLE``
+    :type hashfun: str
+    :returns: a matrix of shape (len(values), ceil(bits / 64)), with least
+              significant words first
+    :rtype: numpy.ndarray
+
+    ::
+
+        >>> hash_wide_many(['a', 'b', 'c'], 256, hashfun='md5').shape
+        (3, 4)
+    """
+    num_words = (bits + 63) // 64
+    hash_fun = HASH_MANY_TABLE[hashfun]
+    result = np.empty((len(values), num_words), dtype=np.uint64)
+    for word_idx in xrange(num_words):
+        result[:, word_idx] = hash_fun(
+            values, hash_combine_boost_64(seed, word_idx))
+    if bits % 64:
+        result[:, -1] &= np.uint64((1 << (bits % 64)) - 1)
+    return result
+
+
+def words_to_long(words):
+    """Combine 64-bit words (least significant first) into an integer
+
+    ::
+
+        >>> words_to_long([1, 1])
+        18446744073709551617L
+    """
+    return sum(long(word) << (64 * idx) for idx, word in enumerate(words))
+
+
+class FeatureHashContext(object):
+    """Per-document cache of 64-bit base hashes of features
+
+    Features seen more than once while processing a document (for example,
+    shingles produced by both the key shingler and the sketch shingler) are
+    hashed only once. Signers derive their own seeded variants from base
+    hashes by mixing.
+
+    ::
+
+        >>> ctx = FeatureHashContext(hashfun='md5')
+        >>> hashes = ctx.hash_features([('a', 'b'), ('b', 'c'), ('a', 'b')])
+        >>> hashes[0] == hashes[2], len(ctx)
+        (True, 2)
+    """
+    def __init__(self, hashfun='metrohash'):
+        self.hashfun = hashfun
+        self.hash_many = HASH_MANY_TABLE[hashfun]
+        self._cache = {}
+
+    def __len__(self):
+        return len(self._cache)
+
+    def reset(self):
+        """Forget hashes (call before processing a new document)
+        """
+        self._cache.clear()
+
+    def hash_features(self, features):
+        """Return an array of base hashes for a sequence of features
+
+        :param features: a sequence of hashable features
+        :type features: collections.Sequence
+        :rtype: numpy.ndarray
+        """
+        cache = self._cache
+        missing = [feature for feature in set(features) if feature not in cache]
+        if missing:
+            cache.update(izip(missing, self.hash_many(missing, 0).tolist()))
+        return np.fromiter(imap(cache.__getitem__, features), dtype=np.uint64,
+                           count=len(features))
+
+
 def mshinglify(iterable, span, skip=0):
     """Same as shinglify except repeatedly mask one word
 
@@ -418,11 +558,41 @@ class MinHashSignature(Signature):
     """Obtain minhash signature"""
 
     def __init__(self, width, lsh_hasher=None, universe_size=None, kmin=1,
-                 seed=0, hashfun='metrohash'):
+                 seed=0, hashfun='metrohash', permutations='hashfun'):
+        """
+        :param width: Signature width (number of minhashes)
+        :type width: int
+        :param lsh_hasher: LSH hasher to apply to minhashes
+        :type lsh_hasher: LSHC
+        :param universe_size: A prime number of size close to token universe
+                              cardinality
+        :type universe_size: long
+        :param kmin: Number of minimal values to take from each permutation
+        :type kmin: int
+        :param seed: Random seed
+        :type seed: int
+        :param hashfun: Name of hash function in HASH_FUNC_TABLE
+        :type hashfun: str
+        :param permutations: How to obtain ``width`` random permutations of
+                             features. With ``hashfun``, each feature is
+                             hashed by ``width`` differently seeded versions
+                             of the hash function. With ``universal``, each
+                             feature is hashed once and the hash is permuted
+                             by a compiled family of universal hash functions
+                             (faster, but gives different minhash values).
+                             Either way, signatures can also be computed from
+                             base feature hashes (see
+                             ``get_signature_from_hashes``)
+        :type permutations: str
+        """
         if width % kmin != 0:
             raise ValueError("width must be a multiple of kmin")
+        if permutations not in ('hashfun', 'universal'):
+            raise ValueError("Unknown permutation source: '%s'" % permutations)
         if type(kmin) != int:
             raise TypeError("kmin must be an integer")
+        elif permutations == 'universal':
+            self._get_minhashes = self._get_minhashes_universal
         elif kmin > 1:
             self._get_minhashes = self._get_minhashes_kmin1p
         elif kmin == 1:
@@ -433,6 +603,10 @@ class MinHashSignature(Signature):
         self.kmin = kmin
         self.hashfun, self.complex_types = HASH_FUNC_TABLE[hashfun]
 
+        self.hashfun_name = hashfun
+        self.hash_many = HASH_MANY_TABLE[hashfun]
+        self.permutations = permutations
+
         self.lsh_hasher = lsh_hasher
         self.seed = seed
         self.universe_size = universe_size
@@ -441,7 +615,14 @@ class MinHashSignature(Signature):
         self._simhash_sketcher = None
         self._sketch_weights = None
 
-        self.hashes = self.create_hash_functions()
+        if permutations == 'universal':
+            self.hashes = None
+            self.hash_seeds = None
+            self.hash_family = MersenneHashFamily(self.width, seed=seed)
+        else:
+            self.hash_seeds = self.create_hash_seeds()
+            self.hashes = self.create_hash_functions()
+            self.hash_family = None
 
     def configure_sketcher(self, sketch_type='minhash', sketch_size=None,
                            sketch_base=1.414):
@@ -488,12 +669,17 @@ class MinHashSignature(Signature):
         indices, classes = consistent_sampler(pool_len, self.kmin, sketch_size)
         return indices, classes
 
-    def create_hash_functions(self):
-        """Return a list of length self.width of different hash functions
+    def create_hash_seeds(self):
+        """Return a list of length self.width of different hash seeds
         """
         # draw a sample of unique random integers from pool of [0, sys.maxint]
         random.seed(self.seed)
-        seeds = random.sample(xrange(sys.maxint), self.width)
+        return random.sample(xrange(sys.maxint), self.width)
+
+    def create_hash_functions(self):
+        """Return a list of length self.width of different hash functions
+        """
+        seeds = self.create_hash_seeds()
         hash_factory = create_hash_factory(
             self.hashfun,
             complex_types=self.complex_types,
@@ -530,6 +716,55 @@ class MinHashSignature(Signature):
             sig_fun = lambda f: f("")
         return map(sig_fun, self.hashes)
 
+    def _get_minhashes_universal(self, vec):
+        """Returns minhash signature from a feature vector
+
+        Hashes each feature once and uses a universal hash family to produce
+        permutations.
+
+        :returns: a signature vector
+        :rtype: list
+        """
+        return self._minhashes_from_hashes(self.hash_many(list(vec), 0))
+
+    def _hashn_from_hashes(self, base_hashes):
+        """Returns a matrix of shape (len(base_hashes), self.width) holding
+        one permuted hash per feature and permutation
+        """
+        if self.hash_family is not None:
+            return self.hash_family.hashn_many(base_hashes)
+        # seeded variants of base hashes, one per hash function seed
+        hashes = np.empty((len(base_hashes), self.width), dtype=np.uint64)
+        for idx, seed in enumerate(self.hash_seeds):
+            hashes[:, idx] = mix_hashes(base_hashes, seed)
+        return hashes
+
+    def _minhashes_from_hashes(self, base_hashes):
+        """Returns minhash signature from an array of base feature hashes
+        """
+        if len(base_hashes) == 0:
+            # support empty sets by treating them as empty strings
+            base_hashes = self.hash_many([""], 0)
+        kmin = self.kmin
+        if kmin == 1 and self.hash_family is not None:
+            minhashes = self.hash_family.min_hashes(base_hashes)
+        elif kmin == 1:
+            minhashes = self._hashn_from_hashes(base_hashes).min(axis=0)
+        else:
+            hashes = self._hashn_from_hashes(base_hashes)
+            num_features = len(hashes)
+            if num_features > kmin:
+                hashes = np.partition(hashes, kmin - 1, axis=0)[:kmin]
+            hashes.sort(axis=0)
+            if num_features < kmin:
+                hashes = np.vstack(
+                    [hashes, np.repeat(hashes[-1:], kmin - num_features, axis=0)])
+            # k smallest values of first function, then of second, etc.
+            minhashes = hashes.T.ravel()
+        if self.universe_size is not None:
+            minhashes %= self.universe_size
+        return minhashes.tolist()
+
     @staticmethod
     def _minhash_sketch(minhash_sample):
         bits = (1 & minhash for minhash in minhash_sample)
@@ -543,6 +778,27 @@ class MinHashSignature(Signature):
         :rtype: list
         """
         minhashes = self._get_minhashes(vec)
+        return self._signature_from_minhashes(minhashes, with_sketch)
+
+    def get_signature_from_hashes(self, base_hashes, with_sketch=False):
+        """Returns minhash signature from base feature hashes
+
+        With ``universal`` permutations, gives the same result as
+        ``get_signature`` if hashes were obtained from a
+        ``FeatureHashContext`` with the same hash function. With ``hashfun``
+        permutations, each seeded hash of a feature is derived by mixing its
+        base hash with the seed, so results differ from those of
+        ``get_signature``.
+
+        :param base_hashes: an array of 64-bit base hashes of features
+        :type base_hashes: numpy.ndarray
+        :returns: a signature vector
+        :rtype: list
+        """
+        minhashes = self._minhashes_from_hashes(base_hashes)
+        return self._signature_from_minhashes(minhashes, with_sketch)
+
+    def _signature_from_minhashes(self, minhashes, with_sketch=False):
         lsh = self.lsh_hasher
         if lsh is None:
             sig_vector = ["{}:{}".format(idx, minhash)
@@ -572,9 +828,11 @@ class MinHashSignature(Signature):
 
 class MinHashSketchSignature(MinHashSignature):
 
-    def __init__(self, width=64, universe_size=None, kmin=1, seed=0):
+    def __init__(self, width=64, universe_size=None, kmin=1, seed=0,
+                 permutations='hashfun'):
         MinHashSignature.__init__(self, width, universe_size=universe_size,
-                                  kmin=kmin, seed=seed)
+                                  kmin=kmin, seed=seed,
+                                  permutations=permutations)
         self._actual_width = width
         self.configure_sketcher(sketch_type='minhash', sketch_size=width)
 
@@ -583,23 +841,42 @@ class MinHashSketchSignature(MinHashSignature):
         minhash_sample = self._sketch_getter(minhashes)
         return self._minhash_sketch(minhash_sample)
 
+    def get_signature_from_hashes(self, base_hashes, weights=None):
+        """Returns minhash sketch from base feature hashes
+
+        Weights are accepted for interface compatibility with
+        ``SimHashSignature`` and ignored.
+        """
+        minhashes = self._minhashes_from_hashes(base_hashes)
+        minhash_sample = self._sketch_getter(minhashes)
+        return self._minhash_sketch(minhash_sample)
+
 
 class SimHashSignature(Signature):
 
-    def __init__(self, bit_depth=64, seed=0, hashfun_map=((64, chash64), (128, chash128))):
+    def __init__(self, bit_depth=64, seed=0, hashfun_map=((64, chash64), (128, chash128)),
+                 wide_hashfun='metrohash'):
         """
         :param bit_depth: Length of binary vector (bit resolution)
         :type bit_depth: int
+        :param wide_hashfun: Name of batch hash function used to build hashes
+                             wider than any in ``hashfun_map``
+        :type wide_hashfun: str
         """
         self.bits = range(bit_depth)
+        self.bit_depth = bit_depth
         self.seed = seed
+        self._num_words = (bit_depth + 63) // 64
+        self.wide_hashfun = None
 
         for key_bits, val_fun in hashfun_map:
             if bit_depth <= key_bits:
                 self.hashfun = lambda value, seed=0: val_fun(hashable(value), seed)
                 break
         else:
-            self.hashfun = VarlenHash(bit_depth)
+            self.wide_hashfun = wide_hashfun
+            self.hashfun = lambda value, seed=0: words_to_long(
+                hash_wide_many([value], bit_depth, seed, wide_hashfun)[0])
 
     def create_hash_functions(self):
         raise NotImplementedError
@@ -624,13 +901,42 @@ class SimHashSignature(Signature):
         token_weights = (log1p(sum(imap(len, token))) for token in tokens)
         if features:
             features, feature_weights = izip(*features)
-            fin_features = (hashfun(feature, seed)
-                            for feature in chain(tokens, features))
+            fin_features = chain(tokens, features)
             fin_weights = chain(token_weights, feature_weights)
         else:
-            fin_features = (hashfun(feature, seed) for feature in tokens)
+            fin_features = tokens
             fin_weights = token_weights
-        return self._sig_with_weights(fin_features, fin_weights)
+        if self.wide_hashfun is not None:
+            fin_features = list(fin_features)
+            words = hash_wide_many(fin_features, self.bit_depth, seed,
+                                   self.wide_hashfun)
+            weights = np.fromiter(fin_weights, dtype=np.float64,
+                                  count=len(fin_features))
+            return simhash_from_words(words, np.log1p(weights), self.bit_depth)
+        hashed_features = (hashfun(feature, seed) for feature in fin_features)
+        return self._sig_with_weights(hashed_features, fin_weights)
+
+    def get_signature_from_hashes(self, base_hashes, weights):
+        """Weighted SimHash signature from base feature hashes
+
+        Each 64-bit word of a feature hash is derived from the base hash by
+        mixing it with a word-specific seed, so results differ from those of
+        ``get_signature``.
+
+        :param base_hashes: an array of 64-bit base hashes of features
+        :type base_hashes: numpy.ndarray
+        :param weights: an array of feature weights
+        :type weights: numpy.ndarray
+        :return: SimHash signature
+        :rtype: long
+        """
+        num_words = self._num_words
+        words = np.empty((len(base_hashes), num_words), dtype=np.uint64)
+        for word_idx in xrange(num_words):
+            words[:, word_idx] = mix_hashes(
+                base_hashes, hash_combine_boost_64(self.seed, word_idx))
+        weights = np.log1p(np.asarray(weights, dtype=np.float64))
+        return simhash_from_words(words, weights, self.bit_depth)
 
     def _sig_with_weights(self, hashed_features, feature_weights):
         """SimHash signature from a list of hashes and corresponding weights
@@ -641,19 +947,16 @@ class SimHashSignature(Signature):
                                 meaning feature not considered)
         :type feature_weights: collections.Iterable
         """
-        bits = self.bits
-        bit_depth = len(bits)
-        mod_base = 1 << bit_depth
-        vec = [0] * bit_depth
-        for feature, weight in izip(hashed_features, feature_weights):
-            scaled_weight = log1p(weight)
-            mod_feature = feature % mod_base
-            for i in bits:
-                if mod_feature & (1 << i):
-                    vec[i] += scaled_weight
-                else:
-                    vec[i] -= scaled_weight
-        return sum(1 << i for i in bits if vec[i] > 0)
+        pairs = list(izip(hashed_features, feature_weights))
+        num_words = self._num_words
+        words = np.empty((len(pairs), num_words), dtype=np.uint64)
+        weights = np.empty(len(pairs), dtype=np.float64)
+        word_mask = (1 << 64) - 1
+        for idx, (feature, weight) in enumerate(pairs):
+            weights[idx] = weight
+            for word_idx in xrange(num_words):
+                words[idx, word_idx] = (feature >> (64 * word_idx)) & word_mask
+        return simhash_from_words(words, np.log1p(weights), self.bit_depth)
 
 
 class LSHC(object):
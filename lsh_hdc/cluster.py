@@ -1,13 +1,18 @@
 import operator
+import numpy as np
+from array import array
 from math import floor
 from functools import partial
-from itertools import imap
-from collections import defaultdict, Counter
+from collections import defaultdict
 from pymaptools.unionfind import UnionFind
 from pymaptools.bitwise import hamming
 from lsh_hdc.preprocess import RegexTokenizer
+from lsh_hdc.store import ShingleStore
+from lsh_hdc.components import DiskComponents
+from math import log1p
+from itertools import imap
 from lsh_hdc import Shingler, SimHashSignature, MinHashSketchSignature, \
-    MinHashSignature, LSHC
+    MinHashSignature, LSHC, FeatureHashContext
 from logging import getLogger
 
 LOG = getLogger(__name__)
@@ -18,6 +23,42 @@ OPERATOR_MAP = {
 }
 
 
+def count_support(id_arrays, min_support=1):
+    """Count occurrences of integer ids across arrays
+
+    Concatenates the arrays, sorts them, and counts runs of equal ids.
+
+    :param id_arrays: a sequence of integer arrays (or buffers)
+    :type id_arrays: list
+    :param min_support: minimum count for an id to be returned
+    :type min_support: int
+    :returns: a tuple of arrays of unique ids and their counts
+    :rtype: tuple
+
+    ::
+
+        >>> ids, counts = count_support([[3, 1], [1, 2], [1, 3]], 2)
+        >>> ids.tolist(), counts.tolist()
+        ([1, 3], [3, 2])
+
+    """
+    ids = np.concatenate(id_arrays)
+    num_ids = len(ids)
+    if num_ids == 0:
+        return ids, ids
+    ids.sort()
+    is_start = np.empty(num_ids, dtype=bool)
+    is_start[0] = True
+    np.not_equal(ids[1:], ids[:-1], out=is_start[1:])
+    starts = np.flatnonzero(is_start)
+    counts = np.diff(np.append(starts, num_ids))
+    ids = ids[starts]
+    if min_support > 1:
+        mask = counts >= min_support
+        ids, counts = ids[mask], counts[mask]
+    return ids, counts
+
+
 class Cluster(object):
     """Clusters sets with Jaccard similarity above threshold with high
     probability.
@@ -26,18 +67,90 @@ class Cluster(object):
     1. Generate set signature
     2. Use LSH to map similar signatures to same buckets
     3. Use UnionFind to merge buckets containing same values
+
+    If ``verify_threshold`` is set, an optional step is added before 3:
+    candidate pairs are merged only if exact Jaccard similarity of their
+    features is at least equal to the threshold. Each pair is verified at
+    most once.
     """
     def __init__(self, signer=None, sketch_dist_fn=None, max_dist=0,
                  min_support=1, sketch_operator=operator.__and__,
-                 sketch_bits=0):
-        self.union_find = UnionFind()
+                 sketch_bits=0, verify_threshold=None, store=None,
+                 union_find=None):
+        self.union_find = UnionFind() if union_find is None else union_find
         self.signer = signer
-        self.buckets = defaultdict(dict)
+        self.buckets = defaultdict(partial(array, 'l'))
+        # members of buckets that labels were added to more than once
+        self._bucket_members = {}
+        self.sketches = []
+        if isinstance(union_find, DiskComponents):
+            # share dense label ids with external-memory components
+            self.labels = union_find.node_labels
+            self._label_ids = union_find.label_ids
+        else:
+            self.labels = []
+            self._label_ids = {}
         self.sketch_dist_fn = sketch_dist_fn
         self.sketch_bits = sketch_bits
         self.max_dist = max_dist
         self.min_support = min_support
         self.sketch_operator = sketch_operator
+        self.verify_threshold = verify_threshold
+        if verify_threshold is not None and store is None:
+            store = ShingleStore()
+        self.store = store
+        self._verified = {}
+
+    def _is_verified(self, label1, label2):
+        """Check (and cache) whether two labels pass exact verification
+        """
+        store = self.store
+        idx1 = store.labels[label1]
+        idx2 = store.labels[label2]
+        pair = (idx1, idx2) if idx1 < idx2 else (idx2, idx1)
+        verified = self._verified
+        result = verified.get(pair)
+        if result is None:
+            result = store.jaccard(label1, label2) >= self.verify_threshold
+            verified[pair] = result
+        return result
+
+    def _get_label_id(self, label, sketch):
+        """Map label to an integer id and record its latest sketch
+
+        :returns: a tuple of label id and whether the label is new
+        :rtype: tuple
+        """
+        label_ids = self._label_ids
+        label_id = label_ids.get(label)
+        if label_id is None:
+            label_id = label_ids[label] = len(self.labels)
+            self.labels.append(label)
+            self.sketches.append(sketch)
+            return label_id, True
+        self.sketches[label_id] = sketch
+        return label_id, False
+
+    def _add_to_bucket(self, key, label_id, is_new):
+        """Append label id to a bucket unless it is already there
+
+        :returns: the bucket
+        :rtype: array.array
+        """
+        bucket = self.buckets[key]
+        members = self._bucket_members.get(key)
+        if is_new and members is None:
+            # a new label can only be in a bucket already if keys repeat
+            if not bucket or bucket[-1] != label_id:
+                bucket.append(label_id)
+            return bucket
+        if members is None:
+            # label added again: index members of this bucket once
+            members = self._bucket_members[key] = set(bucket)
+        if label_id not in members:
+            members.add(label_id)
+            bucket.append(label_id)
+        return bucket
 
     def _closeness_measure(self, sketch):
         min_support = self.min_support
@@ -52,12 +165,41 @@ class Cluster(object):
                 logical_op(support >= min_support,
                            distance_from(matched_sketch) <= max_dist)
 
-    def add_item(self, item, label=None, sketch=None):
+    def _store_features(self, label, features=None, feature_hashes=None):
+        """Store features (or their hashes) of a label for verification
+        """
+        if feature_hashes is not None:
+            self.store.add_hashes(label, feature_hashes)
+        elif features is not None:
+            self.store.add(label, features)
+        else:
+            raise ValueError("features required when verification is enabled")
+
+    def add_item(self, item, label=None, sketch=None, features=None,
+                 feature_hashes=None):
+        """Add an item (or a sequence of LSH keys if no signer is set)
+
+        :param features: features used for exact verification (only needed
+                         if verification is enabled and no signer is set, as
+                         otherwise ``item`` is used)
+        :type features: collections.Iterable
+        :param feature_hashes: precomputed 64-bit feature hashes to use for
+                               verification instead of ``features``
+        :type feature_hashes: numpy.ndarray
+        """
         # Set default label for this set
         if label is None:
             label = item
 
-        # Add to union-find structure
+        # Store features for verification
+        verify = self.store is not None
+        if verify:
+            if features is None and self.signer is not None:
+                features = item
+            self._store_features(label, features, feature_hashes)
+
+        # Register label (before union-find structure, which may share ids)
+        label_id, is_new = self._get_label_id(label, sketch)
         union_find = self.union_find
         union_find.__getitem__(label)
 
@@ -66,45 +208,70 @@ class Cluster(object):
             if self.signer is None \
             else self.signer.get_signature(item)
 
-        # Unite labels with same LSH keys
-        counter = Counter()
-        sketches = dict()
-        for bucket in imap(self.buckets.__getitem__, keys):
-            bucket[label] = sketch
-            counter.update(bucket.keys())
-            sketches.update(bucket)
+        # Add label to buckets corresponding to LSH keys
+        matched_buckets = [self._add_to_bucket(key, label_id, is_new)
+                           for key in keys]
+        if not matched_buckets:
+            return
+
+        # Buckets are only viewed after all of them have been appended to
+        matched_buckets = [np.frombuffer(bucket, dtype=np.int_)
+                           for bucket in matched_buckets]
 
+        # Count support of labels sharing buckets. When sketch similarity
+        # alone can be sufficient, labels below min support are kept
+        min_support = self.min_support \
+            if sketch is None or self.sketch_operator is operator.__and__ \
+            else 1
+        matched_ids, supports = count_support(matched_buckets, min_support)
+
+        # Unite labels with same LSH keys
+        labels = self.labels
+        sketches = self.sketches
         is_close = self._closeness_measure(sketch)
-        for matched_label, support in counter.iteritems():
-            if matched_label != label and \
-                    is_close(support, sketches[matched_label]):
-                union_find.union(matched_label, label)
+        for matched_id, support in zip(matched_ids.tolist(), supports.tolist()):
+            if matched_id != label_id and \
+                    is_close(support, sketches[matched_id]):
+                matched_label = labels[matched_id]
+                if not verify or self._is_verified(matched_label, label):
+                    union_find.union(matched_label, label)
 
-    def add_key(self, key, label=None, sketch=None):
+    def add_key(self, key, label=None, sketch=None, features=None,
+                feature_hashes=None):
         """Add one LSH key only (with associated info).
 
         Cannot use min_support in this case (it is always equal to one).
+        If verification is enabled, either ``features`` or ``feature_hashes``
+        must be given (see ``add_item``).
 
         """
         # Set default label for this set
         if label is None:
             label = key
 
-        # Add to union-find structure
+        # Store features for verification
+        verify = self.store is not None
+        if verify:
+            self._store_features(label, features, feature_hashes)
+
+        # Register label (before union-find structure, which may share ids)
+        label_id, is_new = self._get_label_id(label, sketch)
         union_find = self.union_find
         union_find.__getitem__(label)
 
         # Unite labels with same LSH keys
-        bucket = self.buckets[key]
-        bucket[label] = sketch
+        bucket = self._add_to_bucket(key, label_id, is_new)
 
+        labels = self.labels
+        sketches = self.sketches
         is_close = self._closeness_measure(sketch)
-        for matched_label in bucket.keys():
-            if matched_label != label:
-                matched_sketch = bucket[matched_label]
+        for matched_id in bucket:
+            if matched_id != label_id:
                 # Note: large improvement in precision when also ensuring that
                 # distance > 0 below:
-                if is_close(matched_sketch):
+                matched_label = labels[matched_id]
+                if is_close(1, sketches[matched_id]) and \
+                        (not verify or self._is_verified(matched_label, label)):
                     union_find.union(matched_label, label)
 
     def get_clusters(self):
@@ -117,7 +284,8 @@ class Cluster(object):
 
 class MinHashCluster(Cluster):
     def __init__(self, width=12, bandwidth=3, lsh_scheme="a0",
-                 universe_size=None, kmin=1, seed=0, hashfun='metrohash'):
+                 universe_size=None, kmin=1, seed=0, hashfun='metrohash',
+                 verify_threshold=None, permutations='hashfun'):
         """
 
         :param width: Number of bands
@@ -129,6 +297,12 @@ class MinHashCluster(Cluster):
         :param universe_size: A prime number of size close to token universe
                               cardinality
         :type universe_size: long
+        :param verify_threshold: If set, only merge candidates whose exact
+                                 Jaccard similarity is at or above threshold
+        :type verify_threshold: float
+        :param permutations: Permutation source for minhashing (see
+                             ``MinHashSignature``)
+        :type permutations: str
         """
         lsh_hasher = LSHC(bandwidth, width=width, scheme=lsh_scheme) \
             if bandwidth > 1 \
@@ -138,8 +312,14 @@ class MinHashCluster(Cluster):
                                   universe_size=universe_size,
                                   kmin=kmin,
                                   seed=seed,
-                                  hashfun=hashfun)
-        super(MinHashCluster, self).__init__(signer=signer)
+                                  hashfun=hashfun,
+                                  permutations=permutations)
+        store = None \
+            if verify_threshold is None \
+            else ShingleStore(hashfun=hashfun, seed=seed)
+        super(MinHashCluster, self).__init__(signer=signer,
+                                             verify_threshold=verify_threshold,
+                                             store=store)
 
 
 class SketchModel(object):
@@ -154,14 +334,114 @@ def get_default_shingler(**opts):
     return shingler
 
 
+class FeaturePipeline(object):
+    """Compute LSH keys and an optional sketch for a tokenized document
+
+    Each distinct feature of a document is hashed only once (through a
+    ``FeatureHashContext``), and signers derive what they need from the
+    resulting base hashes. Only sketch signers that cannot work from base
+    hashes (if any) hash features on their own. Note that with ``hashfun``
+    permutations, signatures differ from those of ``get_signature``.
+    """
+    def __init__(self, shingler, signer, sketch_shingler=None,
+                 sketch_signer=None, with_sketch=False):
+        """
+        :param shingler: shingler for LSH keys
+        :type shingler: Shingler
+        :param signer: signer for LSH keys
+        :type signer: MinHashSignature
+        :param sketch_shingler: shingler for sketches (if None, sketches
+                                are derived from key signature)
+        :type sketch_shingler: Shingler
+        :param sketch_signer: signer for sketches
+        :type sketch_signer: SimHashSignature, MinHashSketchSignature
+        :param with_sketch: whether to compute sketches
+        :type with_sketch: bool
+        """
+        self.shingler = shingler
+        self.signer = signer
+        self.sketch_shingler = sketch_shingler
+        self.sketch_signer = sketch_signer
+        self.with_sketch = with_sketch
+
+        self.hash_once = hasattr(signer, 'get_signature_from_hashes')
+        self.context = FeatureHashContext(signer.hashfun_name) \
+            if self.hash_once \
+            else None
+        self.sketch_hash_once = self.hash_once and \
+            hasattr(sketch_signer, 'get_signature_from_hashes')
+
+    def _sketch_from_shingles(self, content_tokens):
+        sketch_features = self.sketch_shingler.get_shingles(content_tokens)
+        if not self.sketch_hash_once:
+            return self.sketch_signer.get_signature(sketch_features)
+        weights = [log1p(sum(imap(len, feature))) for feature in sketch_features]
+        base_hashes = self.context.hash_features(sketch_features)
+        return self.sketch_signer.get_signature_from_hashes(base_hashes, weights)
+
+    def __call__(self, content_tokens, prefix=None, with_hashes=False):
+        """Return a tuple of LSH keys and sketch (or None)
+
+        :param content_tokens: a list of tokens
+        :type content_tokens: list
+        :param prefix: prefix for key shingles
+        :param with_hashes: also return base hashes of key shingles (e.g.
+                            for exact verification)
+        :type with_hashes: bool
+        :rtype: tuple
+        """
+        if with_hashes and not self.hash_once:
+            raise ValueError("signer does not work from base hashes")
+        signer = self.signer
+        features = self.shingler.get_shingles(content_tokens, prefix=prefix)
+        with_shingled_sketch = self.with_sketch and \
+            self.sketch_shingler is not None and self.sketch_signer is not None
+
+        if self.hash_once:
+            context = self.context
+            context.reset()
+            base_hashes = context.hash_features(features)
+            if self.with_sketch and not with_shingled_sketch:
+                keys, sketch = signer.get_signature_from_hashes(
+                    base_hashes, with_sketch=True)
+                return (keys, sketch, base_hashes) if with_hashes else (keys, sketch)
+            keys = signer.get_signature_from_hashes(base_hashes)
+        else:
+            if self.with_sketch and not with_shingled_sketch:
+                return signer.get_signature(features, with_sketch=True)
+            keys = signer.get_signature(features)
+
+        if with_shingled_sketch:
+            sketch = self._sketch_from_shingles(content_tokens)
+        else:
+            sketch = None
+        return (keys, sketch, base_hashes) if with_hashes else (keys, sketch)
+
+
 class HDClustering(object):
 
     def __init__(self, cfg, trace_every=0,
                  content_field='content',
                  get_body=None, get_label=None, get_prefix=None, min_support=None,
-                 seed=0, tokenizer=None):
+                 seed=0, tokenizer=None, tmpdir=None, external_memory=False,
+                 support_window=1000, verify_threshold=None):
 
-        """Read configuration"""
+        """Read configuration
+
+        If ``external_memory`` is set, connected components are computed on
+        disk (under ``tmpdir``). Call ``close`` (or use the instance as a
+        context manager) to remove temporary files afterwards.
+
+        ``support_window`` caps the number of candidate pairs emitted per
+        bucket by ``edge_reducer`` when ``min_support`` is greater than one
+        (see there); None removes the cap.
+
+        If ``verify_threshold`` is set (here or in config), candidates are
+        merged only if exact Jaccard similarity of their key shingles is at
+        or above threshold (see ``Cluster``). Base hashes of shingles are
+        taken from the feature pipeline. Verification applies to in-memory
+        clustering only, and map-reduce methods refuse to run with it.
+        """
         self.cfg = cfg
         self._get_body = get_body
         self._get_label = get_label
@@ -172,6 +452,10 @@ class HDClustering(object):
 
         # Set options
         self.min_support = cfg['min_support'] if min_support is None else min_support
+        self.support_window = support_window
+        self.verify_threshold = cfg.get('verify_threshold') \
+            if verify_threshold is None \
+            else verify_threshold
 
         # Tokenizer
         self.tokenizer = RegexTokenizer() if tokenizer is None else tokenizer
@@ -179,9 +463,11 @@ class HDClustering(object):
         # Configure minhash signer
         sig_width = cfg['sig_width']
         lsh_hasher = LSHC(width=sig_width, **cfg['lsh_options'])
+        permutations = cfg.get('permutations', 'hashfun')
         self.signer = MinHashSignature(sig_width,
                                        lsh_hasher=lsh_hasher,
-                                       kmin=cfg['kmin'])
+                                       kmin=cfg['kmin'],
+                                       permutations=permutations)
 
         # Configure shingler
         cfg_key_shingle = cfg['shingler']
@@ -192,6 +478,9 @@ class HDClustering(object):
         self.sketch_enabled = cfg_sketch['enabled']
         self.sketch_dist_fn = None
         self.max_dist = None
+        self.sketch_operator = operator.__and__
+        self.sketch_shingler = None
+        self.sketch_signer = None
         if self.sketch_enabled:
             algorithm_name = cfg_sketch['algorithm']
             try:
@@ -213,7 +502,8 @@ class HDClustering(object):
             elif sketch_algorithm == SketchModel.minhash:
                 del cfg_sketch_shingler['enabled']
                 self.sketch_shingler = Shingler(**cfg_sketch_shingler)
-                self.sketch_signer = MinHashSketchSignature(self.sketch_bits, seed=seed)
+                self.sketch_signer = MinHashSketchSignature(
+                    self.sketch_bits, seed=seed, permutations=permutations)
 
             self.sketch_shingler._tokenizer = None
 
@@ -222,12 +512,40 @@ class HDClustering(object):
                           (1.0 - float(cfg_sketch['resemblance']))))
             self.sketch_dist_fn = hamming
             self.sketch_operator = OPERATOR_MAP[cfg_sketch.get('operator', 'and')]
+        union_find = DiskComponents(tmpdir=tmpdir) \
+            if external_memory \
+            else None
+        self.pipeline = FeaturePipeline(
+            self.shingler, self.signer,
+            sketch_shingler=self.sketch_shingler,
+            sketch_signer=self.sketch_signer,
+            with_sketch=self.sketch_enabled)
+        store = None \
+            if self.verify_threshold is None \
+            else ShingleStore(hashfun=self.signer.hashfun_name)
         self.cluster_builder = Cluster(sketch_dist_fn=self.sketch_dist_fn,
                                        max_dist=self.max_dist,
                                        min_support=self.min_support,
-                                       sketch_operator=self.sketch_operator)
+                                       sketch_operator=self.sketch_operator,
+                                       verify_threshold=self.verify_threshold,
+                                       store=store,
+                                       union_find=union_find)
+
+    def close(self):
+        """Release resources held by the cluster builder (e.g. temporary
+        files of external-memory components)
+        """
+        close = getattr(self.cluster_builder.union_find, 'close', None)
+        if close is not None:
+            close()
+
+    def __enter__(self):
+        return self
 
-    def _map_iter(self, data):
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _map_iter(self, data, with_hashes=False):
         """Find clusters in an iterable"""
 
         get_body = self._get_body
@@ -239,52 +557,77 @@ class HDClustering(object):
             label = i if get_label is None else get_label(obj)
             prefix = None if get_prefix is None else get_prefix(obj)
 
-            for feat in self._map_item(obj, body, label, prefix):
+            for feat in self._map_item(obj, body, label, prefix, with_hashes):
                 yield feat
 
-    def _map_item(self, obj, body, label, prefix=None):
+    def _map_item(self, obj, body, label, prefix=None, with_hashes=False):
 
         # Extract features
         obj_content = self.get_content(obj)
         content_tokens = self.tokenizer.tokenize(obj_content)
 
-        features = self.shingler.get_shingles(content_tokens, prefix=prefix)
-        if self.sketch_enabled and (self.sketch_shingler is None or self.sketch_signer is None):
-            keys, sketch = self.signer.get_signature(features, with_sketch=True)
-        elif self.sketch_enabled and (self.sketch_shingler is not None and self.sketch_signer is not None):
-            keys = self.signer.get_signature(features)
-            sketch_features = self.sketch_shingler.get_shingles(content_tokens)
-            sketch = self.sketch_signer.get_signature(sketch_features)
+        if with_hashes:
+            keys, sketch, hashes = self.pipeline(
+                content_tokens, prefix=prefix, with_hashes=True)
+            yield (keys, (label, sketch), hashes)
         else:
-            keys = self.signer.get_signature(features)
-            sketch = None
-        yield (keys, (label, sketch))
+            keys, sketch = self.pipeline(content_tokens, prefix=prefix)
+            yield (keys, (label, sketch))
 
-    def clusters_from_iter(self, data):
-        """Find clusters in an iterable"""
+    def _build_from_iter(self, data):
+        """Add items from an iterable to cluster builder"""
 
         cluster_builder = self.cluster_builder
         trace_every = self.trace_every
-        for i, obj in enumerate(self._map_iter(data)):
+        verify = cluster_builder.store is not None
+        for i, obj in enumerate(self._map_iter(data, with_hashes=verify)):
             if trace_every > 0 and (not i % trace_every):
                 LOG.info("Processing line " + str(i))
 
-            keys, val = obj
+            keys, val = obj[:2]
+            hashes = obj[2] if verify else None
             label, sketch = val \
                 if isinstance(val, tuple) \
                 else (val, None)
-            cluster_builder.add_item(keys, label=label, sketch=sketch)
+            cluster_builder.add_item(keys, label=label, sketch=sketch,
+                                     feature_hashes=hashes)
+
+    def clusters_from_iter(self, data):
+        """Find clusters in an iterable"""
+        self._build_from_iter(data)
+        return self.cluster_builder.get_clusters()
+
+    def components_from_iter(self, data, fhandle):
+        """Find clusters in an iterable and stream them to a file handle
+
+        Writes tab-separated (label, component_id) lines instead of building
+        a list of clusters in memory. Requires ``external_memory`` option.
+        """
+        union_find = self.cluster_builder.union_find
+        if not isinstance(union_find, DiskComponents):
+            raise RuntimeError("external_memory option not enabled")
+        self._build_from_iter(data)
+        union_find.write_components(fhandle)
 
-        return cluster_builder.get_clusters()
+    def mapper(self, obj, default_label=None):
+        """Perform a mapper task in MR
 
-    def mapper(self, obj):
-        """Perform a mapper task in MR"""
+        If no label getter is configured, ``default_label`` is used as label,
+        or the object itself if ``default_label`` is None.
+        """
+        if self.verify_threshold is not None:
+            raise RuntimeError("verification not supported in map-reduce mode")
         get_body = self._get_body
         get_label = self._get_label
         get_prefix = self._get_prefix
 
         body = obj if get_body is None else get_body(obj)
-        label = obj if get_label is None else get_label(obj)
+        if get_label is not None:
+            label = get_label(obj)
+        elif default_label is not None:
+            label = default_label
+        else:
+            label = obj
         prefix = None if get_prefix is None else get_prefix(obj)
 
         for keys, val in self._map_item(obj, body, label, prefix):
@@ -309,3 +652,97 @@ class HDClustering(object):
 
         # create a dict mappipng a label to a sketch
         return key, dict(tuple_gen).items()
+
+    def combiner(self, key, tuple_gen):
+        """Perform a combiner task in MR (partial aggregation)
+
+        Removes duplicate labels so that fewer values are shuffled. Output
+        has the same form as input and can be combined again.
+        """
+        return key, dict(tuple_gen).items()
+
+    def _sketch_close(self, sketch1, sketch2):
+        if self.sketch_dist_fn is None:
+            return True
+        return self.sketch_dist_fn(sketch1, sketch2) <= self.max_dist
+
+    def _is_close(self, support, sketch_close):
+        if self.sketch_dist_fn is None:
+            return support >= self.min_support
+        return self.sketch_operator(support >= self.min_support, sketch_close)
+
+    def edge_reducer(self, key, tuple_gen):
+        """Perform a reducer task in MR, emitting edges instead of buckets
+
+        When ``min_support`` is 1, the labels in a bucket are split into
+        groups of labels with close sketches, and a star of edges from the
+        smallest label to every other label is emitted for each group, so
+        output grows linearly with bucket size. The resulting graph has
+        the same connected components as the one built by ``Cluster``.
+
+        When ``min_support`` is greater than 1, support can only be known
+        after all buckets are seen, so candidate pairs are emitted instead as
+        ``((label1, label2), sketch_close)`` to be aggregated by
+        ``support_reducer``. This is a deliberate exception to linear output:
+        support is a property of pairs, and a bucket of k labels yields up to
+        k * (k - 1) / 2 of them. To keep output of oversized buckets in check,
+        each label (in sorted order) is paired with at most
+        ``support_window`` labels following it, so that at most
+        k * ``support_window`` pairs are emitted per bucket. Support of pairs
+        further apart than that within a bucket is not counted, which only
+        matters for buckets larger than ``support_window`` + 1.
+        """
+        items = dict(tuple_gen)
+        labels = sorted(items)
+        if len(labels) < 2:
+            return
+
+        if self.min_support > 1:
+            window = self.support_window
+            for idx, label1 in enumerate(labels):
+                sketch1 = items[label1]
+                stop = None if window is None else idx + 1 + window
+                for label2 in labels[idx + 1:stop]:
+                    yield (label1, label2), \
+                        self._sketch_close(sketch1, items[label2])
+            return
+
+        if self.sketch_dist_fn is None or self._is_close(1, False):
+            # all labels in bucket are close regardless of sketch
+            groups = [labels]
+        else:
+            union_find = UnionFind()
+            for idx, label1 in enumerate(labels):
+                union_find.__getitem__(label1)
+                sketch1 = items[label1]
+                for label2 in labels[idx + 1:]:
+                    if self._sketch_close(sketch1, items[label2]):
+                        union_find.union(label1, label2)
+            groups = union_find.sets()
+
+        for group in groups:
+            root = min(group)
+            for label in group:
+                if label != root:
+                    yield root, label
+
+    def support_reducer(self, pair, partials):
+        """Perform a second-stage reducer task in MR
+
+        Aggregates candidate pairs emitted by ``edge_reducer`` when
+        ``min_support`` is greater than 1 and returns the pair if it passes
+        support and sketch criteria, or None otherwise.
+
+        :param pair: a tuple of two labels
+        :param partials: an iterable of (count, sketch_close) tuples, each
+                         a partial aggregate of occurrences of the pair (a
+                         single occurrence is ``(1, sketch_close)``)
+        :type partials: collections.Iterable
+        """
+        support = 0
+        any_close = False
+        for count, sketch_close in partials:
+            support += count
+            any_close = any_close or sketch_close
+        if self._is_close(support, any_close):
+            return pair
@@ -0,0 +1,270 @@
+"""
+External-memory connected components
+
+``pymaptools.unionfind.UnionFind`` keeps the whole parent forest, and
+eventually the list of clusters, in Python objects. For inputs with many
+more labels than fit in RAM, ``DiskComponents`` offers the subset of its
+interface used by ``lsh_hdc.cluster.Cluster`` (``__getitem__`` and ``union``),
+but instead of merging sets immediately it appends edges to a buffer that is
+periodically sorted, deduplicated, and spilled to disk as a binary run.
+
+Labels may be any hashable objects. Each label is given a dense integer id
+in order of registration, and edges are stored as pairs of ids. The mapping
+between labels and ids can be shared with ``lsh_hdc.cluster.Cluster``, which
+assigns the same ids to its labels, so that labels are held in memory only
+once.
+
+Components are then computed by iterative min-label propagation with pointer
+jumping over a memory-mapped array of ids, streaming through the edge runs in
+fixed-size chunks, so that memory use is bounded by chunk size rather than by
+number of edges. On convergence every id points to the smallest id in its
+component, and the label with that id (the first registered label of the
+component) serves as the component id.
+"""
+
+import os
+import shutil
+import tempfile
+import numpy as np
+from itertools import izip
+from logging import getLogger
+
+
+LOG = getLogger(__name__)
+
+
+class DiskComponents(object):
+    """Connected components of a graph too large to hold in memory
+
+    ::
+
+        >>> dc = DiskComponents(run_size=2)
+        >>> dc.union(0, 1)
+        >>> dc.union(3, 4)
+        >>> dc.union(4, 1)
+        >>> dc['x']
+        'x'
+        >>> dc.sets()
+        [[0, 1, 3, 4], ['x']]
+        >>> dc.close()
+
+    """
+    def __init__(self, tmpdir=None, run_size=10 ** 6, chunk_size=10 ** 6):
+        """
+        :param tmpdir: directory for edge runs and the label array (a
+                       temporary one is created if None)
+        :type tmpdir: str
+        :param run_size: number of edges to buffer in memory before spilling
+        :type run_size: int
+        :param chunk_size: number of edges or labels to process at a time
+                           when computing components
+        :type chunk_size: int
+        """
+        self._own_tmpdir = tmpdir is None
+        if tmpdir is None:
+            tmpdir = tempfile.mkdtemp(prefix='lsh_hdc-')
+        elif not os.path.exists(tmpdir):
+            os.makedirs(tmpdir)
+        self.tmpdir = tmpdir
+        self.run_size = run_size
+        self.chunk_size = chunk_size
+        self.label_ids = {}
+        self.node_labels = []
+        self.runs = []
+        self.labels = None
+        self._buffer = np.empty((run_size, 2), dtype=np.int64)
+        self._buffer_len = 0
+
+    @property
+    def num_nodes(self):
+        return len(self.node_labels)
+
+    def _get_id(self, label):
+        """Return id of a label, registering the label if it is new
+        """
+        label_ids = self.label_ids
+        node_id = label_ids.get(label)
+        if node_id is None:
+            node_id = label_ids[label] = len(self.node_labels)
+            self.node_labels.append(label)
+            self.labels = None
+        return node_id
+
+    def __getitem__(self, label):
+        """Register a label
+
+        Unlike ``UnionFind``, returns the label itself and not the root, as
+        roots are not known until components are computed.
+        """
+        self._get_id(label)
+        return label
+
+    def union(self, *labels):
+        """Record edges connecting all given labels
+        """
+        first = self._get_id(labels[0])
+        for label in labels[1:]:
+            self._add_edge(first, self._get_id(label))
+
+    def _add_edge(self, u, v):
+        self.labels = None
+        if self._buffer_len == self.run_size:
+            self.flush()
+        self._buffer[self._buffer_len] = (u, v) if u < v else (v, u)
+        self._buffer_len += 1
+
+    def add_edges(self, us, vs):
+        """Record a batch of edges given as two sequences of labels
+        """
+        get_id = self._get_id
+        us = np.fromiter((get_id(label) for label in us), dtype=np.int64)
+        vs = np.fromiter((get_id(label) for label in vs), dtype=np.int64)
+        edges = np.column_stack((us, vs))
+        if len(edges) == 0:
+            return
+        self.labels = None
+        edges.sort(axis=1)
+        for start in xrange(0, len(edges), self.run_size):
+            self._write_run(edges[start:start + self.run_size])
+
+    def flush(self):
+        """Spill buffered edges to disk
+        """
+        if self._buffer_len > 0:
+            self._write_run(self._buffer[:self._buffer_len])
+            self._buffer_len = 0
+
+    def _write_run(self, edges):
+        """Sort, deduplicate and save a run of edges
+        """
+        edges = edges[edges[:, 0] != edges[:, 1]]
+        order = np.lexsort((edges[:, 1], edges[:, 0]))
+        edges = edges[order]
+        if len(edges) > 1:
+            keep = np.ones(len(edges), dtype=bool)
+            keep[1:] = np.any(edges[1:] != edges[:-1], axis=1)
+            edges = edges[keep]
+        if len(edges) == 0:
+            return
+        path = os.path.join(self.tmpdir, 'run-%05d.npy' % len(self.runs))
+        np.save(path, edges)
+        self.runs.append(path)
+
+    def _iter_edge_chunks(self):
+        chunk_size = self.chunk_size
+        for path in self.runs:
+            run = np.load(path, mmap_mode='r')
+            for start in xrange(0, len(run), chunk_size):
+                chunk = np.asarray(run[start:start + chunk_size])
+                yield chunk[:, 0], chunk[:, 1]
+
+    def _jump_pointers(self, labels):
+        """Replace each label by its label's label until a fixed point
+        """
+        chunk_size = self.chunk_size
+        changed = True
+        while changed:
+            changed = False
+            for start in xrange(0, len(labels), chunk_size):
+                seg = labels[start:start + chunk_size]
+                new_seg = labels[seg]
+                if np.any(new_seg != seg):
+                    labels[start:start + chunk_size] = new_seg
+                    changed = True
+
+    def compute(self):
+        """Compute components
+
+        :returns: an array mapping each label id to the smallest id in its
+                  component
+        :rtype: numpy.ndarray
+        """
+        self.flush()
+        path = os.path.join(self.tmpdir, 'labels.npy')
+        labels = np.lib.format.open_memmap(
+            path, mode='w+', dtype=np.int64, shape=(self.num_nodes,))
+        chunk_size = self.chunk_size
+        for start in xrange(0, self.num_nodes, chunk_size):
+            stop = min(start + chunk_size, self.num_nodes)
+            labels[start:stop] = np.arange(start, stop, dtype=np.int64)
+
+        num_passes = 0
+        changed = True
+        while changed:
+            changed = False
+            num_passes += 1
+            for us, vs in self._iter_edge_chunks():
+                lu = labels[us]
+                lv = labels[vs]
+                diff = lu != lv
+                if not np.any(diff):
+                    continue
+                changed = True
+                lu, lv = lu[diff], lv[diff]
+                lmin = np.minimum(lu, lv)
+                # point the larger of the two labels to the smaller one, and
+                # move both endpoints to the smaller one
+                np.minimum.at(labels, np.maximum(lu, lv), lmin)
+                np.minimum.at(labels, us[diff], lmin)
+                np.minimum.at(labels, vs[diff], lmin)
+            self._jump_pointers(labels)
+        labels.flush()
+        LOG.info("Computed components over %d labels in %d passes",
+                 self.num_nodes, num_passes)
+        self.labels = labels
+        return labels
+
+    def iter_components(self):
+        """Generate (label, component_id) tuples in order of registration
+
+        The component id is the first registered label of the component.
+
+        :rtype: generator
+        """
+        if self.labels is None:
+            self.compute()
+        labels = self.labels
+        node_labels = self.node_labels
+        chunk_size = self.chunk_size
+        for start in xrange(0, len(labels), chunk_size):
+            seg = labels[start:start + chunk_size]
+            for node_id, component in izip(xrange(start, start + len(seg)), seg):
+                yield node_labels[node_id], node_labels[component]
+
+    def write_components(self, fhandle):
+        """Write tab-separated (label, component_id) lines to a file handle
+        """
+        for label, component in self.iter_components():
+            fhandle.write("%s\t%s\n" % (label, component))
+
+    def sets(self):
+        """Return a list of lists representing components
+
+        For compatibility with ``UnionFind``. Components are ordered by their
+        first registered label, and labels within a component are in order of
+        registration. Only use this when the result fits in memory.
+
+        :rtype: list
+        """
+        if self.num_nodes == 0:
+            return []
+        if self.labels is None:
+            self.compute()
+        labels = np.asarray(self.labels)
+        order = np.argsort(labels, kind='mergesort')
+        boundaries = np.flatnonzero(np.diff(labels[order])) + 1
+        node_labels = self.node_labels
+        return [[node_labels[node_id] for node_id in group.tolist()]
+                for group in np.split(order, boundaries)]
+
+    def close(self):
+        """Remove temporary files
+        """
+        self.labels = None
+        if self._own_tmpdir:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+        else:
+            for path in self.runs + [os.path.join(self.tmpdir, 'labels.npy')]:
+                if os.path.exists(path):
+                    os.remove(path)
+        self.runs = []
@@ -1,6 +1,7 @@
 #cython: infer_types=True
 
 import sys
+import numpy as np
 from struct import unpack
 from itertools import izip
 from hashlib import md5
@@ -17,6 +18,14 @@ ctypedef uint32_t uint32
 ctypedef uint64_t uint64
 
 
+cdef extern from * nogil:
+    ctypedef unsigned long long uint128 "unsigned __int128"
+
+
+# Mersenne prime 2^61 - 1
+cdef uint64 MERSENNE_61 = 0x1fffffffffffffffULL
+
+
 cdef class PHashCombiner(object):
     """Use polynomial hashing to reduce a vector of hashes
     """
@@ -75,6 +84,26 @@ cpdef inline hash_combine_murmur(seed, v):
     return b
 
 
+def mix_hashes(xs, uint64 seed):
+    """Derive seeded variants of an array of 64-bit hashes
+
+    Applies ``hash_combine_murmur_64(seed, x)`` to every element.
+
+    :param xs: array of 64-bit hashes
+    :type xs: numpy.ndarray
+    :param seed: seed of the variant
+    :type seed: int
+    :rtype: numpy.ndarray
+    """
+    cdef uint64[::1] xv = np.ascontiguousarray(xs, dtype=np.uint64)
+    cdef Py_ssize_t i, n = xv.shape[0]
+    result = np.empty(n, dtype=np.uint64)
+    cdef uint64[::1] out = result
+    for i in range(n):
+        out[i] = hash_combine_murmur_64(seed, xv[i])
+    return result
+
+
 cpdef inline hashable(value):
     if not isinstance(value, basestring):
         return repr(value)
@@ -90,6 +119,130 @@ cpdef uint64 hash_md5_64(x, uint64 seed=0):
     return hash_combine_boost_64(seed, hash_combine_boost_64(a, b))
 
 
+def hash_md5_64_many(values, uint64 seed=0):
+    """Batch version of hash_md5_64
+
+    :param values: a sequence of values to hash
+    :type values: collections.Sequence
+    :param seed: hash seed
+    :type seed: int
+    :returns: an array of 64-bit hashes
+    :rtype: numpy.ndarray
+    """
+    cdef Py_ssize_t i, n = len(values)
+    result = np.empty(n, dtype=np.uint64)
+    cdef uint64[:] out = result
+    cdef uint64 a, b
+    for i in range(n):
+        a, b = unpack('<QQ', md5(hashable(values[i])).digest())
+        out[i] = hash_combine_boost_64(seed, hash_combine_boost_64(a, b))
+    return result
+
+
+cdef inline uint64 _mersenne_hash(uint64 a, uint64 b, uint64 x) nogil:
+    """Compute (a * x + b) mod (2^61 - 1) without division
+    """
+    cdef uint128 v = (<uint128>a) * x + b
+    v = (v & MERSENNE_61) + (v >> 61)
+    v = (v & MERSENNE_61) + (v >> 61)
+    cdef uint64 r = <uint64>v
+    if r >= MERSENNE_61:
+        r -= MERSENNE_61
+    return r
+
+
+cdef class MersenneHashFamily(object):
+    """A seeded family of universal hash functions modulo 2^61 - 1
+
+    Each function has the form ``(a * x + b) mod (2^61 - 1)``, where reduction
+    modulo the Mersenne prime is done with shifts and masks. Coefficients are
+    drawn from ``numpy.random.RandomState(seed)``.
+
+    ::
+
+        >>> hf = MersenneHashFamily(3, seed=0)
+        >>> hf.hashn(12345) == hf.hashn_many([12345])[0].tolist()
+        True
+    """
+    cdef readonly object a_coeffs
+    cdef readonly object b_coeffs
+    cdef readonly int num_hashes
+    cdef readonly object seed
+    cdef uint64[::1] _a
+    cdef uint64[::1] _b
+
+    def __init__(self, num_hashes, seed=0):
+        """
+        :param num_hashes: number of hash functions in family
+        :type num_hashes: int
+        :param seed: random seed for choosing coefficients
+        :type seed: int
+        """
+        random_state = np.random.RandomState(seed)
+        self.num_hashes = num_hashes
+        self.seed = seed
+        self.a_coeffs = random_state.randint(
+            1, MERSENNE_61, size=num_hashes, dtype=np.uint64)
+        self.b_coeffs = random_state.randint(
+            0, MERSENNE_61, size=num_hashes, dtype=np.uint64)
+        self._a = self.a_coeffs
+        self._b = self.b_coeffs
+
+    def hashn(self, uint64 x):
+        """Return a list of num_hashes hashes of a 64-bit integer
+        """
+        cdef Py_ssize_t j
+        return [_mersenne_hash(self._a[j], self._b[j], x)
+                for j in range(self.num_hashes)]
+
+    def hashn_many(self, xs):
+        """Hash an array of 64-bit integers with every function in family
+
+        :param xs: array of 64-bit integers
+        :type xs: numpy.ndarray
+        :returns: a matrix of shape (len(xs), num_hashes)
+        :rtype: numpy.ndarray
+        """
+        cdef uint64[::1] xv = np.ascontiguousarray(xs, dtype=np.uint64)
+        cdef Py_ssize_t i, j, n = xv.shape[0], k = self.num_hashes
+        result = np.empty((n, k), dtype=np.uint64)
+        cdef uint64[:, ::1] out = result
+        cdef uint64[::1] a = self._a
+        cdef uint64[::1] b = self._b
+        with nogil:
+            for i in range(n):
+                for j in range(k):
+                    out[i, j] = _mersenne_hash(a[j], b[j], xv[i])
+        return result
+
+    def min_hashes(self, xs):
+        """Minimum hash value of an array of 64-bit integers per function
+
+        Same as ``hashn_many(xs).min(axis=0)`` without creating the matrix.
+
+        :param xs: non-empty array of 64-bit integers
+        :type xs: numpy.ndarray
+        :returns: an array of length num_hashes
+        :rtype: numpy.ndarray
+        """
+        cdef uint64[::1] xv = np.ascontiguousarray(xs, dtype=np.uint64)
+        cdef Py_ssize_t i, j, n = xv.shape[0], k = self.num_hashes
+        cdef uint64 h
+        if n == 0:
+            raise ValueError("cannot compute minimum of empty array")
+        result = np.full(k, MERSENNE_61, dtype=np.uint64)
+        cdef uint64[::1] out = result
+        cdef uint64[::1] a = self._a
+        cdef uint64[::1] b = self._b
+        with nogil:
+            for i in range(n):
+                for j in range(k):
+                    h = _mersenne_hash(a[j], b[j], xv[i])
+                    if h < out[j]:
+                        out[j] = h
+        return result
+
+
 cpdef hash_md5_128(x, seed=0):
     """Return value is 128 bits
     """
@@ -108,6 +261,57 @@ cpdef uint64 hash_builtin_64(x, uint64 seed=0):
     return hash_combine_boost_64(seed, 0x100000000ULL * a + b)
 
 
+def hash_builtin_64_many(values, uint64 seed=0):
+    """Batch version of hash_builtin_64
+
+    :param values: a sequence of values to hash
+    :type values: collections.Sequence
+    :param seed: hash seed
+    :type seed: int
+    :returns: an array of 64-bit hashes
+    :rtype: numpy.ndarray
+    """
+    cdef Py_ssize_t i, n = len(values)
+    result = np.empty(n, dtype=np.uint64)
+    cdef uint64[:] out = result
+    cdef uint64 a, b
+    for i in range(n):
+        x = values[i]
+        a = hash(x) & 0xffffffffULL
+        b = hash(repr(x)) & 0xffffffffULL
+        out[i] = hash_combine_boost_64(seed, 0x100000000ULL * a + b)
+    return result
+
+
+def hash_many_with(hashfun, values, uint64 seed=0, bint complex_types=False):
+    """Apply a scalar 64-bit hash function to a sequence of values
+
+    Values are passed through ``hashable`` unless the hash function supports
+    complex types.
+
+    :param hashfun: a function of the form ``hashfun(value, seed)``
+    :type hashfun: callable
+    :param values: a sequence of values to hash
+    :type values: collections.Sequence
+    :param seed: hash seed
+    :type seed: int
+    :param complex_types: whether hashfun supports types other than strings
+    :type complex_types: bool
+    :returns: an array of 64-bit hashes
+    :rtype: numpy.ndarray
+    """
+    cdef Py_ssize_t i, n = len(values)
+    result = np.empty(n, dtype=np.uint64)
+    cdef uint64[:] out = result
+    if complex_types:
+        for i in range(n):
+            out[i] = hashfun(values[i], seed)
+    else:
+        for i in range(n):
+            out[i] = hashfun(hashable(values[i]), seed)
+    return result
+
+
 cpdef hash_builtin_128(x, seed=0):
     """A better hash function based on Python's built-in hash()
 
@@ -154,6 +358,50 @@ cdef class VarlenHash(object):
             return 0
 
 
+def simhash_from_words(uint64[:, ::1] words, double[::1] weights,
+                       Py_ssize_t bit_depth):
+    """Weighted SimHash from hashed features laid out as 64-bit words
+
+    :param words: a matrix of shape (n_features, n_words) where each row
+                  holds the bits of a hashed feature, least significant word
+                  first
+    :type words: numpy.ndarray
+    :param weights: feature weights (already scaled)
+    :type weights: numpy.ndarray
+    :param bit_depth: number of bits in resulting signature
+    :type bit_depth: int
+    :returns: SimHash signature
+    :rtype: long
+    """
+    cdef Py_ssize_t i, b, n = words.shape[0]
+    cdef Py_ssize_t num_words = (bit_depth + 63) // 64
+    cdef double w
+    if words.shape[1] < num_words:
+        raise ValueError("not enough words for requested bit depth")
+    if weights.shape[0] != n:
+        raise ValueError("number of weights must equal number of features")
+    acc = np.zeros(bit_depth, dtype=np.float64)
+    cdef double[::1] vec = acc
+    with nogil:
+        for i in range(n):
+            w = weights[i]
+            for b in range(bit_depth):
+                if (words[i, b >> 6] >> (b & 63)) & 1ULL:
+                    vec[b] += w
+                else:
+                    vec[b] -= w
+    packed = np.zeros(num_words, dtype=np.uint64)
+    cdef uint64[::1] out = packed
+    for b in range(bit_depth):
+        if vec[b] > 0:
+            out[b >> 6] |= (1ULL << (b & 63))
+    cdef object result = 0
+    for i in range(num_words):
+        if out[i]:
+            result |= int(out[i]) << (64 * i)
+    return result
+
+
 cpdef long2int(num):
     """Lossily map a long type to the range of int
 
@@ -0,0 +1,288 @@
+"""
+LSH Forest index over minhash signatures
+
+Unlike ``LSHC``, which fixes the similarity threshold at build time through
+the choice of bandwidth, an LSH Forest stores, for each of several trees, the
+minhash rows of every document concatenated into a variable-length key and
+sorted lexicographically. A query walks each tree to find the longest prefix
+it shares with indexed documents; the longer the shared prefix, the more
+similar the documents are likely to be. Because prefix length can be chosen
+at query time, the same index answers top-k queries as well as queries under
+arbitrary similarity thresholds.
+
+The index is stored entirely in NumPy arrays (one sorted key matrix and one
+permutation vector per tree) so that it can be saved to disk and memory-mapped
+back without rebuilding.
+
+Algorithm after Bawa, Condie & Ganesan, "LSH Forest: Self-Tuning Indexes for
+Similarity Search" (WWW 2005).
+"""
+
+import os
+import numpy as np
+from math import log
+from itertools import imap
+from logging import getLogger
+
+
+LOG = getLogger(__name__)
+
+
+def get_minhash_matrix(signer, iterable):
+    """Create a matrix of minhashes from an iterable of feature sets
+
+    :param signer: instance of MinHashSignature
+    :type signer: lsh_hdc.MinHashSignature
+    :param iterable: a sequence of feature vectors (e.g. sets of shingles)
+    :type iterable: collections.Iterable
+    :returns: a matrix with one row of minhashes per feature vector
+    :rtype: numpy.ndarray
+    """
+    rows = list(imap(signer._get_minhashes, iterable))
+    return np.array(rows, dtype=np.uint64).reshape(
+        len(rows), signer.width * signer.kmin)
+
+
+def get_prefix_length(num_trees, threshold):
+    """Prefix length at which num_trees trees approximate a threshold
+
+    Inverse of ``lsh_hdc.get_threshold`` with prefix length in place of
+    rows per band and number of trees in place of number of bands.
+
+    :param num_trees: number of trees in the forest
+    :type num_trees: int
+    :param threshold: Jaccard similarity threshold in (0, 1)
+    :type threshold: float
+    :rtype: int
+    """
+    if threshold <= 0.0:
+        return 0
+    elif threshold >= 1.0:
+        raise ValueError("threshold must be smaller than 1.0")
+    return int(round(log(1.0 / num_trees) / log(threshold)))
+
+
+class LSHForest(object):
+    """Prefix-tree index over a minhash matrix
+
+    ::
+
+        >>> sigs = np.array([[1, 2, 3, 4], [1, 2, 3, 5], [9, 8, 7, 6]])
+        >>> forest = LSHForest(num_trees=2, seed=0).fit(sigs)
+        >>> indices, sims = forest.query([1, 2, 3, 4], k=2)
+        >>> list(indices), list(sims)
+        ([0, 1], [1.0, 0.75])
+
+    """
+    def __init__(self, num_trees=8, depth=None, seed=0):
+        """
+        :param num_trees: Number of prefix trees
+        :type num_trees: int
+        :param depth: Maximum prefix length (minhash rows per tree). If None,
+                      use as many rows as possible without sharing rows
+                      between trees
+        :type depth: int
+        :param seed: Seed used to assign signature rows to trees
+        :type seed: int
+        """
+        if num_trees < 1:
+            raise ValueError("num_trees must be a positive integer")
+        if depth is not None and depth < 1:
+            raise ValueError("depth must be a positive integer")
+        self.num_trees = num_trees
+        self.depth = depth
+        self.seed = seed
+
+        self.columns = None
+        self.keys = None
+        self.index = None
+        self.signatures = None
+
+    def __len__(self):
+        return 0 if self.signatures is None else len(self.signatures)
+
+    def _create_columns(self, width):
+        """Assign signature rows to trees
+        """
+        num_trees = self.num_trees
+        depth = self.depth
+        if depth is None:
+            depth = max(1, width // num_trees)
+        if depth > width:
+            raise ValueError("depth cannot exceed signature width")
+        random_state = np.random.RandomState(self.seed)
+        if num_trees * depth <= width:
+            # disjoint rows for each tree
+            perm = random_state.permutation(width)[:num_trees * depth]
+            columns = perm.reshape(num_trees, depth)
+        else:
+            columns = np.array([random_state.choice(width, depth, replace=False)
+                                for _ in xrange(num_trees)])
+        return columns.astype(np.intp)
+
+    def fit(self, signatures):
+        """Build the index from a matrix of minhashes
+
+        :param signatures: a matrix of shape (n_documents, signature width)
+        :type signatures: numpy.ndarray
+        :returns: self
+        :rtype: LSHForest
+        """
+        signatures = np.ascontiguousarray(signatures, dtype=np.uint64)
+        if signatures.ndim != 2:
+            raise ValueError("expected a matrix (2-d array), got a %r array"
+                             % (signatures.shape,))
+        num_docs, width = signatures.shape
+        columns = self._create_columns(width)
+        num_trees, depth = columns.shape
+
+        keys = np.empty((num_trees, num_docs, depth), dtype=np.uint64)
+        index = np.empty((num_trees, num_docs), dtype=np.intp)
+        for tree_idx, tree_columns in enumerate(columns):
+            tree_keys = signatures[:, tree_columns]
+            # lexsort treats its last key as the primary one
+            order = np.lexsort(tree_keys.T[::-1])
+            keys[tree_idx] = tree_keys[order]
+            index[tree_idx] = order
+
+        self.columns = columns
+        self.depth = depth
+        self.keys = keys
+        self.index = index
+        self.signatures = signatures
+        LOG.info("Built LSH Forest of %d trees of depth %d over %d documents",
+                 num_trees, depth, num_docs)
+        return self
+
+    def _descend(self, tree_idx, query_key):
+        """Find ranges of sorted keys matching each prefix length of query
+
+        :returns: a list of (lo, hi) ranges, where the i-th element gives the
+                  range of documents sharing a prefix of length i with query
+        :rtype: list
+        """
+        tree_keys = self.keys[tree_idx]
+        lo, hi = 0, len(tree_keys)
+        ranges = [(lo, hi)]
+        for level, value in enumerate(query_key):
+            # within the range matching the current prefix, the next column
+            # is sorted, so binary search can be used
+            column = tree_keys[lo:hi, level]
+            new_lo = lo + np.searchsorted(column, value, side='left')
+            new_hi = lo + np.searchsorted(column, value, side='right')
+            if new_lo >= new_hi:
+                break
+            lo, hi = new_lo, new_hi
+            ranges.append((lo, hi))
+        return ranges
+
+    def _iter_ranges(self, signature):
+        signature = np.asarray(signature, dtype=np.uint64)
+        for tree_idx, tree_columns in enumerate(self.columns):
+            yield tree_idx, self._descend(tree_idx, signature[tree_columns])
+
+    def _candidates(self, all_ranges, prefix_length):
+        """Union of documents sharing at least prefix_length rows in any tree
+        """
+        chunks = []
+        for tree_idx, ranges in all_ranges:
+            if len(ranges) > prefix_length:
+                lo, hi = ranges[prefix_length]
+                chunks.append(self.index[tree_idx, lo:hi])
+        if not chunks:
+            return np.empty(0, dtype=np.intp)
+        return np.unique(np.concatenate(chunks))
+
+    def _rank(self, signature, candidates, k=None):
+        """Order candidates by estimated Jaccard similarity to signature
+        """
+        signature = np.asarray(signature, dtype=np.uint64)
+        sims = np.mean(self.signatures[candidates] == signature, axis=1)
+        # stable sort so that ties are ordered by document index
+        order = np.argsort(-sims, kind='mergesort')
+        if k is not None:
+            order = order[:k]
+        return candidates[order], sims[order]
+
+    def query(self, signature, k=10, num_candidates=None):
+        """Find k documents most similar to a signature
+
+        Uses synchronous descent: prefix length is reduced across all trees at
+        the same time until enough candidates are collected, after which
+        candidates are ranked by estimated Jaccard similarity.
+
+        :param signature: minhash signature of query document
+        :type signature: collections.Iterable
+        :param k: number of neighbors to return
+        :type k: int
+        :param num_candidates: minimum number of candidates to collect before
+                               ranking (defaults to max(k, num_trees))
+        :type num_candidates: int
+        :returns: a tuple of document indices and similarity estimates
+        :rtype: tuple
+        """
+        if num_candidates is None:
+            num_candidates = max(k, self.num_trees)
+        all_ranges = list(self._iter_ranges(signature))
+        max_prefix = max(len(ranges) for _, ranges in all_ranges) - 1
+        candidates = np.empty(0, dtype=np.intp)
+        for prefix_length in xrange(max_prefix, -1, -1):
+            candidates = self._candidates(all_ranges, prefix_length)
+            if len(candidates) >= num_candidates:
+                break
+        return self._rank(signature, candidates, k=k)
+
+    def query_threshold(self, signature, threshold, prefix_length=None):
+        """Find documents with estimated similarity above threshold
+
+        :param signature: minhash signature of query document
+        :type signature: collections.Iterable
+        :param threshold: Jaccard similarity threshold
+        :type threshold: float
+        :param prefix_length: Minimum prefix length for a document to become a
+                              candidate. If None, is derived from threshold
+        :type prefix_length: int
+        :returns: a tuple of document indices and similarity estimates
+        :rtype: tuple
+        """
+        if prefix_length is None:
+            prefix_length = get_prefix_length(self.num_trees, threshold)
+        prefix_length = max(0, min(self.depth, prefix_length))
+        all_ranges = self._iter_ranges(signature)
+        candidates = self._candidates(all_ranges, prefix_length)
+        indices, sims = self._rank(signature, candidates)
+        mask = sims >= threshold
+        return indices[mask], sims[mask]
+
+    def save(self, path):
+        """Save index arrays to a directory
+
+        :param path: directory path (created if does not exist)
+        :type path: str
+        """
+        if not os.path.exists(path):
+            os.makedirs(path)
+        elif not os.path.isdir(path):
+            raise IOError("path already exists and is a file")
+        for name in ('columns', 'keys', 'index', 'signatures'):
+            np.save(os.path.join(path, name + '.npy'), getattr(self, name))
+
+    @classmethod
+    def load(cls, path, mmap_mode='r'):
+        """Load index arrays previously written with ``save``
+
+        :param path: directory path
+        :type path: str
+        :param mmap_mode: memory-map mode passed to ``numpy.load``
+        :type mmap_mode: str
+        :rtype: LSHForest
+        """
+        arrays = {}
+        for name in ('columns', 'keys', 'index', 'signatures'):
+            arrays[name] = np.load(os.path.join(path, name + '.npy'),
+                                   mmap_mode=mmap_mode)
+        num_trees, depth = arrays['columns'].shape
+        obj = cls(num_trees=num_trees, depth=depth)
+        for name, arr in arrays.iteritems():
+            setattr(obj, name, arr)
+        return obj
@@ -4,6 +4,7 @@ import abc
 from struct import unpack
 from itertools import izip
 from hashlib import md5
+from lsh_hdc.ext import MersenneHashFamily
 
 
 class IHashFamily(object):
@@ -21,7 +22,7 @@ class IHashFamily(object):
         necessary for choosing parameters).  The hash function is not required
         to return values less than num_buckets (They will be modulo'd afterwards)
         """
-        random.seed(0)
+        self._random = random.Random(seed)
         self.mod = 2 ** bits - 1
 
     @abc.abstractmethod
@@ -47,7 +48,7 @@ class XORHashFamily(IHashFamily):
         super(XORHashFamily, self).__init__(
             num_hashes, num_buckets, seed, bits)
         self._memomask = [
-            int(random.getrandbits(bits)) for _ in xrange(num_hashes)]
+            int(self._random.getrandbits(bits)) for _ in xrange(num_hashes)]
 
     def hashn(self, x):
         x &= self.mod
@@ -75,7 +76,7 @@ class MultiplyHashFamily(IHashFamily):
         super(MultiplyHashFamily, self).__init__(
             num_hashes, num_buckets, seed, bits)
         self._params = [
-            [random.randint(1, num_buckets) for _ in xrange(3)]
+            [self._random.randint(1, num_buckets) for _ in xrange(3)]
             for _ in xrange(num_hashes)]
 
     def hashn(self, x):
@@ -84,6 +85,10 @@ class MultiplyHashFamily(IHashFamily):
             yield (a * (x >> 4) + b * x + c) % mod
 
 
+# compiled and vectorized family of universal hash functions
+IHashFamily.register(MersenneHashFamily)
+
+
 class HashCombiner(object):
 
     """use polynomial hashing to reduce a vector of hashes
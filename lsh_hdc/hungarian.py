@@ -1,13 +1,16 @@
-# Hungarian algorithm (Kuhn-Munkres) for solving the linear sum assignment
-# problem. Taken from scikit-learn. Based on original code by Brian Clapper,
-# adapted to NumPy by Gael Varoquaux.
-# Further improvements by Ben Root, Vlad Niculae and Lars Buitinck.
+# Linear sum assignment problem solver. Interface and documentation taken
+# from scikit-learn (based on original code by Brian Clapper, adapted to
+# NumPy by Gael Varoquaux, with further improvements by Ben Root, Vlad
+# Niculae and Lars Buitinck). The Munkres step machine has been replaced with
+# the Jonker-Volgenant shortest augmenting path algorithm, implemented in
+# ``lsh_hdc.entropy.lapjv``.
 #
 # Copyright (c) 2008 Brian M. Clapper <bmc@clapper.org>, Gael Varoquaux
 # Author: Brian M. Clapper, Gael Varoquaux
 # License: 3-clause BSD
 
 import numpy as np
+from lsh_hdc.entropy import lapjv
 
 
 def linear_sum_assignment(cost_matrix):
@@ -33,8 +36,10 @@ def linear_sum_assignment(cost_matrix):
     columns, then not every row needs to be assigned to a column, and vice
     versa.
 
-    The method used is the Hungarian algorithm, also known as the Munkres or
-    Kuhn-Munkres algorithm.
+    The method used is the shortest augmenting path algorithm of Jonker and
+    Volgenant [996]_, which solves the same problem as the Hungarian (Munkres
+    or Kuhn-Munkres) algorithm but takes O(n^2 m) time in the worst case and
+    is much faster in practice.
 
     Parameters
     ----------
@@ -87,6 +92,11 @@ def linear_sum_assignment(cost_matrix):
     .. [995] `Wikipedia entry for the Hungarian algorithm
              <https://en.wikipedia.org/wiki/Hungarian_algorithm>`_
 
+    .. [996] `Jonker, R., & Volgenant, A. (1987). A shortest augmenting path
+             algorithm for dense and sparse linear assignment problems.
+             Computing, 38(4), 325-340.
+             <http://doi.org/10.1007/BF02278710>`_
+
     """
     cost_matrix = np.asarray(cost_matrix)
     if len(cost_matrix.shape) != 2:
@@ -100,181 +110,15 @@ def linear_sum_assignment(cost_matrix):
     else:
         transposed = False
 
-    state = _Hungary(cost_matrix)
-
     # No need to bother with assignments if one of the dimensions
     # of the cost matrix is zero-length.
-    step = None if 0 in cost_matrix.shape else _step1
-
-    while step is not None:
-        step = step(state)
+    if 0 in cost_matrix.shape:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
 
+    row_ind = np.arange(cost_matrix.shape[0])
+    col_ind = lapjv(cost_matrix)
     if transposed:
-        marked = state.marked.T
-    else:
-        marked = state.marked
-    return np.where(marked == 1)
-
-
-class _Hungary(object):
-    """State of the Hungarian algorithm.
-
-    Parameters
-    ----------
-    cost_matrix : 2D matrix
-        The cost matrix. Must have shape[1] >= shape[0].
-    """
-
-    def __init__(self, cost_matrix):
-        self.C = cost_matrix.copy()
-
-        n, m = self.C.shape
-        self.row_uncovered = np.ones(n, dtype=bool)
-        self.col_uncovered = np.ones(m, dtype=bool)
-        self.Z0_r = 0
-        self.Z0_c = 0
-        self.path = np.zeros((n + m, 2), dtype=int)
-        self.marked = np.zeros((n, m), dtype=int)
-
-    def clear_covers(self):
-        """Clear all covered matrix cells"""
-        self.row_uncovered[:] = True
-        self.col_uncovered[:] = True
-
-
-# Individual steps of the algorithm follow, as a state machine: they return
-# the next step to be taken (function to be called), if any.
-
-def _step1(state):
-    """Steps 1 and 2 in the Wikipedia page."""
-
-    # Step 1: For each row of the matrix, find the smallest element and
-    # subtract it from every element in its row.
-    state.C -= state.C.min(axis=1)[:, np.newaxis]
-    # Step 2: Find a zero (Z) in the resulting matrix. If there is no
-    # starred zero in its row or column, star Z. Repeat for each element
-    # in the matrix.
-    for i, j in zip(*np.where(state.C == 0)):
-        if state.col_uncovered[j] and state.row_uncovered[i]:
-            state.marked[i, j] = 1
-            state.col_uncovered[j] = False
-            state.row_uncovered[i] = False
-
-    state.clear_covers()
-    return _step3
-
-
-def _step3(state):
-    """
-    Cover each column containing a starred zero. If n columns are covered,
-    the starred zeros describe a complete set of unique assignments.
-    In this case, Go to DONE, otherwise, Go to Step 4.
-    """
-    marked = (state.marked == 1)
-    state.col_uncovered[np.any(marked, axis=0)] = False
-
-    if marked.sum() < state.C.shape[0]:
-        return _step4
-
-
-def _step4(state):
-    """
-    Find a noncovered zero and prime it. If there is no starred zero
-    in the row containing this primed zero, Go to Step 5. Otherwise,
-    cover this row and uncover the column containing the starred
-    zero. Continue in this manner until there are no uncovered zeros
-    left. Save the smallest uncovered value and Go to Step 6.
-    """
-    # We convert to int as numpy operations are faster on int
-    C = (state.C == 0).astype(int)
-    covered_C = C * state.row_uncovered[:, np.newaxis]
-    covered_C *= np.asarray(state.col_uncovered, dtype=int)
-    n = state.C.shape[0]
-    m = state.C.shape[1]
-
-    while True:
-        # Find an uncovered zero
-        row, col = np.unravel_index(np.argmax(covered_C), (n, m))
-        if covered_C[row, col] == 0:
-            return _step6
-        else:
-            state.marked[row, col] = 2
-            # Find the first starred element in the row
-            star_col = np.argmax(state.marked[row] == 1)
-            if state.marked[row, star_col] != 1:
-                # Could not find one
-                state.Z0_r = row
-                state.Z0_c = col
-                return _step5
-            else:
-                col = star_col
-                state.row_uncovered[row] = False
-                state.col_uncovered[col] = True
-                covered_C[:, col] = C[:, col] * (
-                    np.asarray(state.row_uncovered, dtype=int))
-                covered_C[row] = 0
-
-
-def _step5(state):
-    """
-    Construct a series of alternating primed and starred zeros as follows.
-    Let Z0 represent the uncovered primed zero found in Step 4.
-    Let Z1 denote the starred zero in the column of Z0 (if any).
-    Let Z2 denote the primed zero in the row of Z1 (there will always be one).
-    Continue until the series terminates at a primed zero that has no starred
-    zero in its column. Unstar each starred zero of the series, star each
-    primed zero of the series, erase all primes and uncover every line in the
-    matrix. Return to Step 3
-    """
-    count = 0
-    path = state.path
-    path[count, 0] = state.Z0_r
-    path[count, 1] = state.Z0_c
-
-    while True:
-        # Find the first starred element in the col defined by
-        # the path.
-        row = np.argmax(state.marked[:, path[count, 1]] == 1)
-        if state.marked[row, path[count, 1]] != 1:
-            # Could not find one
-            break
-        else:
-            count += 1
-            path[count, 0] = row
-            path[count, 1] = path[count - 1, 1]
-
-        # Find the first prime element in the row defined by the
-        # first path step
-        col = np.argmax(state.marked[path[count, 0]] == 2)
-        if state.marked[row, col] != 2:
-            col = -1
-        count += 1
-        path[count, 0] = path[count - 1, 0]
-        path[count, 1] = col
-
-    # Convert paths
-    for i in range(count + 1):
-        if state.marked[path[i, 0], path[i, 1]] == 1:
-            state.marked[path[i, 0], path[i, 1]] = 0
-        else:
-            state.marked[path[i, 0], path[i, 1]] = 1
-
-    state.clear_covers()
-    # Erase all prime markings
-    state.marked[state.marked == 2] = 0
-    return _step3
-
-
-def _step6(state):
-    """
-    Add the value found in Step 4 to every element of each covered row,
-    and subtract it from every element of each uncovered column.
-    Return to Step 4 without altering any stars, primes, or covered lines.
-    """
-    # the smallest uncovered value in the matrix
-    if np.any(state.row_uncovered) and np.any(state.col_uncovered):
-        minval = np.min(state.C[state.row_uncovered], axis=0)
-        minval = np.min(minval[state.col_uncovered])
-        state.C[~state.row_uncovered] += minval
-        state.C[:, state.col_uncovered] -= minval
-    return _step4
+        order = np.argsort(col_ind)
+        return col_ind[order], row_ind[order]
+    return row_ind, col_ind
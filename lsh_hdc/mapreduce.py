@@ -0,0 +1,266 @@
+"""
+Local MapReduce driver for HDClustering
+
+Runs the map, shuffle and reduce phases of ``HDClustering`` on a pool of
+worker processes on a single machine, as a stand-in for a MapReduce cluster.
+
+* Map tasks run ``HDClustering.mapper`` over a slice of input, apply
+  ``HDClustering.combiner`` to each key, and write the result into one shuffle
+  file per partition, sorted by key.
+* Reduce tasks merge the sorted shuffle files of a partition, group values by
+  key, and run ``HDClustering.edge_reducer`` on each bucket. If
+  ``min_support`` is greater than one, candidate pairs are partially
+  aggregated into (count, sketch_close) tuples in runs of bounded size,
+  shuffled once more, and aggregated with ``HDClustering.support_reducer``.
+* Resulting edges are fed to the union-find structure of the cluster builder
+  (which may be an instance of ``lsh_hdc.components.DiskComponents``).
+
+Shuffle files hold pickled records and are written to a temporary directory.
+Worker processes are forked with the driver already in place, so neither the
+driver nor the clustering model need to be pickled.
+"""
+
+import os
+import heapq
+import shutil
+import tempfile
+import cPickle as pickle
+import multiprocessing
+from itertools import groupby, islice, imap
+from operator import itemgetter
+from logging import getLogger
+
+
+LOG = getLogger(__name__)
+
+# driver instance inherited by forked workers
+_DRIVER = None
+
+
+def _dump_records(path, records, batch_size=10000):
+    """Write records in pickled batches
+    """
+    with open(path, 'wb') as fhandle:
+        records = iter(records)
+        while True:
+            batch = list(islice(records, batch_size))
+            if not batch:
+                break
+            pickle.dump(batch, fhandle, pickle.HIGHEST_PROTOCOL)
+
+
+def _load_records(path):
+    """Generate records written with _dump_records
+    """
+    with open(path, 'rb') as fhandle:
+        while True:
+            try:
+                batch = pickle.load(fhandle)
+            except EOFError:
+                break
+            for record in batch:
+                yield record
+
+
+def _merge_groups(paths):
+    """Merge sorted record files and group values by key
+    """
+    merged = heapq.merge(*[_load_records(path) for path in paths])
+    for key, group in groupby(merged, key=itemgetter(0)):
+        yield key, (value for _, values in group for value in values)
+
+
+def _run_task(args):
+    method_name, task_args = args
+    return getattr(_DRIVER, method_name)(*task_args)
+
+
+class LocalMRDriver(object):
+    """Run HDClustering MR tasks on a local process pool
+
+    ::
+
+        >>> from lsh_hdc.cluster import HDClustering
+        >>> driver = LocalMRDriver(HDClustering(cfg), num_procs=4)   # doctest: +SKIP
+        >>> clusters = driver.clusters_from_iter(data)   # doctest: +SKIP
+
+    """
+    def __init__(self, model, num_procs=None, num_partitions=None,
+                 chunk_size=100000, run_size=10 ** 6, tmpdir=None):
+        """
+        :param model: clustering model
+        :type model: lsh_hdc.cluster.HDClustering
+        :param num_procs: number of worker processes (defaults to CPU count)
+        :type num_procs: int
+        :param num_partitions: number of reduce partitions (defaults to
+                               number of worker processes)
+        :type num_partitions: int
+        :param chunk_size: number of input objects per map task
+        :type chunk_size: int
+        :param run_size: number of distinct candidate pairs a reduce task
+                         aggregates in memory before writing them out (only
+                         used if ``min_support`` is greater than one)
+        :type run_size: int
+        :param tmpdir: parent directory for shuffle files
+        :type tmpdir: str
+        """
+        if num_procs is None:
+            num_procs = multiprocessing.cpu_count()
+        self.model = model
+        self.num_procs = num_procs
+        self.num_partitions = num_procs if num_partitions is None else num_partitions
+        self.chunk_size = chunk_size
+        self.run_size = run_size
+        self.tmpdir = tmpdir
+        self._workdir = None
+
+    def _path(self, *parts):
+        return os.path.join(self._workdir, '-'.join(imap(str, parts)) + '.pkl')
+
+    def _partition(self, key):
+        return hash(key) % self.num_partitions
+
+    def _write_partitions(self, prefix, task_id, groups):
+        """Partition (key, values) groups and write sorted shuffle files
+        """
+        partitions = [[] for _ in xrange(self.num_partitions)]
+        for key, values in groups:
+            partitions[self._partition(key)].append((key, values))
+        for partition_id, records in enumerate(partitions):
+            records.sort(key=itemgetter(0))
+            _dump_records(self._path(prefix, task_id, partition_id), records)
+
+    def map_task(self, task_id, offset, chunk):
+        """Map a slice of input and write combined shuffle files
+        """
+        model = self.model
+        buckets = {}
+        labels = []
+        get_label = model._get_label
+        for idx, obj in enumerate(chunk, start=offset):
+            # register every label, including those of objects without keys
+            labels.append(idx if get_label is None else get_label(obj))
+            for key, val in model.mapper(obj, default_label=idx):
+                buckets.setdefault(key, []).append(val)
+        groups = (model.combiner(key, vals) for key, vals in buckets.iteritems())
+        self._write_partitions('map', task_id, groups)
+        _dump_records(self._path('labels', task_id), labels)
+
+    def reduce_task(self, partition_id, num_map_tasks):
+        """Reduce one partition of buckets into edges or candidate pairs
+
+        :returns: number of candidate pair runs written (zero if edges were
+                  written directly)
+        :rtype: int
+        """
+        model = self.model
+        paths = [self._path('map', task_id, partition_id)
+                 for task_id in xrange(num_map_tasks)]
+        edges = (edge for key, values in _merge_groups(paths)
+                 for edge in model.edge_reducer(key, values))
+        if model.min_support > 1:
+            return self._write_pair_runs(partition_id, edges)
+        _dump_records(self._path('edges', partition_id), edges)
+        return 0
+
+    def _write_pair_runs(self, partition_id, pairs):
+        """Partially aggregate candidate pairs and write them in sorted runs
+
+        Occurrences of a pair are folded into one (count, sketch_close)
+        tuple, and aggregates are written out whenever ``run_size`` distinct
+        pairs are held, so that memory used does not depend on the number of
+        candidate pairs.
+        """
+        pairs = iter(pairs)
+        num_runs = 0
+        while True:
+            groups = {}
+            for pair, sketch_close in pairs:
+                count, any_close = groups.get(pair, (0, False))
+                groups[pair] = (count + 1, any_close or sketch_close)
+                if len(groups) >= self.run_size:
+                    break
+            if not groups:
+                break
+            self._write_partitions(
+                'pairs', '%d-%d' % (partition_id, num_runs),
+                ((pair, [partial]) for pair, partial in groups.iteritems()))
+            num_runs += 1
+        return num_runs
+
+    def support_task(self, partition_id, run_counts):
+        """Aggregate candidate pairs of one partition into edges
+
+        :param run_counts: number of pair runs written by each reduce task
+        :type run_counts: list
+        """
+        model = self.model
+        paths = [self._path('pairs', task_id, run_id, partition_id)
+                 for task_id, num_runs in enumerate(run_counts)
+                 for run_id in xrange(num_runs)]
+        edges = (model.support_reducer(pair, partials)
+                 for pair, partials in _merge_groups(paths))
+        _dump_records(self._path('edges', partition_id),
+                      (edge for edge in edges if edge is not None))
+
+    def _iter_chunks(self, data):
+        data = iter(data)
+        offset = 0
+        while True:
+            chunk = list(islice(data, self.chunk_size))
+            if not chunk:
+                break
+            yield offset, chunk
+            offset += len(chunk)
+
+    def run(self, data):
+        """Run all phases and return the union-find structure of the model
+
+        :param data: an iterable of input objects
+        :type data: collections.Iterable
+        :returns: union-find structure with all labels and edges added
+        """
+        global _DRIVER
+        self._workdir = tempfile.mkdtemp(prefix='lsh_hdc-mr-', dir=self.tmpdir)
+        _DRIVER = self
+        pool = multiprocessing.Pool(self.num_procs)
+        try:
+            # stream input chunks to workers instead of reading all of them
+            # first; every task reports back once, which gives the count
+            map_args = (('map_task', (task_id, offset, chunk))
+                        for task_id, (offset, chunk)
+                        in enumerate(self._iter_chunks(data)))
+            num_map_tasks = 0
+            for _ in pool.imap_unordered(_run_task, map_args):
+                num_map_tasks += 1
+            LOG.info("Finished %d map tasks", num_map_tasks)
+
+            run_counts = pool.map(
+                _run_task, [('reduce_task', (partition_id, num_map_tasks))
+                            for partition_id in xrange(self.num_partitions)])
+            if self.model.min_support > 1:
+                pool.map(_run_task, [('support_task', (partition_id, run_counts))
+                                     for partition_id in xrange(self.num_partitions)])
+            LOG.info("Finished %d reduce tasks", self.num_partitions)
+
+            union_find = self.model.cluster_builder.union_find
+            for task_id in xrange(num_map_tasks):
+                for label in _load_records(self._path('labels', task_id)):
+                    union_find.__getitem__(label)
+            for partition_id in xrange(self.num_partitions):
+                for label1, label2 in _load_records(self._path('edges', partition_id)):
+                    union_find.union(label1, label2)
+        finally:
+            pool.close()
+            pool.join()
+            _DRIVER = None
+            shutil.rmtree(self._workdir, ignore_errors=True)
+            self._workdir = None
+        return union_find
+
+    def clusters_from_iter(self, data):
+        """Find clusters in an iterable
+
+        :rtype: list
+        """
+        return self.run(data).sets()
@@ -0,0 +1,256 @@
+"""
+Maximum-weight bipartite matching on sparse tables
+
+``ContingencyTable.assignment_score`` needs the total weight of the maximum
+weight matching between rows and columns of a contingency table. Dense
+solvers such as ``lsh_hdc.entropy.assignment_cost`` allocate the full RxC
+matrix and take cubic time, which is prohibitive for tables with tens of
+thousands of rows and columns, even though such tables are almost entirely
+made of zeros.
+
+Because all weights are non-negative, zero cells never need to be matched,
+and the optimum only depends on non-zero cells. The table is therefore
+viewed as a sparse bipartite graph and decomposed into connected components,
+each of which is solved independently:
+
+* Components with a single row or a single column (the vast majority on
+  typical clustering tables) are solved by taking the maximum cell.
+* Small components are solved densely with ``assignment_cost``.
+* Large components are solved with successive shortest augmenting paths
+  (Dijkstra search with vertex potentials) over their non-zero cells only.
+
+Components may be distributed among several worker processes.
+"""
+
+import heapq
+import multiprocessing
+import numpy as np
+from itertools import izip
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from lsh_hdc.entropy import assignment_cost
+
+
+def sparse_max_weight_matching(weights, row_idx, col_idx):
+    """Maximum-weight matching in a sparse bipartite graph
+
+    Rows are added one at a time, and for each row a shortest augmenting path
+    is found on the residual graph with costs equal to negative weights (Dijkstra
+    search with vertex potentials, which keep reduced costs non-negative). Each
+    row may also stay unmatched at zero cost, modelled by a private dummy
+    column. Search from a row only visits vertices closer than the best
+    augmenting path found so far, and potentials are only updated for visited
+    vertices, so the cost of adding a row depends on the size of its
+    neighborhood rather than on the size of the graph.
+
+    ::
+
+        >>> weights = np.array([3., 2., 2.])
+        >>> sparse_max_weight_matching(weights, [0, 0, 1], [0, 1, 0])
+        (array([0, 1]), array([1, 0]))
+
+    Parameters
+    ----------
+    weights : array_like
+        non-negative edge weights
+
+    row_idx : array_like
+        row index of each edge
+
+    col_idx : array_like
+        column index of each edge
+
+    Returns
+    -------
+
+    rows, cols : tuple
+        arrays of matched row and column indices (sorted by row)
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    row_idx = np.asarray(row_idx, dtype=np.intp)
+    col_idx = np.asarray(col_idx, dtype=np.intp)
+    if len(weights) == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+    num_rows = int(row_idx.max()) + 1
+    num_cols = int(col_idx.max()) + 1
+
+    adjacency = [[] for _ in xrange(num_rows)]
+    # Free columns (real and dummy) always have zero potential, so that
+    # reduced distances to them can be compared directly. Row potentials
+    # start at the largest weight in the row, which makes all reduced costs
+    # non-negative.
+    row_pot = [0.0] * num_rows
+    col_pot = [0.0] * num_cols
+    for u, v, w in izip(row_idx.tolist(), col_idx.tolist(), weights.tolist()):
+        adjacency[u].append((v, -w))
+        if w > row_pot[u]:
+            row_pot[u] = w
+
+    # -1 means not yet processed (rows) or free (columns), DUMMY means the
+    # row is left unmatched
+    DUMMY = -2
+    row_match = [-1] * num_rows
+    col_match = [-1] * num_cols
+    inf = float('inf')
+
+    for root in xrange(num_rows):
+        row_dist = {root: 0.0}
+        col_dist = {}
+        col_parent = {}
+        visited = []
+        best_cost, best_col, best_row = inf, -1, -1
+        heap = [(0.0, root)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > row_dist[u]:
+                continue
+            if d >= best_cost:
+                break
+            visited.append(u)
+            pot_u = row_pot[u]
+            # leave row unmatched, freeing its current column
+            nd = d + pot_u
+            if nd < best_cost:
+                best_cost, best_col, best_row = nd, -1, u
+            match_u = row_match[u]
+            for v, cost in adjacency[u]:
+                if v == match_u:
+                    continue
+                nd = d + cost + pot_u - col_pot[v]
+                if nd < col_dist.get(v, inf):
+                    col_dist[v] = nd
+                    col_parent[v] = u
+                    u2 = col_match[v]
+                    if u2 < 0:
+                        if nd < best_cost:
+                            best_cost, best_col, best_row = nd, v, -1
+                    elif nd < row_dist.get(u2, inf):
+                        # matched edge back to its row is tight
+                        row_dist[u2] = nd
+                        heapq.heappush(heap, (nd, u2))
+
+        # update potentials of vertices closer than the augmenting path
+        for u in visited:
+            d = row_dist[u]
+            if d < best_cost:
+                row_pot[u] += d - best_cost
+        for v, d in col_dist.iteritems():
+            if d < best_cost:
+                col_pot[v] += d - best_cost
+
+        # augment
+        if best_col >= 0:
+            v = best_col
+        else:
+            v = row_match[best_row]
+            row_match[best_row] = DUMMY
+            if best_row == root:
+                continue
+        while True:
+            u = col_parent[v]
+            prev_v = row_match[u]
+            row_match[u] = v
+            col_match[v] = u
+            if u == root:
+                break
+            v = prev_v
+
+    rows = np.array([u for u in xrange(num_rows) if row_match[u] >= 0], dtype=np.intp)
+    cols = np.array([row_match[u] for u in rows], dtype=np.intp)
+    return rows, cols
+
+
+def _solve_component(args):
+    """Total weight of maximum-weight matching of one component
+    """
+    weights, row_idx, col_idx, dense_limit = args
+    row_labels, row_idx = np.unique(row_idx, return_inverse=True)
+    col_labels, col_idx = np.unique(col_idx, return_inverse=True)
+    num_rows, num_cols = len(row_labels), len(col_labels)
+    if num_rows * num_cols <= dense_limit:
+        dense = np.zeros((num_rows, num_cols), dtype=np.float64)
+        dense[row_idx, col_idx] = weights
+        return assignment_cost(dense, maximize=True)
+    rows, cols = sparse_max_weight_matching(weights, row_idx, col_idx)
+    matrix = coo_matrix((weights, (row_idx, col_idx)),
+                        shape=(num_rows, num_cols)).tocsr()
+    return float(np.asarray(matrix[rows, cols]).sum())
+
+
+def sparse_assignment_cost(weights, row_idx, col_idx, dense_limit=10 ** 6,
+                           num_procs=1):
+    """Total weight of maximum-weight matching of a sparse table
+
+    ::
+
+        >>> weights = [16, 2, 1, 3, 4, 5, 5]
+        >>> row_idx = [0, 0, 1, 1, 2, 2, 2]
+        >>> col_idx = [0, 2, 0, 1, 0, 1, 2]
+        >>> sparse_assignment_cost(weights, row_idx, col_idx)
+        24.0
+
+    Parameters
+    ----------
+    weights : array_like
+        non-negative values of non-zero cells
+
+    row_idx : array_like
+        row index of each cell
+
+    col_idx : array_like
+        column index of each cell
+
+    dense_limit : int
+        components whose dense submatrix would have at most this many cells
+        are solved with a dense solver
+
+    num_procs : int
+        number of worker processes for solving large components
+
+    Returns
+    -------
+
+    cost : float
+    """
+    weights = np.asarray(weights, dtype=np.float64)
+    row_idx = np.asarray(row_idx, dtype=np.intp)
+    col_idx = np.asarray(col_idx, dtype=np.intp)
+    keep = weights != 0
+    weights, row_idx, col_idx = weights[keep], row_idx[keep], col_idx[keep]
+    if len(weights) == 0:
+        return 0.0
+    num_rows = int(row_idx.max()) + 1
+    num_cols = int(col_idx.max()) + 1
+
+    # label connected components of the bipartite graph (rows first)
+    graph = coo_matrix((np.ones(len(weights), dtype=np.int8),
+                        (row_idx, num_rows + col_idx)),
+                       shape=(num_rows + num_cols, num_rows + num_cols))
+    _, node_labels = connected_components(graph, directed=False)
+    edge_labels = node_labels[row_idx]
+    order = np.argsort(edge_labels, kind='mergesort')
+    edge_labels = edge_labels[order]
+    weights, row_idx, col_idx = weights[order], row_idx[order], col_idx[order]
+    starts = np.flatnonzero(np.r_[True, edge_labels[1:] != edge_labels[:-1]])
+    ends = np.r_[starts[1:], len(edge_labels)]
+
+    # components spanning a single row or a single column
+    num_comps = len(node_labels)
+    num_comp_rows = np.bincount(node_labels[:num_rows], minlength=num_comps)
+    num_comp_cols = np.bincount(node_labels[num_rows:], minlength=num_comps)
+    comp_ids = edge_labels[starts]
+    trivial = (num_comp_rows[comp_ids] == 1) | (num_comp_cols[comp_ids] == 1)
+    total = float(np.maximum.reduceat(weights, starts)[trivial].sum())
+
+    tasks = [(weights[start:end], row_idx[start:end], col_idx[start:end], dense_limit)
+             for start, end in izip(starts[~trivial], ends[~trivial])]
+    if num_procs > 1 and len(tasks) > 1:
+        pool = multiprocessing.Pool(min(num_procs, len(tasks)))
+        try:
+            costs = pool.map(_solve_component, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        costs = map(_solve_component, tasks)
+    return total + float(sum(costs))
@@ -90,16 +90,21 @@ References
 """
 
 import warnings
+import multiprocessing
 import numpy as np
 from math import log, sqrt, copysign
+from itertools import izip, islice
+from operator import attrgetter, methodcaller
 from collections import Set, namedtuple
 from pymaptools.containers import CrossTab, OrderedCrossTab
 from pymaptools.iter import iter_items, isiterable
 from pymaptools.sample import randround
 from lsh_hdc.utils import _div, _log
-from lsh_hdc.entropy import fentropy, fnum_pairs, fsum_pairs, \
-    emi_from_margins, assignment_cost
+from lsh_hdc.entropy import fentropy, fnum_pairs, \
+    emi_from_margins, emi_from_margins_fast, table_summary
+from lsh_hdc.matching import sparse_assignment_cost
 from scipy.stats import fisher_exact
+from scipy.sparse import coo_matrix
 
 
 def jaccard_similarity(iterable1, iterable2):
@@ -217,7 +222,663 @@ def hmean_weighted(x, y, ratio=1.0):
         return _div(x * y, lweight * x + rweight * y)
 
 
+def _as_label_array(labels):
+    """Convert a sequence of labels to a one-dimensional array
+
+    Numeric labels are kept as a numeric array. Anything else is stored in an
+    object array so that labels are not coerced to a common type (which would,
+    for example, turn ``1`` and ``'1'`` into the same label).
+    """
+    if not hasattr(labels, '__len__'):
+        labels = list(labels)
+    arr = np.asarray(labels)
+    if arr.ndim == 1 and arr.dtype.kind in 'iuf':
+        return arr
+    result = np.empty(len(labels), dtype=object)
+    for idx, label in enumerate(labels):
+        result[idx] = label
+    return result
+
+
+def _factorize(keys):
+    """Return unique keys and the index of each key among them
+
+    Dense non-negative integer keys are factorized in linear time with a
+    lookup table; other keys are sorted.
+    """
+    if keys.dtype.kind in 'iu' and len(keys) > 0:
+        min_key, max_key = keys.min(), keys.max()
+        if min_key >= 0 and max_key < 2 * len(keys) + 1024:
+            int_keys = keys.astype(np.intp)
+            present = np.bincount(int_keys) > 0
+            lookup = np.cumsum(present) - 1
+            return np.flatnonzero(present).astype(keys.dtype), lookup[int_keys]
+    return np.unique(keys, return_inverse=True)
+
+
+def _count_pairs(row_keys, col_keys, weights=None):
+    """Count occurrences (or sum weights) of unique (row, column) key pairs
+
+    Each pair is encoded as a single integer ``row * num_cols + col`` which is
+    then counted with ``bincount`` if the resulting table is dense enough, and
+    sorted otherwise.
+    """
+    row_labels, row_idx = _factorize(row_keys)
+    col_labels, col_idx = _factorize(col_keys)
+    row_idx, col_idx, counts = _count_codes(
+        row_idx, col_idx, len(row_labels), len(col_labels), weights=weights)
+    return row_labels[row_idx], col_labels[col_idx], counts
+
+
+def _count_codes(row_idx, col_idx, num_rows, num_cols, weights=None):
+    """Same as ``_count_pairs`` for already factorized keys
+
+    Returns row indices, column indices, and counts of non-zero cells.
+    """
+    codes = row_idx.astype(np.int64) * num_cols + col_idx
+    num_cells = num_rows * num_cols
+    if num_cells <= 4 * len(codes) + 1024:
+        counts = np.bincount(codes, weights=weights, minlength=num_cells)
+        codes = np.flatnonzero(counts)
+        counts = counts[codes]
+    else:
+        codes, inverse = np.unique(codes, return_inverse=True)
+        counts = np.bincount(inverse, weights=weights)
+    counts = counts.astype(np.int64)
+    return codes // num_cols, codes % num_cols, counts
+
+
+def crosstab_coo(labels_true, labels_pred, chunk_size=10 ** 7):
+    """Count co-occurring labels in coordinate (COO) format
+
+    Labels are processed in chunks of ``chunk_size``, and per-chunk counts are
+    merged whenever their total size exceeds ``chunk_size``, so that memory
+    used for intermediate arrays is bounded by chunk size and by the number of
+    non-zero cells rather than by the number of labels.
+
+    ::
+
+        >>> rows, cols, counts = crosstab_coo([1, 1, 2, 2], [3, 3, 3, 4])
+        >>> zip(rows, cols, counts)
+        [(1, 3, 2), (2, 3, 1), (2, 4, 1)]
+
+    Parameters
+    ----------
+    labels_true : collections.Sequence
+        row labels
+
+    labels_pred : collections.Sequence
+        column labels
+
+    chunk_size : int
+        number of labels to count at a time
+
+    Returns
+    -------
+
+    coo : tuple
+        row labels, column labels, and counts for each non-zero cell
+    """
+    accumulator = ContingencyAccumulator(chunk_size=chunk_size)
+    accumulator.update(labels_true, labels_pred)
+    return accumulator.to_coo()
+
+
+def _merge_pairs(parts):
+    """Merge several (rows, cols, counts) triples summing counts of same cells
+    """
+    rows, cols, counts = [np.concatenate(arrays) for arrays in izip(*parts)]
+    return _count_pairs(rows, cols, weights=counts)
+
+
+def _read_label_pairs(fhandle, delimiter):
+    """Generate pairs of labels from delimited lines of a file
+
+    Empty lines are skipped.
+    """
+    name = getattr(fhandle, 'name', '<file>')
+    for line_num, line in enumerate(fhandle, start=1):
+        line = line.rstrip('\r\n')
+        if not line:
+            continue
+        pair = line.split(delimiter, 1)
+        if len(pair) != 2:
+            raise ValueError("Delimiter %r not found on line %d of %s"
+                             % (delimiter, line_num, name))
+        yield pair
+
+
+class ContingencyAccumulator(object):
+    """Accumulate a contingency table from chunks of labels
+
+    Contingency tables are additive: the table of a concatenation of label
+    sequences is the sum of the tables of its parts. An accumulator keeps
+    counts of non-zero cells in coordinate format, can be updated with label
+    chunks as they become available, and can be merged with accumulators
+    filled in other processes (accumulators are picklable).
+
+    ::
+
+        >>> acc1 = ContingencyAccumulator()
+        >>> acc1.update([1, 1, 2], [1, 1, 1])
+        >>> acc2 = ContingencyAccumulator()
+        >>> acc2.update([2, 2, 3], [2, 2, 3])
+        >>> acc1.merge(acc2)
+        >>> acc1.grand_total
+        6
+        >>> round(acc1.to_table().adjusted_rand_index(), 3)
+        0.318
+
+    """
+    def __init__(self, chunk_size=10 ** 7):
+        """
+        Parameters
+        ----------
+        chunk_size : int
+            number of labels to count at a time, and number of non-zero cells
+            above which partial counts are merged
+        """
+        self.chunk_size = chunk_size
+        self._parts = []
+        self._num_pending = 0
+
+    @property
+    def grand_total(self):
+        return int(sum(counts.sum() for _, _, counts in self._parts))
+
+    def _add_part(self, part):
+        self._parts.append(part)
+        self._num_pending += len(part[2])
+        if len(self._parts) > 1 and self._num_pending > self.chunk_size:
+            self._compact()
+
+    def _compact(self):
+        if len(self._parts) > 1:
+            self._parts = [_merge_pairs(self._parts)]
+            self._num_pending = len(self._parts[0][2])
+
+    def update(self, labels_true, labels_pred):
+        """Count a chunk of label pairs
+
+        Parameters
+        ----------
+        labels_true : collections.Sequence
+            row labels
+
+        labels_pred : collections.Sequence
+            column labels
+        """
+        labels_true = _as_label_array(labels_true)
+        labels_pred = _as_label_array(labels_pred)
+        if len(labels_true) != len(labels_pred):
+            raise ValueError("label sequences must be of equal length")
+        chunk_size = self.chunk_size
+        for start in xrange(0, len(labels_true), chunk_size):
+            self._add_part(_count_pairs(labels_true[start:start + chunk_size],
+                                        labels_pred[start:start + chunk_size]))
+
+    def update_from_chunks(self, chunks):
+        """Count label pairs from an iterable of (labels_true, labels_pred)
+
+        Parameters
+        ----------
+        chunks : collections.Iterable
+            tuples of label sequences
+        """
+        for labels_true, labels_pred in chunks:
+            self.update(labels_true, labels_pred)
+
+    def update_from_files(self, fhandles, delimiter='\t', dtype=None):
+        """Count label pairs from delimited text files
+
+        Each line holds a pair of labels (true label first) separated by
+        delimiter. Empty lines are skipped, and ``ValueError`` is raised for
+        lines without a delimiter. Files are read in chunks of ``chunk_size``
+        lines.
+
+        Parameters
+        ----------
+        fhandles : collections.Iterable
+            file handles to read from
+
+        delimiter : str
+            label separator
+
+        dtype : type, optional
+            if given, labels are converted to this type (e.g. int)
+        """
+        for fhandle in fhandles:
+            pairs = _read_label_pairs(fhandle, delimiter)
+            while True:
+                chunk = list(islice(pairs, self.chunk_size))
+                if not chunk:
+                    break
+                labels_true, labels_pred = izip(*chunk)
+                if dtype is not None:
+                    labels_true = np.asarray(labels_true, dtype=dtype)
+                    labels_pred = np.asarray(labels_pred, dtype=dtype)
+                self.update(labels_true, labels_pred)
+
+    def merge(self, other):
+        """Add counts from another accumulator
+
+        Parameters
+        ----------
+        other : ContingencyAccumulator
+            accumulator to merge in (left unchanged)
+        """
+        for part in other._parts:
+            self._add_part(part)
+
+    def to_coo(self):
+        """Return counts of non-zero cells in coordinate (COO) format
+
+        Returns
+        -------
+
+        coo : tuple
+            row labels, column labels, and counts
+        """
+        self._compact()
+        if not self._parts:
+            empty = np.empty(0, dtype=object)
+            return empty, empty, np.empty(0, dtype=np.int64)
+        return self._parts[0]
+
+    def to_table(self, cls=None):
+        """Create a table from accumulated counts
+
+        Parameters
+        ----------
+        cls : type, optional
+            table class (defaults to ``ClusteringMetrics``)
+
+        Returns
+        -------
+
+        table : ContingencyTable
+        """
+        if cls is None:
+            cls = ClusteringMetrics
+        return cls.from_coo(*self.to_coo())
+
+
+def _sample_mutual_info(args):
+    """Unnormalized MI of random tables with given margins
+    """
+    row_totals, col_totals, seed, num_samples = args
+    random_state = np.random.RandomState(seed)
+    R, C = len(row_totals), len(col_totals)
+    N = row_totals.sum()
+    row_labels = np.repeat(np.arange(R, dtype=np.int64), row_totals)
+    col_labels = np.repeat(np.arange(C, dtype=np.int64), col_totals)
+    h_margins = fentropy(row_totals) + fentropy(col_totals)
+    dense = R * C <= 4 * N + 1024
+    result = np.empty(num_samples, dtype=np.float64)
+    for idx in xrange(num_samples):
+        random_state.shuffle(col_labels)
+        codes = row_labels * C + col_labels
+        if dense:
+            counts = np.bincount(codes)
+        else:
+            _, counts = np.unique(codes, return_counts=True)
+        result[idx] = h_margins - fentropy(counts)
+    return result
+
+
+def emi_monte_carlo(row_totals, col_totals, num_samples=100, seed=0,
+                    num_procs=1):
+    """Estimate Expected Mutual Information by random permutation
+
+    Under the null model of fixed margins, a random contingency table is
+    obtained by randomly permuting one of the two label vectors implied by the
+    margins. Each sample takes O(N) time regardless of table shape, which makes
+    this estimator preferable to exact computation when both R and C are
+    very large. Like ``emi_from_margins``, the result is *not* normalized by N.
+
+    Samples are split among ``num_procs`` worker processes.
+
+    Parameters
+    ----------
+    row_totals : array_like
+        row margin
+
+    col_totals : array_like
+        column margin
+
+    num_samples : int
+        number of random tables to draw
+
+    seed : int
+        random seed
+
+    num_procs : int
+        number of worker processes (no pool is created if one)
+
+    Returns
+    -------
+
+    emi : float
+        mean of sampled (unnormalized) mutual information
+
+    stderr : float
+        standard error of the mean, equal to sample standard deviation divided
+        by the square root of ``num_samples``
+    """
+    row_totals = np.asarray(row_totals, dtype=np.int64)
+    col_totals = np.asarray(col_totals, dtype=np.int64)
+    if row_totals.sum() != col_totals.sum():
+        raise ValueError("Sums of row and column margins must be equal")
+    num_procs = max(1, min(num_procs, num_samples))
+    tasks = [(row_totals, col_totals, seed + idx, len(chunk))
+             for idx, chunk in enumerate(np.array_split(np.arange(num_samples), num_procs))]
+    if num_procs == 1:
+        samples = map(_sample_mutual_info, tasks)
+    else:
+        pool = multiprocessing.Pool(num_procs)
+        try:
+            samples = pool.map(_sample_mutual_info, tasks)
+        finally:
+            pool.close()
+            pool.join()
+    samples = np.concatenate(samples)
+    if len(samples) < 2:
+        return float(np.mean(samples)), float('nan')
+    return float(np.mean(samples)), float(np.std(samples, ddof=1) / sqrt(len(samples)))
+
+
+def _batch_summaries(samples, row_idx, col_idx):
+    """Table summaries of several tables sharing the same non-zero cells
+
+    ``samples`` holds one table per row, with the value of each cell
+    ``(row_idx[k], col_idx[k])`` in column ``k``. Same as calling
+    ``lsh_hdc.entropy.table_summary`` on each table, but vectorized: returns
+    a summary whose fields are arrays (one value per table), followed by
+    arrays of the numbers of non-empty rows and columns of each table.
+    """
+    samples = np.asarray(samples, dtype=np.float64)
+    num_cells = len(row_idx)
+    ones = np.ones(num_cells, dtype=np.float64)
+    cells = np.arange(num_cells)
+    row_map = coo_matrix((ones, (row_idx, cells))).tocsr()
+    col_map = coo_matrix((ones, (col_idx, cells))).tocsr()
+    row_totals = row_map.dot(samples.T).T
+    col_totals = col_map.dot(samples.T).T
+
+    N = samples.sum(axis=1)
+    xlogx_N = _xlogx(N)
+    H_row = np.maximum(0.0, xlogx_N - _xlogx(row_totals).sum(axis=1))
+    H_col = np.maximum(0.0, xlogx_N - _xlogx(col_totals).sum(axis=1))
+    H_joint = np.maximum(0.0, xlogx_N - _xlogx(samples).sum(axis=1))
+    row_pairs = 0.5 * (row_totals * (row_totals - 1.0)).sum(axis=1)
+    col_pairs = 0.5 * (col_totals * (col_totals - 1.0)).sum(axis=1)
+    cell_pairs = 0.5 * (samples * (samples - 1.0)).sum(axis=1)
+    numer = row_totals[:, row_idx] * col_totals[:, col_idx]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratios = np.where(numer != 0.0, samples * samples / numer, 0.0)
+    chisq = N * ratios.sum(axis=1) - N
+    summary = table_summary_type(
+        N, H_row, H_col, H_joint, row_pairs, col_pairs, cell_pairs, chisq)
+    num_rows = (row_totals > 0.0).sum(axis=1)
+    num_cols = (col_totals > 0.0).sum(axis=1)
+    return summary, num_rows, num_cols
+
+
+def _batch_vi_similarity(summary, num_rows, num_cols, model='m1'):
+    """Vectorized ``ClusteringMetrics.vi_similarity`` (normalized)
+    """
+    N = summary.N
+    max_dist = np.log(N)
+    I_CK = summary.H_row + summary.H_col - summary.H_joint
+    dist = (summary.H_row + summary.H_col - 2 * I_CK) / N
+    if model == 'm1':
+        null_dist = np.log(num_rows) + np.log(num_cols)
+    elif model == 'm2r':
+        null_dist = np.log(num_cols) + summary.H_row / N
+    elif model == 'm2c':
+        null_dist = np.log(num_rows) + summary.H_col / N
+    else:
+        null_dist = (summary.H_row + summary.H_col) / N
+    null_score = max_dist - null_dist
+    score = max_dist - dist - null_score
+    max_score = max_dist - null_score
+    return np.where(score == max_score, 1.0, _div_array(score, max_score))
+
+
+def _batch_entropy_scores(summary):
+    """Vectorized ``ClusteringMetrics.entropy_scores`` (harmonic mean)
+    """
+    H_C, H_K = summary.H_row, summary.H_col
+    I_CK = H_C + H_K - summary.H_joint
+    with np.errstate(divide='ignore', invalid='ignore'):
+        h = np.where(H_C == 0.0, 1.0, np.maximum(0.0, I_CK / H_C))
+        c = np.where(H_K == 0.0, 1.0, np.maximum(0.0, I_CK / H_K))
+    v = np.where(h == c, h, np.where(
+        (h == 0.0) | (c == 0.0), 0.0, 2.0 * _div_array(h * c, h + c)))
+    return np.column_stack([h, c, v])
+
+
+# Metrics computed from batched summaries by ``_batch_scores``, as functions
+# of summary and of numbers of non-empty rows and columns
+_BATCH_METRICS = {
+    'chisq_score': lambda s, r, c: s.chisq,
+    'g_score': lambda s, r, c: 2.0 * (s.H_row + s.H_col - s.H_joint),
+    'mutual_info_score': lambda s, r, c: (s.H_row + s.H_col - s.H_joint) / s.N,
+    'entropy_scores': lambda s, r, c: _batch_entropy_scores(s),
+    'vi_distance': lambda s, r, c: _div_array(
+        (s.H_row + s.H_col - 2 * (s.H_row + s.H_col - s.H_joint)) / s.N,
+        np.log(s.N)),
+    'vi_similarity': _batch_vi_similarity,
+    'vi_similarity_m1': _batch_vi_similarity,
+    'vi_similarity_m2r': lambda s, r, c: _batch_vi_similarity(s, r, c, 'm2r'),
+    'vi_similarity_m2c': lambda s, r, c: _batch_vi_similarity(s, r, c, 'm2c'),
+    'vi_similarity_m3': lambda s, r, c: _batch_vi_similarity(s, r, c, 'm3'),
+    'mirkin_match_coeff': lambda s, r, c: _div_array(
+        s.N ** 2 - 2 * ((s.row_pairs - s.cell_pairs) + (s.col_pairs - s.cell_pairs)),
+        s.N ** 2),
+    'mirkin_mismatch_coeff': lambda s, r, c: _div_array(
+        2 * ((s.row_pairs - s.cell_pairs) + (s.col_pairs - s.cell_pairs)),
+        s.N ** 2),
+}
+
+
+# Pairwise metrics of ``ClusteringMetrics`` and the corresponding methods of
+# ``ConfusionMatrices``
+_BATCH_PAIRWISE_METRICS = {
+    'adjusted_rand_index': 'kappa',
+    'rand_index': 'accuracy',
+    'fowlkes_mallows': 'ochiai_coeff',
+    'adjusted_fowlkes_mallows': 'ochiai_coeff_adj',
+}
+
+
+def _batch_scores(cls, summary, num_rows, num_cols, metrics):
+    """Scores of several tables computed from batched summaries
+
+    Returns a dict of arrays (one row per table) for those metrics that can
+    be computed from summaries alone and are not overridden by ``cls``.
+    """
+    scores = {}
+    pairwise = None
+    for metric in metrics:
+        method = getattr(cls, metric, None)
+        if method is not None and \
+                method != getattr(ClusteringMetrics, metric, None):
+            continue
+        if metric in _BATCH_METRICS:
+            scores[metric] = _BATCH_METRICS[metric](summary, num_rows, num_cols)
+            continue
+        if method is None and hasattr(ConfusionMatrices, metric):
+            pairwise_method = metric
+        elif metric in _BATCH_PAIRWISE_METRICS:
+            pairwise_method = _BATCH_PAIRWISE_METRICS[metric]
+        else:
+            continue
+        if pairwise is None:
+            TP = summary.cell_pairs
+            FN = summary.row_pairs - TP
+            FP = summary.col_pairs - TP
+            TN = 0.5 * summary.N * (summary.N - 1.0) - TP - FP - FN
+            pairwise = ConfusionMatrices.from_ccw(TP, FP, TN, FN)
+        score = pairwise.get_score(pairwise_method)
+        scores[metric] = np.column_stack(score) if isinstance(score, tuple) \
+            else score
+    return scores
+
+
+def _bootstrap_batch(args):
+    """Scores of a batch of bootstrap replicates of a table
+
+    Returns a list of arrays (one per metric) with one row per replicate.
+    """
+    cls, coo, metrics, seed, batch_size = args
+    row_idx, col_idx, values = coo
+    N = values.sum()
+    random_state = np.random.RandomState(seed)
+    samples = random_state.multinomial(int(round(N)), values / N, size=batch_size)
+    summary, num_rows, num_cols = _batch_summaries(samples, row_idx, col_idx)
+    scores = _batch_scores(cls, summary, num_rows, num_cols, metrics)
+
+    # metrics that cannot be batched are scored on each replicate table
+    remaining = [metric for metric in metrics if metric not in scores]
+    if remaining:
+        replicates = []
+        for idx, sample in enumerate(samples):
+            keep = np.flatnonzero(sample)
+            table = cls.from_coo(row_idx[keep], col_idx[keep], sample[keep])
+            table._summary = table_summary_type(*[field[idx] for field in summary])
+            replicates.append(table.compute_many(remaining))
+        for metric in remaining:
+            scores[metric] = np.array([replicate[metric] for replicate in replicates],
+                                      dtype=np.float64)
+    return [scores[metric] for metric in metrics]
+
+
+class ExpectedTable(object):
+    """Lazy table of expected frequencies under a null model
+
+    Under null models ``m1``, ``m2r``, ``m2c``, and ``m3`` the expected
+    frequency of a cell is the product of a row weight and a column weight
+    divided by N, where weights are equal to table margins when the
+    corresponding margin is fixed, and to N/R (or N/C) otherwise. Instead of
+    materializing all RxC cells, this class keeps the weights and computes
+    cells on demand.
+
+    Since the table is an outer product of two non-negative vectors, its
+    maximum-weight assignment pairs the largest row weights with the largest
+    column weights (rearrangement inequality), so null assignment cost is
+    found by sorting the margins.
+
+    ::
+
+        >>> r = {1: {1: 16, 3: 2}, 2: {1: 1, 2: 3}, 3: {1: 4, 2: 5, 3: 5}}
+        >>> expected = ContingencyTable(rows=r).expected_table('m3')
+        >>> expected[1, 1]
+        10.5
+        >>> round(expected.assignment_cost(), 3)
+        14.389
+
+    """
+    def __init__(self, row_labels, col_labels, row_weights, col_weights):
+        self.row_labels = list(row_labels)
+        self.col_labels = list(col_labels)
+        self.row_weights = np.asarray(row_weights, dtype=np.float64)
+        self.col_weights = np.asarray(col_weights, dtype=np.float64)
+        self.grand_total = float(self.row_weights.sum())
+        self._row_index = {label: idx for idx, label in enumerate(self.row_labels)}
+        self._col_index = {label: idx for idx, label in enumerate(self.col_labels)}
+
+    @property
+    def shape(self):
+        return len(self.row_labels), len(self.col_labels)
+
+    def __getitem__(self, key):
+        ri, ci = key
+        return _div(self.row_weights[self._row_index[ri]] *
+                    self.col_weights[self._col_index[ci]], self.grand_total)
+
+    def iter_rows(self):
+        """Generate rows of expected frequencies as arrays
+        """
+        col_weights = self.col_weights / self.grand_total
+        for row_weight in self.row_weights:
+            yield row_weight * col_weights
+
+    def to_array(self):
+        """Materialize as a dense NumPy array
+        """
+        return np.outer(self.row_weights, self.col_weights) / self.grand_total
+
+    def assignment_cost(self):
+        """Total weight of maximum-weight matching of rows and columns
+        """
+        k = min(self.shape)
+        row_weights = np.sort(self.row_weights)[::-1][:k]
+        col_weights = np.sort(self.col_weights)[::-1][:k]
+        return _div(float(np.dot(row_weights, col_weights)), self.grand_total)
+
+
+table_summary_type = namedtuple(
+    "TableSummary", "N H_row H_col H_joint row_pairs col_pairs cell_pairs chisq")
+
+
+permutation_test_type = namedtuple(
+    "PermutationTest", "score p_value z_score num_permutations")
+
+
+# Intermediate results shared between metrics, each given as a tuple of the
+# intermediates it is computed from and a function computing (and caching) it
+# on a table
+_INTERMEDIATES = {
+    'coo': ((), methodcaller('to_coo')),
+    'summary': (('coo',), methodcaller('summary')),
+    'maxima': (('coo',), methodcaller('_margin_maxima')),
+    'assignment_cost': (('coo',), methodcaller('_get_assignment_cost')),
+    'pairwise': (('summary',), attrgetter('pairwise')),
+}
+
+
+# Intermediates required by each metric (metrics not listed here need none)
+_METRIC_DEPENDENCIES = {
+    'chisq_score': ('summary',),
+    'g_score': ('summary',),
+    'mutual_info_score': ('summary',),
+    'entropy_scores': ('summary',),
+    'adjusted_mutual_info': ('summary',),
+    'vi_distance': ('summary',),
+    'vi_similarity': ('summary',),
+    'vi_similarity_m1': ('summary',),
+    'vi_similarity_m2r': ('summary',),
+    'vi_similarity_m2c': ('summary',),
+    'vi_similarity_m3': ('summary',),
+    'split_join_distance': ('maxima',),
+    'split_join_similarity': ('maxima',),
+    'split_join_similarity_m1': ('maxima',),
+    'split_join_similarity_m2r': ('maxima',),
+    'split_join_similarity_m2c': ('maxima',),
+    'split_join_similarity_m3': ('maxima',),
+    'assignment_score': ('assignment_cost',),
+    'assignment_score_m1': ('assignment_cost',),
+    'assignment_score_m2r': ('assignment_cost',),
+    'assignment_score_m2c': ('assignment_cost',),
+    'assignment_score_m3': ('assignment_cost',),
+    'adjusted_rand_index': ('pairwise',),
+    'rand_index': ('pairwise',),
+    'fowlkes_mallows': ('pairwise',),
+    'adjusted_fowlkes_mallows': ('pairwise',),
+    'mirkin_match_coeff': ('pairwise',),
+    'mirkin_mismatch_coeff': ('pairwise',),
+}
+
+
 class ContingencyTable(CrossTab):
+    """Sparse contingency table with scoring methods
+
+    Intermediate results (COO arrays, summaries, margin maxima, assignment
+    cost, expected tables) are cached on first use. Tables are meant to be
+    scored once they are fully populated; if a table is modified in place
+    afterwards, call ``clear_cache`` before scoring it again.
+    """
 
     # Note: not subclassing Pandas DataFrame because the goal is to specifically
     # optimize for sparse use cases when >90% of the table consists of zeros.
@@ -226,9 +887,183 @@ class ContingencyTable(CrossTab):
 
     def __init__(self, *args, **kwargs):
         CrossTab.__init__(self, *args, **kwargs)
+        self.clear_cache()
+
+    def clear_cache(self):
+        """Discard cached intermediate results
+
+        Must be called after the table is modified in place.
+        """
         self._assignment_cost = None
+        self._coo = None
+        self._maxima = None
+        self._summary = None
         self._expected_freqs_ = {}
         self._expected_freqs_discrete_ = {}
+        self._expected_tables = {}
+
+    @classmethod
+    def from_labels(cls, labels_true, labels_pred):
+        """Create a table from two sequences of labels
+
+        Counting is vectorized with NumPy (see ``crosstab_coo``), leaving only
+        the non-zero cells to be inserted one by one. Note that only counting
+        is done in bounded memory: the table itself holds a Python dict entry
+        for every non-zero cell, so when only the counts are needed, use
+        ``crosstab_coo`` or ``ContingencyAccumulator.to_coo`` instead.
+        """
+        return cls.from_coo(*crosstab_coo(labels_true, labels_pred))
+
+    @classmethod
+    def from_coo(cls, row_labels, col_labels, counts):
+        """Create a table from counts of non-zero cells in coordinate format
+
+        Cells are inserted into nested dicts keyed by row and column labels,
+        one entry per non-zero cell.
+        """
+        rows = {}
+        for ri, ci, count in izip(row_labels.tolist(), col_labels.tolist(),
+                                  counts.tolist()):
+            rows.setdefault(ri, {})[ci] = count
+        return cls(rows=rows)
+
+    def to_coo(self):
+        """Convert non-zero cells to coordinate format
+
+        Returns
+        -------
+
+        coo : tuple
+            row indices, column indices and cell values, in the same order
+            as arguments of ``from_coo`` (indices refer to iteration order of
+            row and column totals)
+        """
+        coo = self._coo
+        if coo is not None:
+            return coo
+        row_index = {label: idx for idx, label in enumerate(self.row_totals)}
+        col_index = {label: idx for idx, label in enumerate(self.col_totals)}
+        num_cells = len(self)
+        values = np.empty(num_cells, dtype=np.float64)
+        row_idx = np.empty(num_cells, dtype=np.intp)
+        col_idx = np.empty(num_cells, dtype=np.intp)
+        for k, ((ri, ci), value) in enumerate(self.iteritems()):
+            values[k] = value
+            row_idx[k] = row_index[ri]
+            col_idx[k] = col_index[ci]
+        coo = self._coo = (row_idx, col_idx, values)
+        return coo
+
+    def _is_integral(self):
+        """Whether all cells hold whole numbers
+        """
+        values = self.to_coo()[2]
+        return bool(np.all(np.mod(values, 1.0) == 0.0))
+
+    def _margin_maxima(self):
+        """Sums of row and column maxima and largest row and column totals
+
+        Used by split-join scores. The result is cached.
+        """
+        maxima = self._maxima
+        if maxima is None:
+            row_idx, col_idx, values = self.to_coo()
+            R, C = self.shape
+            row_max = np.zeros(R, dtype=np.float64)
+            col_max = np.zeros(C, dtype=np.float64)
+            np.maximum.at(row_max, row_idx, values)
+            np.maximum.at(col_max, col_idx, values)
+            row_max_sum, col_max_sum = row_max.sum(), col_max.sum()
+            if self._is_integral():
+                row_max_sum, col_max_sum = int(row_max_sum), int(col_max_sum)
+            maxima = self._maxima = (
+                row_max_sum, col_max_sum,
+                max(self.row_totals.itervalues()) if R else 0,
+                max(self.col_totals.itervalues()) if C else 0)
+        return maxima
+
+    def summary(self):
+        """Entropies, pair sums and chi-square statistic of the table
+
+        All of these are computed together in a single scan over non-zero
+        cells (see ``lsh_hdc.entropy.table_summary``), and the result is
+        cached.
+
+        Returns
+        -------
+
+        summary : TableSummary
+        """
+        summary = self._summary
+        if summary is None:
+            R, C = self.shape
+            row_idx, col_idx, values = self.to_coo()
+            summary = self._summary = table_summary_type(*table_summary(
+                values, row_idx, col_idx, num_rows=R, num_cols=C))
+        return summary
+
+    def get_score(self, scoring_method, *args, **kwargs):
+        """Evaluate specified scoring method
+        """
+        method = getattr(self, scoring_method)
+        return method(*args, **kwargs)
+
+    def _metric_dependencies(self, scoring_method):
+        return _METRIC_DEPENDENCIES.get(scoring_method, ())
+
+    def _evaluation_plan(self, metric_names):
+        """Intermediates required by metrics in order of computation
+
+        Intermediates form a DAG (see ``_INTERMEDIATES``), and are listed
+        after all of their dependencies, once each.
+        """
+        plan = []
+        seen = set()
+
+        def visit(node):
+            if node not in seen:
+                seen.add(node)
+                for dependency in _INTERMEDIATES[node][0]:
+                    visit(dependency)
+                plan.append(node)
+
+        for name in metric_names:
+            for node in self._metric_dependencies(name):
+                visit(node)
+        return plan
+
+    def compute_many(self, metric_names):
+        """Evaluate several scoring methods at once
+
+        Intermediate results shared by the metrics (entropies, pair sums,
+        row and column maxima, assignment cost, pairwise matrix) are computed
+        once in order of dependency before the metrics are evaluated with
+        ``get_score``.
+
+        ::
+
+            >>> Y1 = {(1, 2, 3), (4, 5, 6)}
+            >>> Y2 = {(1, 2), (3, 4, 5), (6,)}
+            >>> cm = ClusteringMetrics.from_partitions(Y1, Y2)
+            >>> scores = cm.compute_many(['split_join_distance', 'rand_index'])
+            >>> sorted(scores.items())
+            [('rand_index', 0.6), ('split_join_distance', 0.25)]
+
+        Parameters
+        ----------
+        metric_names : collections.Iterable
+            names of scoring methods
+
+        Returns
+        -------
+
+        scores : dict
+            mapping of metric names to scores
+        """
+        metric_names = list(metric_names)
+        for node in self._evaluation_plan(metric_names):
+            _INTERMEDIATES[node][1](self)
+        return {name: self.get_score(name) for name in metric_names}
 
     def to_array(self, default=0, cpad=False, rpad=False):
         """Convert to NumPy array
@@ -293,6 +1128,36 @@ class ContingencyTable(CrossTab):
         self._expected_freqs_[model] = table = self.__class__(rows=rows)
         return table
 
+    def expected_table(self, model='m3'):
+        """Lazy expected table given current margins
+
+        Unlike ``expected``, the returned ``ExpectedTable`` does not
+        materialize its cells, and is only available for null models ``m1``,
+        ``m2r``, ``m2c``, and ``m3``.
+        """
+        table = self._expected_tables.get(model)
+        if table is not None:
+            return table
+
+        N = float(self.grand_total)
+        R, C = self.shape
+        if model in ('m1', 'm2c'):
+            row_weights = np.repeat(N / R, R)
+        elif model in ('m2r', 'm3'):
+            row_weights = np.fromiter(
+                self.row_totals.itervalues(), dtype=np.float64, count=R)
+        else:
+            raise NotImplementedError(model)
+        if model in ('m1', 'm2r'):
+            col_weights = np.repeat(N / C, C)
+        else:
+            col_weights = np.fromiter(
+                self.col_totals.itervalues(), dtype=np.float64, count=C)
+
+        table = self._expected_tables[model] = ExpectedTable(
+            self.row_totals, self.col_totals, row_weights, col_weights)
+        return table
+
     def expected(self, model='m3', discrete=False, redraw=False):
         """Factory creating expected table given current margins
         """
@@ -397,14 +1262,7 @@ class ContingencyTable(CrossTab):
         19.256
 
         """
-        N = float(self.grand_total)
-        score = 0.0
-        for rm, cm, observed in self.iter_all_with_margins():
-            numer = rm * cm
-            if numer != 0:
-                expected = numer / N
-                score += (observed - expected) ** 2 / expected
-        return score
+        return self.summary().chisq
 
     def g_score(self):
         """G-statistic for RxC contingency table
@@ -438,9 +1296,10 @@ class ContingencyTable(CrossTab):
 
         Not normalized by N
         """
-        H_C = fentropy(self.row_totals)
-        H_K = fentropy(self.col_totals)
-        H_actual = fentropy(self.itervalues())
+        summary = self.summary()
+        H_C = summary.H_row
+        H_K = summary.H_col
+        H_actual = summary.H_joint
         H_expected = H_C + H_K
         I_CK = H_expected - H_actual
         return H_C, H_K, I_CK
@@ -507,11 +1366,49 @@ class ContingencyTable(CrossTab):
             raise NotImplementedError(mean)
         return h, c, rsquare
 
-    def adjusted_mutual_info(self):
+    def adjusted_mutual_info(self, method='exact', num_samples=100, seed=0,
+                             num_procs=1, return_stderr=False):
         """Adjusted Mutual Information for two partitions
 
         For a mathematical definition, see [1]_, [2]_, and [2]_.
 
+        Computing Expected Mutual Information (EMI) exactly takes time that
+        grows with the product of numbers of distinct row and column totals.
+        For tables where both are very large, ``method='approx'`` estimates EMI
+        by Monte Carlo sampling instead (see ``emi_monte_carlo``). The standard
+        error of the EMI estimate, :math:`SE_{EMI}`, is the sample standard
+        deviation over the square root of ``num_samples``, and the standard
+        error of the resulting score is propagated from it as
+
+        .. math::
+
+            SE_{AMI} = SE_{EMI} \\frac{MI_{max} - MI}{(MI_{max} - EMI)^2}.
+
+        By the central limit theorem, the estimated score lies within
+        :math:`1.96 \\times SE_{AMI}` of the exact one with probability of
+        about 95%. Asymptotic (chi-square) approximation of EMI is not offered
+        because it is biased on sparse tables such as those produced by
+        singleton-heavy clusterings, which is exactly when exact computation
+        becomes too expensive.
+
+        Parameters
+        ----------
+        method : str
+            'exact' or 'approx'
+
+        num_samples : int
+            number of random tables to draw (approximate method only)
+
+        seed : int
+            random seed (approximate method only)
+
+        num_procs : int
+            number of worker processes (approximate method only)
+
+        return_stderr : bool
+            whether to also return standard error of the score (zero for the
+            exact method)
+
         References
         ----------
 
@@ -544,7 +1441,7 @@ class ContingencyTable(CrossTab):
         if R == C == 1 or R == C == 0:
             # No clustering since the data is not split. This is a perfect match
             # hence return 1.0.
-            return 1.0
+            return (1.0, 0.0) if return_stderr else 1.0
 
         # In one step, calculate entropy for each labeling and mutual
         # information
@@ -552,10 +1449,21 @@ class ContingencyTable(CrossTab):
         mi_max = max(h_true, h_pred)
 
         # Calculate the expected value for the MI
-        emi = emi_from_margins(row_totals, col_totals)
+        if method == 'exact':
+            emi = emi_from_margins_fast(row_totals, col_totals)
+            emi_stderr = 0.0
+        elif method == 'approx':
+            emi, emi_stderr = emi_monte_carlo(
+                row_totals, col_totals, num_samples=num_samples, seed=seed,
+                num_procs=num_procs)
+        else:
+            raise NotImplementedError(method)
 
         # Calculate the adjusted MI score
         ami = (mi - emi) / (mi_max - emi)
+        if return_stderr:
+            stderr = emi_stderr * abs(mi_max - mi) / (mi_max - emi) ** 2
+            return ami, stderr
         return ami
 
     def assignment_score_m1(self, normalize=True, redraw=False):
@@ -589,9 +1497,10 @@ class ContingencyTable(CrossTab):
         computationally expensive, but one way to get a better behaved metric
         is to just subtract the cost of a null model from the obtained score
         (in case of normalization, the null cost also has to be subtracted from
-        the maximum cost). Note that on large tables even finding the null cost
-        is too expensive, since expected tables have a lot less sparsity. Hence
-        the parameter is off by default.
+        the maximum cost). For continuous null models the null cost has a
+        closed form (see ``ExpectedTable``), while discrete null models
+        require solving the assignment problem on an expected table that has
+        a lot less sparsity than the original one.
 
         Alternatively this problem can be recast as that of finding a *maximum
         weighted bipartite match* [1]_.
@@ -634,14 +1543,7 @@ class ContingencyTable(CrossTab):
 
         """
 
-        # computing assignment cost is expensive so we cache it
-        cost = self._assignment_cost
-
-        if cost is None:
-            # guess matrix dtype
-            cost = assignment_cost(self.to_rows(), maximize=True)
-            self._assignment_cost = cost
-
+        cost = self._get_assignment_cost()
         N = self.grand_total
         R, C = self.shape
 
@@ -652,18 +1554,12 @@ class ContingencyTable(CrossTab):
             # equal under this assumption), so we can calculate expected cost
             # directly
             null_cost = N / float(max(R, C))
-        elif (not discrete) and model == 'm2r':
-            # fixed row margin, assignment also doesn't matter
-            sum_top_rows = N if R <= C else \
-                sum(sorted(self.row_totals.itervalues(), reverse=True)[:C])
-            null_cost = sum_top_rows / float(C)
-        elif (not discrete) and model == 'm2c':
-            # fixed column margin, assignment also doesn't matter
-            sum_top_cols = N if C <= R else \
-                sum(sorted(self.col_totals.itervalues(), reverse=True)[:R])
-            null_cost = sum_top_cols / float(R)
+        elif (not discrete) and model in ('m2r', 'm2c', 'm3'):
+            # expected table is an outer product of margins, so the optimal
+            # assignment pairs rows and columns in order of their margins
+            null_cost = self.expected_table(model).assignment_cost()
         else:
-            # all margins fixed, assignment matters
+            # discrete tables have to be solved
             expected = self.expected(
                 model=model, discrete=discrete, redraw=redraw)
             null_cost = expected.assignment_score(
@@ -676,6 +1572,22 @@ class ContingencyTable(CrossTab):
 
         return cost
 
+    def _get_assignment_cost(self):
+        """Total weight of maximum-weight matching of rows and columns
+
+        Computing assignment cost is expensive so we cache it.
+        """
+        cost = self._assignment_cost
+        if cost is None:
+            # solve on non-zero cells only, keeping integer type for integer
+            # tables
+            row_idx, col_idx, values = self.to_coo()
+            cost = sparse_assignment_cost(values, row_idx, col_idx)
+            if self._is_integral():
+                cost = int(round(cost))
+            self._assignment_cost = cost
+        return cost
+
     def vi_distance(self, normalize=True):
         """Variation of Information distance
 
@@ -739,13 +1651,14 @@ class ContingencyTable(CrossTab):
             null_dist = log(R) + log(C)
             null_score = max_dist - null_dist
         elif model == 'm2r':        # fixed row margin
-            null_dist = log(C) + fentropy(self.row_totals) / N
+            null_dist = log(C) + self.summary().H_row / N
             null_score = max_dist - null_dist
         elif model == 'm2c':        # fixed column margin
-            null_dist = log(R) + fentropy(self.col_totals) / N
+            null_dist = log(R) + self.summary().H_col / N
             null_score = max_dist - null_dist
         elif model == 'm3':         # both row and column margins fixed
-            null_dist = (fentropy(self.row_totals) + fentropy(self.col_totals)) / N
+            summary = self.summary()
+            null_dist = (summary.H_row + summary.H_col) / N
             null_score = max_dist - null_dist
         else:
             expected = self.expected(model)
@@ -821,8 +1734,7 @@ class ContingencyTable(CrossTab):
                <http://dl.acm.org/citation.cfm?id=868979>`_
 
         """
-        pa_B = sum(max(row) for row in self.iter_rows())
-        pb_A = sum(max(col) for col in self.iter_cols())
+        pa_B, pb_A, max_row_total, max_col_total = self._margin_maxima()
         score = pa_B + pb_A
 
         N = self.grand_total
@@ -833,13 +1745,11 @@ class ContingencyTable(CrossTab):
         elif model == 'm1':         # only N is fixed
             null_score = N / float(R) + N / float(C)
         elif model == 'm2r':        # fixed row margin
-            null_score = max(self.row_totals.itervalues()) + N / float(C)
+            null_score = max_row_total + N / float(C)
         elif model == 'm2c':        # fixed column margin
-            null_score = N / float(R) + max(self.col_totals.itervalues())
+            null_score = N / float(R) + max_col_total
         elif model == 'm3':         # both row and column margins fixed
-            null_score = \
-                max(self.row_totals.itervalues()) + \
-                max(self.col_totals.itervalues())
+            null_score = max_row_total + max_col_total
         else:
             expected = self.expected(model)
             null_score = expected.split_join_similarity(normalize=False, model=None)
@@ -993,8 +1903,8 @@ class ClusteringMetrics(ContingencyTable):
         0.75
     """
 
-    def __init__(self, *args, **kwargs):
-        ContingencyTable.__init__(self, *args, **kwargs)
+    def clear_cache(self):
+        ContingencyTable.clear_cache(self)
         self._pairwise = None
         self._pairwise_models = {}
 
@@ -1021,9 +1931,10 @@ class ClusteringMetrics(ContingencyTable):
         """
         pairwise = self._pairwise
         if pairwise is None:
-            actual_positives = fsum_pairs(self.iter_row_totals())
-            called_positives = fsum_pairs(self.iter_col_totals())
-            TP = fsum_pairs(self.itervalues())
+            summary = self.summary()
+            actual_positives = summary.row_pairs
+            called_positives = summary.col_pairs
+            TP = summary.cell_pairs
             FN = actual_positives - TP
             FP = called_positives - TP
             TN = fnum_pairs(self.grand_total) - TP - FP - FN
@@ -1039,6 +1950,232 @@ class ClusteringMetrics(ContingencyTable):
             method = getattr(self.pairwise, scoring_method)
         return method(*args, **kwargs)
 
+    def _metric_dependencies(self, scoring_method):
+        if scoring_method in _METRIC_DEPENDENCIES or \
+                hasattr(self.__class__, scoring_method):
+            return ContingencyTable._metric_dependencies(self, scoring_method)
+        # delegated to the pairwise confusion matrix
+        return ('pairwise',)
+
+    def bootstrap(self, metric_names, n_boot=1000, seed=0, alpha=0.05,
+                  num_procs=1, batch_size=32):
+        """Bootstrap percentile confidence intervals for several metrics
+
+        Resampling N observations with replacement is equivalent to drawing
+        cell counts from a multinomial distribution with probabilities
+        proportional to the counts of the original table, so replicates are
+        drawn directly over non-zero cells and no label arrays are rebuilt.
+        Replicates are processed in batches, and table summaries (entropies,
+        pair sums, chi-square) are computed for a whole batch at once. Each
+        batch is seeded from ``seed`` independently of how batches are
+        distributed among processes, so results are reproducible.
+
+        Metrics that depend only on table summaries (``chisq_score``,
+        ``g_score``, ``mutual_info_score``, ``entropy_scores``,
+        ``vi_distance``, ``vi_similarity*``, the Mirkin coefficients, and
+        pairwise metrics such as ``adjusted_rand_index``) are computed for a
+        whole batch at once with default arguments. Other metrics
+        (``adjusted_mutual_info``, ``split_join_*``, ``assignment_score*``,
+        and metrics overridden by subclasses) need the replicate tables, which
+        are then built one by one.
+
+        ::
+
+            >>> cm = ClusteringMetrics(rows=[[40, 5, 1], [3, 30, 2], [0, 4, 25]])
+            >>> low, high = cm.bootstrap(['adjusted_rand_index'], n_boot=200)['adjusted_rand_index']
+            >>> low < cm.adjusted_rand_index() < high
+            True
+
+        Parameters
+        ----------
+        metric_names : collections.Iterable
+            names of scoring methods (see ``compute_many``)
+
+        n_boot : int
+            number of bootstrap replicates
+
+        seed : int
+            random seed
+
+        alpha : float
+            intervals cover ``1 - alpha`` of the bootstrap distribution
+
+        num_procs : int
+            number of worker processes
+
+        batch_size : int
+            number of replicates per batch
+
+        Returns
+        -------
+
+        intervals : dict
+            mapping of metric names to (low, high) tuples (of arrays for
+            metrics returning tuples)
+        """
+        metric_names = list(metric_names)
+        coo = self.to_coo()
+        num_batches = (n_boot + batch_size - 1) // batch_size
+        seeds = np.random.RandomState(seed).randint(
+            np.iinfo(np.int32).max, size=num_batches)
+        tasks = [(self.__class__, coo, metric_names, int(batch_seed),
+                  min(batch_size, n_boot - idx * batch_size))
+                 for idx, batch_seed in enumerate(seeds)]
+        if num_procs > 1 and len(tasks) > 1:
+            pool = multiprocessing.Pool(min(num_procs, len(tasks)))
+            try:
+                batches = pool.map(_bootstrap_batch, tasks)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            batches = map(_bootstrap_batch, tasks)
+
+        percentiles = [50.0 * alpha, 100.0 - 50.0 * alpha]
+        intervals = {}
+        for idx, metric in enumerate(metric_names):
+            samples = np.concatenate([batch[idx] for batch in batches])
+            with warnings.catch_warnings():
+                # all-NaN slices give NaN intervals
+                warnings.simplefilter("ignore", RuntimeWarning)
+                low, high = np.nanpercentile(samples, percentiles, axis=0)
+            intervals[metric] = (low, high)
+        return intervals
+
+    def permutation_test(self, metric_names, max_permutations=1000, seed=0,
+                         alternative='greater', min_exceedances=10,
+                         num_procs=1, batch_size=50):
+        """Permutation test of agreement between two partitions
+
+        Tables under the null hypothesis of independence are obtained by
+        randomly shuffling column labels while keeping both margins fixed,
+        which applies to any metric, including those without an analytic null
+        model (e.g. ``talburt_wang_index``, ``muc_scores``, ``bc_metrics``).
+        Each permuted table is counted with ``ReferenceLabeling``, and
+        batches of permutations may be distributed among worker processes.
+
+        Sampling stops early once every metric has been exceeded (or matched)
+        by at least ``min_exceedances`` permuted scores, at which point
+        the p-value is known to be large enough for its sequential estimate
+        to be accurate [1]_. Otherwise ``max_permutations`` are drawn. Batches
+        are seeded in order from ``seed`` and the stopping rule is checked
+        after each batch in that order, so results do not depend on the
+        number of processes.
+
+        ::
+
+            >>> cm = ClusteringMetrics(rows=[[20, 2, 0], [1, 15, 3], [0, 2, 18]])
+            >>> test = cm.permutation_test(['talburt_wang_index', 'bc_metrics'],
+            ...                            max_permutations=100)
+            >>> test['bc_metrics'].p_value
+            array([0.00990099, 0.00990099, 0.00990099])
+
+        Parameters
+        ----------
+        metric_names : collections.Iterable
+            names of scoring methods (see ``compute_many``)
+
+        max_permutations : int
+            largest number of permutations to draw
+
+        seed : int
+            random seed
+
+        alternative : str
+            whether larger ('greater') or smaller ('less') scores indicate
+            agreement
+
+        min_exceedances : int
+            number of permuted scores at least as extreme as the actual score
+            after which sampling stops
+
+        num_procs : int
+            number of worker processes
+
+        batch_size : int
+            number of permutations per batch
+
+        Returns
+        -------
+
+        results : dict
+            mapping of metric names to ``permutation_test_type`` tuples of
+            score, p-value, z-score, and number of permutations drawn
+
+        References
+        ----------
+
+        .. [1] `Besag, J., & Clifford, P. (1991). Sequential Monte Carlo
+               p-values. Biometrika, 78(2), 301-304.
+               <https://doi.org/10.1093/biomet/78.2.301>`_
+        """
+        if alternative not in ('greater', 'less'):
+            raise ValueError("alternative must be 'greater' or 'less'")
+        metric_names = list(metric_names)
+        scores = self.compute_many(metric_names)
+        observed = [np.asarray(scores[metric], dtype=np.float64)
+                    for metric in metric_names]
+        row_totals = np.fromiter(self.row_totals.itervalues(), dtype=np.int64)
+        col_totals = np.fromiter(self.col_totals.itervalues(), dtype=np.int64)
+
+        num_batches = (max_permutations + batch_size - 1) // batch_size
+        seeds = np.random.RandomState(seed).randint(
+            np.iinfo(np.int32).max, size=num_batches)
+        samples = [[] for _ in metric_names]
+        exceedances = [np.zeros(obs.shape, dtype=np.int64) for obs in observed]
+        num_permutations = 0
+        resolved = False
+        pool = multiprocessing.Pool(num_procs) if num_procs > 1 else None
+        try:
+            batch_idx = 0
+            while batch_idx < num_batches and not resolved:
+                tasks = [(self.__class__, row_totals, col_totals, metric_names,
+                          int(seeds[idx]),
+                          min(batch_size, max_permutations - idx * batch_size))
+                         for idx in xrange(batch_idx,
+                                           min(batch_idx + max(num_procs, 1),
+                                               num_batches))]
+                batches = map(_permutation_batch, tasks) if pool is None \
+                    else pool.map(_permutation_batch, tasks)
+                for batch in batches:
+                    batch_idx += 1
+                    num_permutations += len(batch)
+                    for idx, obs in enumerate(observed):
+                        perm = np.array([replicate[idx] for replicate in batch],
+                                        dtype=np.float64)
+                        samples[idx].append(perm)
+                        extreme = perm >= obs if alternative == 'greater' \
+                            else perm <= obs
+                        exceedances[idx] += extreme.sum(axis=0)
+                    resolved = all(np.all(count >= min_exceedances)
+                                   for count in exceedances)
+                    if resolved:
+                        break
+        finally:
+            if pool is not None:
+                pool.close()
+                pool.join()
+
+        results = {}
+        for metric, obs, count, perms in \
+                izip(metric_names, observed, exceedances, samples):
+            perms = np.concatenate(perms)
+            p_value = np.where(
+                count >= min_exceedances,
+                count / float(num_permutations),
+                (count + 1.0) / (num_permutations + 1.0))
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", RuntimeWarning)
+                # avoid rounding noise in spread of constant scores
+                spread = np.where(
+                    np.nanmax(perms, axis=0) == np.nanmin(perms, axis=0),
+                    0.0, np.nanstd(perms, axis=0, ddof=1))
+                z_score = _div_array(obs - np.nanmean(perms, axis=0), spread)
+            results[metric] = permutation_test_type(*[
+                float(value) if np.ndim(value) == 0 else value
+                for value in (obs, p_value, z_score)] + [num_permutations])
+        return results
+
     def adjusted_rand_index(self):
         """Rand score (accuracy) corrected for chance
 
@@ -1131,6 +2268,138 @@ class ClusteringMetrics(ContingencyTable):
         return score
 
 
+# reference labeling and candidates inherited by forked workers
+_REFERENCE = None
+
+
+def _score_candidate(idx):
+    reference, labelings, metrics = _REFERENCE
+    return reference.crosstab(labelings[idx]).compute_many(metrics)
+
+
+class ReferenceLabeling(object):
+    """Ground truth labeling for scoring many candidate labelings
+
+    Labels are factorized, and their counts, entropy and pair sum computed,
+    only once. Each candidate is then cross-tabulated against the factorized
+    truth with a single ``bincount``, and only the column and joint terms of
+    the table summary (see ``ContingencyTable.summary``) are computed from the
+    resulting arrays.
+
+    ::
+
+        >>> ref = ReferenceLabeling([1, 1, 1, 2, 2, 2])
+        >>> scores = ref.score_many([[1, 1, 2, 3, 3, 3], [5, 5, 5, 6, 6, 6]],
+        ...                         ['split_join_similarity', 'rand_index'])
+        >>> [round(s['rand_index'], 3) for s in scores]
+        [0.867, 1.0]
+
+    """
+    def __init__(self, labels_true):
+        """
+        Parameters
+        ----------
+        labels_true : collections.Sequence
+            ground truth labels
+        """
+        self.labels, self.codes = _factorize(_as_label_array(labels_true))
+        self.row_totals = np.bincount(self.codes, minlength=len(self.labels))
+        row_totals = self.row_totals.astype(np.float64)
+        self.entropy = fentropy(row_totals)
+        self.row_pairs = 0.5 * np.dot(row_totals, row_totals - 1.0)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def crosstab(self, labels_pred, cls=ClusteringMetrics):
+        """Contingency table of ground truth vs given labels
+        """
+        labels_pred = _as_label_array(labels_pred)
+        if len(labels_pred) != len(self.codes):
+            raise ValueError("labelings must be of equal length")
+        col_labels, col_codes = _factorize(labels_pred)
+        num_rows, num_cols = len(self.labels), len(col_labels)
+        row_idx, col_idx, counts = _count_codes(
+            self.codes, col_codes, num_rows, num_cols)
+        table = cls.from_coo(self.labels[row_idx], col_labels[col_idx], counts)
+        table._summary = self._summary(row_idx, col_idx, counts, num_cols)
+        return table
+
+    def _summary(self, row_idx, col_idx, counts, num_cols):
+        """Table summary given non-zero cells of a candidate's table
+
+        Row terms are taken from ground truth, so that only column margins
+        and cell terms are computed.
+        """
+        values = counts.astype(np.float64)
+        N = float(len(self.codes))
+        col_totals = np.bincount(col_idx, weights=values, minlength=num_cols)
+        xlogx_N = float(_xlogx(N))
+        H_col = max(0.0, xlogx_N - _xlogx(col_totals).sum())
+        H_joint = max(0.0, xlogx_N - _xlogx(values).sum())
+        col_pairs = 0.5 * np.dot(col_totals, col_totals - 1.0)
+        cell_pairs = 0.5 * np.dot(values, values - 1.0)
+        numer = self.row_totals[row_idx] * col_totals[col_idx]
+        chisq = N * np.sum(values * values / numer) - N
+        return table_summary_type(N, self.entropy, H_col, H_joint,
+                                  self.row_pairs, col_pairs, cell_pairs, chisq)
+
+    def score_many(self, labelings, metrics, num_procs=1):
+        """Score several candidate labelings against ground truth
+
+        With more than one process, workers are forked with the factorized
+        ground truth and the candidates already in place, so that neither is
+        pickled; only the resulting scores are sent back.
+
+        Parameters
+        ----------
+        labelings : collections.Sequence
+            candidate labelings
+
+        metrics : collections.Iterable
+            names of scoring methods (see ``ContingencyTable.compute_many``)
+
+        num_procs : int
+            number of worker processes
+
+        Returns
+        -------
+
+        scores : list
+            a dict of scores for each labeling
+        """
+        global _REFERENCE
+        metrics = list(metrics)
+        _REFERENCE = (self, labelings, metrics)
+        try:
+            if num_procs > 1 and len(labelings) > 1:
+                pool = multiprocessing.Pool(min(num_procs, len(labelings)))
+                try:
+                    return pool.map(_score_candidate, xrange(len(labelings)))
+                finally:
+                    pool.close()
+                    pool.join()
+            return map(_score_candidate, xrange(len(labelings)))
+        finally:
+            _REFERENCE = None
+
+
+def _permutation_batch(args):
+    """Scores of tables with given margins and randomly permuted columns
+    """
+    cls, row_totals, col_totals, metrics, seed, batch_size = args
+    random_state = np.random.RandomState(seed)
+    reference = ReferenceLabeling(
+        np.repeat(np.arange(len(row_totals), dtype=np.int64), row_totals))
+    col_labels = np.repeat(np.arange(len(col_totals), dtype=np.int64), col_totals)
+    result = []
+    for _ in xrange(batch_size):
+        random_state.shuffle(col_labels)
+        scores = reference.crosstab(col_labels, cls=cls).compute_many(metrics)
+        result.append([scores[metric] for metric in metrics])
+    return result
+
+
 confmat2_type = namedtuple("ConfusionMatrix2", "TP FP TN FN")
 
 
@@ -1181,6 +2450,11 @@ class ConfusionMatrix2(ContingencyTable, OrderedCrossTab):
             rows = ((TP, FN), (FP, TN))
         ContingencyTable.__init__(self, rows=rows)
 
+    @classmethod
+    def from_labels(cls, labels_true, labels_pred):
+        # order of appearance of labels matters for 2x2 tables
+        return OrderedCrossTab.from_labels.__func__(cls, labels_true, labels_pred)
+
     def lform(self):
         """Factory creating L-form version of current table
         """
@@ -2302,6 +3576,432 @@ class ConfusionMatrix2(ContingencyTable, OrderedCrossTab):
     # true_skill = informedness
 
 
+def _div_array(numer, denom):
+    """Element-wise safe division with the same semantics as ``_div``
+    """
+    numer = np.asarray(numer, dtype=np.float64)
+    denom = np.asarray(denom, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        result = numer / denom
+        return np.where(
+            denom == 0.0,
+            np.where(numer == 0.0, np.nan,
+                     np.where(numer > 0.0, np.inf, -np.inf)),
+            result)
+
+
+def _hmean_array(x, y):
+    """Element-wise harmonic mean with the same semantics as ``hmean``
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    return np.select(
+        [x == y, (x == 0.0) | (y == 0.0)],
+        [x, 0.0],
+        2.0 * _div_array(x * y, x + y))
+
+
+def _hmean_weighted_array(x, y, ratio=1.0):
+    """Element-wise weighted harmonic mean (see ``hmean_weighted``)
+    """
+    lweight, rweight = ratio2weights(ratio)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    if lweight == 0.0:
+        either_zero = x
+    elif rweight == 0.0:
+        either_zero = y
+    else:
+        either_zero = 0.0
+    return np.select(
+        [x == y, (x == 0.0) | (y == 0.0)],
+        [x, either_zero],
+        _div_array(x * y, lweight * x + rweight * y))
+
+
+def _xlogx(x):
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(x > 0.0, x * np.log(x), 0.0)
+
+
+class ConfusionMatrices(object):
+    """Array of confusion matrices (2x2 contingency tables)
+
+    A vectorized counterpart of ``ConfusionMatrix2``: each metric method of
+    ``ConfusionMatrix2`` is implemented as an array expression over all
+    tables at once, including handling of degenerate tables and division by
+    zero (see ``lsh_hdc.utils._div``). Cell counts are stored as floating point
+    arrays.
+
+    ::
+
+        >>> cms = ConfusionMatrices.from_ccw([20, 0], [14, 0], [156, 5], [31, 0])
+        >>> cms.matthews_corr()
+        array([0.36177304, 0.5       ])
+        >>> round(ConfusionMatrix2.from_ccw(20, 14, 156, 31).matthews_corr(), 8)
+        0.36177304
+
+    Metrics that return tuples for a single table return tuples of arrays.
+    """
+
+    def __init__(self, TP, FN, FP, TN):
+        self.TP, self.FN, self.FP, self.TN = np.broadcast_arrays(
+            *[np.asarray(x, dtype=np.float64) for x in (TP, FN, FP, TN)])
+
+    def __len__(self):
+        return len(self.TP)
+
+    def __getitem__(self, idx):
+        """Individual table as ``ConfusionMatrix2``
+        """
+        return ConfusionMatrix2.from_ccw(*[x[idx] for x in self.to_ccw()])
+
+    @classmethod
+    def from_ccw(cls, TP, FP, TN, FN):
+        """Instantiate from arrays of counts in counter-clockwise order
+        """
+        return cls(TP, FN, FP, TN)
+
+    @classmethod
+    def from_array(cls, matrices):
+        """Instantiate from an Nx4 array of counts in counter-clockwise order
+        """
+        matrices = np.asarray(matrices)
+        return cls.from_ccw(*matrices.T)
+
+    def to_ccw(self):
+        return confmat2_type(TP=self.TP, FP=self.FP, TN=self.TN, FN=self.FN)
+
+    def get_score(self, scoring_method, *args, **kwargs):
+        """Evaluate specified scoring method
+        """
+        method = getattr(self, scoring_method)
+        return method(*args, **kwargs)
+
+    @property
+    def grand_total(self):
+        return self.TP + self.FN + self.FP + self.TN
+
+    def _entropies(self):
+        a, c, d, b = self.to_ccw()
+        n = a + b + c + d
+        xlogx_n = _xlogx(n)
+        H_C = np.maximum(0.0, xlogx_n - _xlogx(a + b) - _xlogx(c + d))
+        H_K = np.maximum(0.0, xlogx_n - _xlogx(a + c) - _xlogx(b + d))
+        H_actual = np.maximum(
+            0.0, xlogx_n - _xlogx(a) - _xlogx(b) - _xlogx(c) - _xlogx(d))
+        return H_C, H_K, H_C + H_K - H_actual
+
+    def hypergeometric(self):
+        """Signed negative logarithm of Fisher's exact test p-value
+
+        Not vectorized: calls ``ConfusionMatrix2.hypergeometric`` on every
+        table.
+        """
+        return np.array([self[idx].hypergeometric()
+                         for idx in xrange(len(self))], dtype=np.float64)
+
+    def chisq_score(self):
+        """Pearson's chi-square statistic
+        """
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        sum_ratio = 0.0
+        for f, rm, cm in ((a, p1, p2), (b, p1, q2), (c, q1, p2), (d, q1, q2)):
+            numer = rm * cm
+            with np.errstate(divide='ignore', invalid='ignore'):
+                sum_ratio = sum_ratio + np.where(numer != 0.0, f * f / numer, 0.0)
+        return n * sum_ratio - n
+
+    def g_score(self):
+        """G-statistic
+        """
+        _, _, I_CK = self._entropies()
+        return 2.0 * I_CK
+
+    def mutual_info_score(self):
+        """Mutual Information Score (divided by N)
+        """
+        _, _, I_CK = self._entropies()
+        return _div_array(I_CK, self.grand_total)
+
+    def entropy_scores(self, mean='harmonic'):
+        """Homogeneity, Completeness, and V-measure
+        """
+        H_C, H_K, I_CK = self._entropies()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            h = np.where(H_C == 0.0, 1.0, np.maximum(0.0, I_CK / H_C))
+            c = np.where(H_K == 0.0, 1.0, np.maximum(0.0, I_CK / H_K))
+        if mean == 'harmonic':
+            rsquare = _hmean_array(h, c)
+        elif mean == 'geometric':
+            rsquare = np.sqrt(h * c)
+        else:
+            raise NotImplementedError(mean)
+        return h, c, rsquare
+
+    def ACC(self):
+        return _div_array(self.TP + self.TN, self.grand_total)
+
+    def PPV(self):
+        return _div_array(self.TP, self.TP + self.FP)
+
+    def NPV(self):
+        return _div_array(self.TN, self.TN + self.FN)
+
+    def TPR(self):
+        return _div_array(self.TP, self.TP + self.FN)
+
+    def FPR(self):
+        return _div_array(self.FP, self.TN + self.FP)
+
+    def TNR(self):
+        return _div_array(self.TN, self.FP + self.TN)
+
+    def FNR(self):
+        return _div_array(self.FN, self.TP + self.FN)
+
+    def FDR(self):
+        return _div_array(self.FP, self.TP + self.FP)
+
+    def FOR(self):
+        return _div_array(self.FN, self.TN + self.FN)
+
+    def PLL(self):
+        return _div_array(self.TPR(), self.FPR())
+
+    def NLL(self):
+        return _div_array(self.FNR(), self.TNR())
+
+    def DOR(self):
+        a, c, d, b = self.to_ccw()
+        return _div_array(a * d, b * c)
+
+    def fscore(self, beta=1.0):
+        return _hmean_weighted_array(self.precision(), self.recall(), beta ** 2)
+
+    def dice_coeff(self):
+        a, c, _, b = self.to_ccw()
+        return _div_array(2 * a, 2 * a + b + c)
+
+    def overlap_coeff(self):
+        a, c, _, b = self.to_ccw()
+        a_max = np.minimum(a + b, a + c)
+        return np.where(a_max == 0, 0.0, _div_array(a, a_max))
+
+    def jaccard_coeff(self):
+        a, c, _, b = self.to_ccw()
+        return _div_array(a, a + b + c)
+
+    def ochiai_coeff_adj(self):
+        a, c, d, b = self.to_ccw()
+        p1, p2 = a + b, a + c
+        n = a + b + c + d
+        p1_p2 = p1 * p2
+        return np.select(
+            [n == 0, (a == n) | (d == n), (p1 == 0) | (p2 == 0)],
+            [np.nan, 0.5, 0.0],
+            _div_array(n * a - p1_p2, n * np.sqrt(p1_p2) - p1_p2))
+
+    def ochiai_coeff(self):
+        a, c, _, b = self.to_ccw()
+        p1, p2 = a + b, a + c
+        return np.select(
+            [(a == 0) & (b == 0) & (c == 0), a == 0],
+            [np.nan, 0.0],
+            _div_array(a, np.sqrt(p1 * p2)))
+
+    def sokal_sneath_coeff(self):
+        a, c, _, b = self.to_ccw()
+        return _div_array(a, a + 2 * (b + c))
+
+    def prevalence_index(self):
+        return _div_array(np.abs(self.TP - self.TN), self.grand_total)
+
+    def frequency_bias(self):
+        return _div_array(self.TP + self.FP, self.TP + self.FN)
+
+    def bias_index(self):
+        return _div_array(np.abs(self.FN - self.FP), self.grand_total)
+
+    def informedness(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        n = p1 + q1
+        return np.select(
+            [n == 0, (p1 == n) | (q1 == n)],
+            [np.nan, 0.0],
+            _div_array(self.covar(), p1 * q1))
+
+    def markedness(self):
+        a, c, d, b = self.to_ccw()
+        p2, q2 = a + c, b + d
+        n = p2 + q2
+        return np.select(
+            [n == 0, (p2 == n) | (q2 == n)],
+            [np.nan, 0.0],
+            _div_array(self.covar(), p2 * q2))
+
+    def xcoeff(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        cov = self.covar()
+        return np.select(
+            [n == 0, (a == n) | (d == n), (b == n) | (c == n),
+             cov > 0.0, cov < 0.0],
+            [np.nan, 0.5, -1.0,
+             _div_array(cov, np.minimum(p1 * q2, p2 * q1)),
+             _div_array(cov, np.minimum(n * c, n * b))],
+            0.0)
+
+    def pairwise_hcv(self, mean='geometric'):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = a + b + c + d
+        cov = self.covar()
+        if mean == 'harmonic':
+            k2_pos = _div_array(2.0 * cov, p2 * q1 + p1 * q2)
+            k2_neg = _div_array(2.0 * cov, n * (b + c))
+        elif mean == 'geometric':
+            k2_pos = _div_array(cov, np.sqrt(p1 * q1 * p2 * q2))
+            k2_neg = _div_array(cov, n * np.sqrt(b * c))
+        else:
+            raise NotImplementedError(mean)
+        conditions = [
+            n == 0.0, (a == n) | (d == n), b == n, c == n,
+            (p1 == n) | (q2 == n) | (p2 == n) | (q1 == n),
+            cov > 0.0, cov < 0.0]
+        k0 = np.select(conditions, [
+            np.nan, 0.5, -1.0, -0.0, 0.0,
+            _div_array(cov, p2 * q1), _div_array(cov, n * c)], 0.0)
+        k1 = np.select(conditions, [
+            np.nan, 0.5, -0.0, -1.0, 0.0,
+            _div_array(cov, p1 * q2), _div_array(cov, n * b)], 0.0)
+        k2 = np.select(conditions, [
+            np.nan, 0.5, -0.0, -0.0, 0.0, k2_pos, k2_neg], 0.0)
+        return k0, k1, k2
+
+    def kappas(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = a + b + c + d
+        cov = self.covar()
+        conditions = [
+            (a == n) | (d == n), b == n, c == n,
+            (p1 == n) | (q2 == n), (p2 == n) | (q1 == n)]
+        k0 = np.select(conditions, [np.nan, -np.inf, -0.0, np.nan, 0.0],
+                       _div_array(cov, p2 * q1))
+        k1 = np.select(conditions, [np.nan, -0.0, -np.inf, 0.0, np.nan],
+                       _div_array(cov, p1 * q2))
+        return k0, k1, self.kappa()
+
+    def loevinger_coeff(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        cov = self.covar()
+        return np.select(
+            [n == 0, (a == n) | (d == n), cov == 0.0],
+            [np.nan, 0.5, 0.0],
+            _div_array(cov, np.minimum(p1 * q2, p2 * q1)))
+
+    def kappa(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        return np.select(
+            [n == 0, (a == n) | (d == n)],
+            [np.nan, 0.5],
+            _div_array(2 * self.covar(), p1 * q2 + p2 * q1))
+
+    def mp_corr(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        return np.select(
+            [n == 0, (a == n) | (d == n), (b == n) | (c == n)],
+            [np.nan, 0.5, -0.5],
+            _div_array(2 * self.covar(), p1 * q1 + p2 * q2))
+
+    def matthews_corr(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = p1 + q1
+        return np.select(
+            [n == 0, (a == n) | (d == n), (b == n) | (c == n),
+             (p1 == n) | (p2 == n) | (q1 == n) | (q2 == n)],
+            [np.nan, 0.5, -0.5, 0.0],
+            _div_array(self.covar(), np.sqrt(p1 * q1 * p2 * q2)))
+
+    def mic_scores(self, mean='harmonic'):
+        h, c, rsquare = self.entropy_scores(mean=mean)
+        covsign = np.copysign(1.0, self.covar())
+        return covsign * np.sqrt(c), covsign * np.sqrt(h), covsign * np.sqrt(rsquare)
+
+    def yule_q(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = a + b + c + d
+        return np.select(
+            [n == 0, p1 == n, p2 == n, q1 == n, q2 == n],
+            [np.nan, _div_array(a - b, p1), _div_array(a - c, p2),
+             _div_array(d - c, q1), _div_array(d - b, q2)],
+            _div_array(self.covar(), a * d + b * c))
+
+    def yule_y(self):
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        n = a + b + c + d
+        sa, sb, sc, sd = np.sqrt(a), np.sqrt(b), np.sqrt(c), np.sqrt(d)
+        sad, sbc = np.sqrt(a * d), np.sqrt(b * c)
+        return np.select(
+            [n == 0, p1 == n, p2 == n, q1 == n, q2 == n],
+            [np.nan, _div_array(sa - sb, sa + sb), _div_array(sa - sc, sa + sc),
+             _div_array(sd - sc, sd + sc), _div_array(sd - sb, sd + sb)],
+            _div_array(sad - sbc, sad + sbc))
+
+    def cole_coeff(self):
+        return self.diseq_coeff(standardize=True)
+
+    def diseq_coeff(self, standardize=False):
+        cov = self.covar()
+        n = self.grand_total
+        if not standardize:
+            return _div_array(cov, n * n)
+        a, c, d, b = self.to_ccw()
+        p1, q1 = a + b, c + d
+        p2, q2 = a + c, b + d
+        return np.select(
+            [n == 0, (a == n) | (d == n), (b == n) | (c == n),
+             cov > 0.0, cov < 0.0],
+            [np.nan, 0.5, -0.5,
+             _div_array(cov, np.minimum(p1 * q2, p2 * q1)),
+             _div_array(cov, np.minimum(p1 * p2, q1 * q2))],
+            0.0)
+
+    def covar(self):
+        a, c, d, b = self.to_ccw()
+        return a * d - b * c
+
+    precision = PPV
+    recall = TPR
+    accuracy = ACC
+    sensitivity = TPR
+    specificity = TNR
+
+
 def mutual_info_score(labels_true, labels_pred):
     """Memory-efficient replacement for equivalently named Sklean function
     """
@@ -17,8 +17,8 @@ from pymaptools.benchmark import PMTimer
 from lsh_hdc.monte_carlo import utils
 from lsh_hdc.fent import minmaxr
 from lsh_hdc.utils import _div
-from lsh_hdc.metrics import ClusteringMetrics, ConfusionMatrix2
-from lsh_hdc.ranking import dist_auc
+from lsh_hdc.metrics import ClusteringMetrics, ConfusionMatrix2, ConfusionMatrices
+from lsh_hdc.ranking import dist_auc_many
 from sklearn.metrics.ranking import auc
 
 
@@ -510,9 +510,19 @@ class Grid(object):
                 return idx, mx
 
     def compute(self, scores, show_progress=False, dtype=np.float16):
-        result = defaultdict(partial(np.empty, (self.n,), dtype=dtype))
         if not isiterable(scores):
             scores = [scores]
+        result = defaultdict(partial(np.empty, (self.n,), dtype=dtype))
+        if self.grid_type in ['matrices']:
+            # scores implemented by ConfusionMatrices are computed for all
+            # tables at once, the rest (e.g. those inherited by
+            # ConfusionMatrix2 from ContingencyTable) one table at a time
+            vectorized = [score for score in scores
+                          if hasattr(ConfusionMatrices, score)]
+            result.update(self.compute_matrices(vectorized, dtype=dtype))
+            scores = [score for score in scores if score not in vectorized]
+            if not scores:
+                return result
         for idx, conf in self.iter_matrices():
             if show_progress:
                 pct_done = 100 * idx / float(self.n)
@@ -527,6 +537,20 @@ class Grid(object):
                     result[score][idx] = score_arr
         return result
 
+    def compute_matrices(self, scores, dtype=np.float16):
+        """Score all 2x2 tables of a matrix grid at once
+        """
+        matrices = ConfusionMatrices.from_array(self.grid[0])
+        result = {}
+        for score in scores:
+            score_arr = matrices.get_score(score)
+            if isinstance(score_arr, tuple):
+                for j, val in enumerate(score_arr):
+                    result["%s-%d" % (score, j)] = val.astype(dtype)
+            else:
+                result[score] = score_arr.astype(dtype)
+        return result
+
     def compare(self, others, scores, dtype=np.float16, plot=False):
         result0 = self.compute(scores, dtype=dtype)
 
@@ -542,12 +566,15 @@ class Grid(object):
                 from palettable import colorbrewer
                 colors = colorbrewer.get_map('Set1', 'qualitative', 9).mpl_colors
 
-            result_row = {}
-            for score_name, scores0 in result0.iteritems():
-                scores1 = result1[score_name]
-                auc_score = dist_auc(scores0, scores1)
-                result_row[score_name] = auc_score
-                if plot:
+            score_names = result0.keys()
+            auc_scores = dist_auc_many(
+                np.column_stack([result0[name] for name in score_names]),
+                np.column_stack([result1[name] for name in score_names]))
+            result_row = dict(izip(score_names, auc_scores))
+            if plot:
+                for score_name, auc_score in result_row.iteritems():
+                    scores0 = result0[score_name]
+                    scores1 = result1[score_name]
                     scores0p = [x for x in scores0 if not np.isnan(x)]
                     scores1p = [x for x in scores1 if not np.isnan(x)]
                     hmin0, hmax0 = minmaxr(scores0p)
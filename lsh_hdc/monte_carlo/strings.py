@@ -330,18 +330,27 @@ LEGEND_METRIC_KWARGS = {
 
 
 def append_scores(cm, pairs, metrics):
+    metrics = list(metrics)
+    try:
+        results = cm.compute_many(metrics)
+    except AttributeError:
+        # shared intermediates are cached by now, so evaluating metrics one
+        # by one to skip undefined ones is cheap
+        results = {}
+        for metric in metrics:
+            try:
+                results[metric] = cm.get_score(metric)
+            except AttributeError:
+                logging.warn("Method %s not defined", metric)
     for metric in metrics:
-        try:
-            scores = cm.get_score(metric)
-        except AttributeError:
-            logging.warn("Method %s not defined", metric)
+        if metric not in results:
             continue
+        scores = results[metric]
+        if isiterable(scores):
+            for idx, score in enumerate(scores):
+                pairs.append(("%s-%d" % (metric, idx), score))
         else:
-            if isiterable(scores):
-                for idx, score in enumerate(scores):
-                    pairs.append(("%s-%d" % (metric, idx), score))
-            else:
-                pairs.append((metric, scores))
+            pairs.append((metric, scores))
 
 
 def add_incidence_metrics(args, clusters, pairs):
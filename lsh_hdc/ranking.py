@@ -94,11 +94,9 @@ References
 
 import warnings
 import numpy as np
-from itertools import izip, chain
-from operator import itemgetter
-from sklearn.metrics.ranking import auc, roc_curve
-from pymaptools.iter import aggregate_tuples
-from pymaptools.containers import labels_to_clusters
+from collections import defaultdict
+from itertools import izip, chain, imap
+from sklearn.metrics.ranking import auc
 
 
 def num2bool(num):
@@ -112,14 +110,172 @@ def num2bool(num):
     return num > 0
 
 
+def _binarize(labels_true, is_class_pos=num2bool):
+    """Boolean array marking positive class labels
+
+    The default predicate is applied to numeric arrays directly.
+    """
+    if is_class_pos is num2bool:
+        labels = np.asarray(labels_true)
+        if labels.dtype.kind in 'biuf':
+            return num2bool(labels)
+    return np.fromiter((is_class_pos(label) for label in labels_true),
+                       dtype=bool)
+
+
+def _group_by_score(scores, values):
+    """Sort by score in descending order and sum values of tied scores
+
+    Returns unique scores, number of tied entries, and sum of values for each
+    group, as well as the sort order. Values may have several columns.
+    """
+    order = np.argsort(-scores, kind='mergesort')
+    scores = scores[order]
+    starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    sizes = np.diff(np.r_[starts, len(scores)])
+    sums = np.add.reduceat(values[order], starts)
+    return scores[starts], sizes, sums, order
+
+
+def _counts_by_cluster_size(clusters, is_class_pos=num2bool):
+    """Numbers of clusters and of positive points per distinct cluster size
+
+    Clusters are consumed one at a time without collecting their points, so
+    memory used is proportional to the number of distinct cluster sizes.
+    Empty clusters are skipped.
+    """
+    num_clusters = defaultdict(int)
+    num_positives = defaultdict(int)
+    for cluster in clusters:
+        size = len(cluster)
+        if size:
+            num_clusters[size] += 1
+            num_positives[size] += sum(imap(is_class_pos, cluster))
+    sizes = sorted(num_clusters)
+    return (np.array(sizes, dtype=np.int64),
+            np.array([num_clusters[size] for size in sizes], dtype=np.int64),
+            np.array([num_positives[size] for size in sizes], dtype=np.int64))
+
+
+def aul_score_from_counts(counts_true, counts_pred, threshold=1, plot=False,
+                          num_clusters=None):
+    """Calculate AUL score given per-cluster counts
+
+    Clusters are sorted and grouped by size, and the area under the lift
+    curve is accumulated over groups of tied clusters with NumPy (see
+    ``LiftCurve``). An entry may also stand for several clusters of the same
+    size, in which case its count of positives is the total over those
+    clusters (see ``num_clusters``).
+
+    ::
+
+        >>> aul_score_from_counts([5, 0, 0], [5, 1, 1])
+        1.0
+
+    Parameters
+    ----------
+
+    counts_true : array, shape = [n_clusters]
+        Count of positives in cluster
+
+    counts_pred : array, shape = [n_clusters]
+        Predicted number of positives in each cluster (cluster size)
+
+    threshold : int, optional (default=1)
+        only predicted scores above this number considered accurate
+
+    plot : bool, optional (default=False)
+        whether to return X and Y data series for plotting
+
+    num_clusters : array, shape = [n_clusters], optional (default=None)
+        Number of clusters each entry stands for (one if not given)
+
+    Returns
+    -------
+
+    aul : float
+    """
+    counts_true = np.asarray(counts_true, dtype=np.float64)
+    counts_pred = np.asarray(counts_pred, dtype=np.float64)
+    if len(counts_pred) == 0:
+        return (0.0, np.empty(0), np.empty(0)) if plot else 0.0
+    if num_clusters is None:
+        num_clusters = np.ones_like(counts_pred)
+
+    pred_scores, _, group_sums, _ = _group_by_score(
+        counts_pred, np.column_stack((counts_true, num_clusters)))
+    group_heights = group_sums[:, 0]
+    num_true_scores = group_sums[:, 1]
+
+    # cluster size x number of clusters of given size
+    group_widths = pred_scores * num_true_scores
+    total_trues = np.cumsum(group_heights)
+    total_true = total_trues[-1]
+    total_any = group_widths.sum()
+
+    # penalize non-homogeneous clusters above threshold by assuming they are
+    # homogeneous; clusters at or below threshold contribute their actual
+    # number of positives
+    assumed_vertical = np.where(
+        pred_scores > threshold, group_widths, group_heights).sum()
+
+    # walking through tied clusters with averaged positive counts traces a
+    # staircase whose area has a closed form
+    aul = np.sum(total_trues * group_widths -
+                 (num_true_scores - 1) * pred_scores * group_heights / 2.0)
+
+    if total_true > total_any:
+        warnings.warn(
+            "Number of positives found (%d) exceeds total count of %d"
+            % (total_true, total_any)
+        )
+
+    rect_area = assumed_vertical * total_any
+
+    # special case: since normalizing the AUL defines it as always smaller
+    # than the bounding rectangle, when denominator in the expression below
+    # is zero, the AUL score is also equal to zero.
+    aul = 0.0 if rect_area == 0 else float(aul / rect_area)
+
+    if plot:
+        group_counts = num_true_scores.astype(np.int64)
+        widths = np.repeat(pred_scores, group_counts)
+        avg_true_scores = np.repeat(group_heights / num_true_scores,
+                                    group_counts)
+        bin_heights = np.cumsum(avg_true_scores)
+        right_edges = np.cumsum(widths)
+        xs = np.column_stack((right_edges - widths, right_edges)).ravel()
+        ys = np.repeat(bin_heights, 2)
+        return aul, xs / total_any, ys / assumed_vertical
+    else:
+        return aul
+
+
 class LiftCurve(object):
 
     """Lift Curve for cluster-size correlated classification
 
     """
 
-    def __init__(self, score_groups):
-        self._score_groups = list(score_groups)
+    def __init__(self, counts_true, counts_pred, num_clusters=None):
+        """
+        Parameters
+        ----------
+
+        counts_true : array, shape = [n_clusters]
+            Count of positives in cluster
+
+        counts_pred : array, shape = [n_clusters]
+            Predicted number of positives in each cluster
+
+        num_clusters : array, shape = [n_clusters], optional (default=None)
+            Number of clusters each entry stands for (see
+            ``aul_score_from_counts``)
+        """
+        self.counts_true = np.asarray(counts_true)
+        self.counts_pred = np.asarray(counts_pred)
+        self.num_clusters = None if num_clusters is None \
+            else np.asarray(num_clusters)
 
     @classmethod
     def from_counts(cls, counts_true, counts_pred):
@@ -135,20 +291,15 @@ class LiftCurve(object):
             Predicted number of positives in each cluster
 
         """
-
-        # convert input to a series of tuples
-        count_groups = izip(counts_pred, counts_true)
-
-        # sort tuples by predicted count in descending order
-        count_groups = sorted(count_groups, key=itemgetter(0), reverse=True)
-
-        # group tuples by predicted count so as to handle ties correctly
-        return cls(aggregate_tuples(count_groups))
+        return cls(counts_true, counts_pred)
 
     @classmethod
     def from_clusters(cls, clusters, is_class_pos=num2bool):
         """Instantiates class from clusters of class-coded points
 
+        Clusters of the same size are tied, so only the numbers of clusters
+        and of positives per distinct cluster size are kept.
+
         Parameters
         ----------
 
@@ -161,10 +312,9 @@ class LiftCurve(object):
         """
         # take all non-empty clusters, score them by size and by number of
         # ground truth positives
-        data = ((len(cluster), sum(is_class_pos(class_label) for class_label in cluster))
-                for cluster in clusters if cluster)
-        scores_pred, scores_true = zip(*data) or ([], [])
-        return cls.from_counts(scores_true, scores_pred)
+        sizes, num_clusters, num_positives = \
+            _counts_by_cluster_size(clusters, is_class_pos)
+        return cls(num_positives, sizes, num_clusters=num_clusters)
 
     @classmethod
     def from_labels(cls, labels_true, labels_pred, is_class_pos=num2bool):
@@ -183,8 +333,12 @@ class LiftCurve(object):
             Boolean predicate used to binarize true (class) labels
 
         """
-        clusters = labels_to_clusters(labels_true, labels_pred)
-        return cls.from_clusters(clusters, is_class_pos=is_class_pos)
+        y_true = _binarize(labels_true, is_class_pos)
+        _, clusters = np.unique(labels_pred, return_inverse=True)
+        counts_pred = np.bincount(clusters)
+        counts_true = np.bincount(clusters, weights=y_true,
+                                  minlength=len(counts_pred)).astype(np.int64)
+        return cls.from_counts(counts_true, counts_pred)
 
     def aul_score(self, threshold=1, plot=False):
         """Calculate AUL score
@@ -199,81 +353,9 @@ class LiftCurve(object):
             whether to return X and Y data series for plotting
 
         """
-        total_any = 0
-        total_true = 0
-        assumed_vertical = 0
-        aul = 0.0
-
-        if plot:
-            xs, ys = [], []
-            bin_height = 0.0
-            bin_right_edge = 0.0
-
-        # second pass: iterate over each group of predicted scores of the same
-        # size and calculate the AUL metric
-        for pred_score, true_scores in self._score_groups:
-            # number of clusters
-            num_true_scores = len(true_scores)
-
-            # sum total of positives in all clusters of given size
-            group_height = sum(true_scores)
-
-            total_true += group_height
-
-            # cluster size x number of clusters of given size
-            group_width = pred_score * num_true_scores
-
-            total_any += group_width
-
-            if pred_score > threshold:
-                # penalize non-homogeneous clusters simply by assuming that they
-                # are homogeneous, in which case their expected vertical
-                # contribution should be equal to their horizontal contribution.
-                height_incr = group_width
-            else:
-                # clusters of size one are by definition homogeneous so their
-                # expected vertical contribution equals sum total of any
-                # remaining true positives.
-                height_incr = group_height
-
-            assumed_vertical += height_incr
-
-            if plot:
-                avg_true_score = group_height / float(num_true_scores)
-                for _ in true_scores:
-                    bin_height += avg_true_score
-                    aul += bin_height * pred_score
-                    if plot:
-                        xs.append(bin_right_edge)
-                        bin_right_edge += pred_score
-                        xs.append(bin_right_edge)
-                        ys.append(bin_height)
-                        ys.append(bin_height)
-            else:
-                # if not tasked with generating plots, use a geometric method
-                # instead of looping
-                aul += (total_true * group_width -
-                        ((num_true_scores - 1) * pred_score * group_height) / 2.0)
-
-        if total_true > total_any:
-            warnings.warn(
-                "Number of positives found (%d) exceeds total count of %d"
-                % (total_true, total_any)
-            )
-
-        rect_area = assumed_vertical * total_any
-
-        # special case: since normalizing the AUL defines it as always smaller
-        # than the bounding rectangle, when denominator in the expression below
-        # is zero, the AUL score is also equal to zero.
-        aul = 0.0 if rect_area == 0 else aul / rect_area
-
-        if plot:
-            xs = np.array(xs, dtype=float) / total_any
-            ys = np.array(ys, dtype=float) / assumed_vertical
-            return aul, xs, ys
-        else:
-            return aul
+        return aul_score_from_counts(
+            self.counts_true, self.counts_pred, threshold=threshold, plot=plot,
+            num_clusters=self.num_clusters)
 
     def plot(self, threshold=1, fill=True, marker=None, save_to=None):  # pragma: no cover
         """Create a graphical representation of Lift Curve
@@ -412,6 +494,53 @@ class RocCurve(object):
         all_scores = zip(*chain(scores_neg, scores_pos)) or ([], [])
         return cls.from_labels(*all_scores)
 
+    @classmethod
+    def from_counts(cls, scores, counts_pos, counts_neg):
+        """Instantiate given counts of positives and negatives per score
+
+        Scores need not be unique or sorted. Points on the curve correspond
+        to distinct scores taken as thresholds in descending order, preceded
+        by the origin, so memory used is proportional to the number of
+        distinct scores rather than to the number of samples.
+
+        ::
+
+            >>> c = RocCurve.from_counts([3, 2, 1], [4, 1, 0], [0, 1, 3])
+            >>> c.fprs
+            array([0.  , 0.  , 0.25, 1.  ])
+            >>> c.tprs
+            array([0. , 0.8, 1. , 1. ])
+
+        Parameters
+        ----------
+
+        scores : array, shape = [n_scores]
+            Predicted scores
+
+        counts_pos : array, shape = [n_scores]
+            Number of positive samples with given score
+
+        counts_neg : array, shape = [n_scores]
+            Number of negative samples with given score
+        """
+        scores = np.asarray(scores)
+        counts = np.column_stack((
+            np.asarray(counts_pos, dtype=np.float64),
+            np.asarray(counts_neg, dtype=np.float64)))
+        if len(scores) == 0:
+            thresholds, counts = np.empty(0), np.zeros((0, 2))
+        else:
+            thresholds, _, counts, _ = _group_by_score(scores, counts)
+        cum_pos, cum_neg = np.cumsum(np.vstack(([0.0, 0.0], counts)), axis=0).T
+        if cum_pos[-1] == 0 or cum_neg[-1] == 0:
+            warnings.warn("ROC curve undefined without both positive and "
+                          "negative samples")
+        with np.errstate(divide='ignore', invalid='ignore'):
+            tprs = cum_pos / cum_pos[-1]
+            fprs = cum_neg / cum_neg[-1]
+        thresholds = np.r_[thresholds[:1] + 1, thresholds]
+        return cls(fprs, tprs, thresholds=thresholds)
+
     @classmethod
     def from_labels(cls, labels_true, y_score, is_class_pos=num2bool):
         """Instantiate assuming binary labeling of {0, 1}
@@ -425,20 +554,19 @@ class RocCurve(object):
         is_class_pos: label_true -> Bool
             Boolean predicate used to binarize true (class) labels
         """
-
-        # num2bool Y labels
-        y_true = map(is_class_pos, labels_true)
-
-        # calculate axes
-        fprs, tprs, thresholds = roc_curve(
-            y_true, y_score, pos_label=True)
-
-        return cls(fprs, tprs, thresholds=thresholds)
+        y_true = _binarize(labels_true, is_class_pos)
+        scores, inverse = np.unique(y_score, return_inverse=True)
+        counts_pos = np.bincount(inverse, weights=y_true, minlength=len(scores))
+        counts_all = np.bincount(inverse, minlength=len(scores))
+        return cls.from_counts(scores, counts_pos, counts_all - counts_pos)
 
     @classmethod
     def from_clusters(cls, clusters, is_class_pos=num2bool):
         """Instantiates class from clusters of class-coded points
 
+        Every point is scored by the size of its cluster, so positive and
+        negative counts are accumulated per cluster size.
+
         Parameters
         ----------
 
@@ -449,15 +577,10 @@ class RocCurve(object):
             Boolean predicate used to binarize true (class) labels
 
         """
-        y_true = []
-        y_score = []
-        for cluster in clusters:
-            pred_cluster = len(cluster)
-            for point in cluster:
-                true_cluster = is_class_pos(point)
-                y_true.append(true_cluster)
-                y_score.append(pred_cluster)
-        return cls.from_labels(y_true, y_score)
+        sizes, num_clusters, counts_pos = \
+            _counts_by_cluster_size(clusters, is_class_pos)
+        counts_all = sizes * num_clusters
+        return cls.from_counts(sizes, counts_pos, counts_all - counts_pos)
 
     def auc_score(self):
         """Replacement for Scikit-Learn's method
@@ -472,16 +595,25 @@ class RocCurve(object):
     def optimal_cutoff(self, scoring_method):
         """Optimal cutoff point on ROC curve under scoring method
 
-        The scoring method must take two arguments: fpr and tpr.
+        The scoring method must take two arguments: fpr and tpr. It is
+        applied to arrays of all points at once, falling back to calling it
+        for each point if it does not work on arrays.
         """
-        max_index = np.NINF
-        opt_pair = (np.nan, np.nan)
-        for pair in izip(self.fprs, self.tprs):
-            index = scoring_method(*pair)
-            if index > max_index:
-                opt_pair = pair
-                max_index = index
-        return opt_pair, max_index
+        fprs = np.asarray(self.fprs, dtype=np.float64)
+        tprs = np.asarray(self.tprs, dtype=np.float64)
+        try:
+            indices = np.asarray(scoring_method(fprs, tprs), dtype=np.float64)
+        except (TypeError, ValueError):
+            indices = None
+        if indices is None or indices.shape != fprs.shape:
+            # scoring method does not work on arrays
+            indices = np.array([scoring_method(*pair) for pair in izip(fprs, tprs)],
+                               dtype=np.float64)
+        indices[np.isnan(indices)] = np.NINF
+        if len(indices) == 0 or indices.max() == np.NINF:
+            return (np.nan, np.nan), np.NINF
+        idx = np.argmax(indices)
+        return (fprs[idx], tprs[idx]), indices[idx]
 
     @staticmethod
     def _informedness(fpr, tpr):
@@ -511,30 +643,113 @@ def roc_auc_score(y_true, y_score, sample_weight=None):
     return RocCurve.from_labels(y_true, y_score).auc_score()
 
 
-def dist_auc(scores0, scores1):
-    """AUC score for two distributions, with NaN correction
+def _column_ranks(values):
+    """Rank each column of a 2-D array, assigning average ranks to ties
 
-    Note: arithmetic mean appears to be appropriate here, as other means don't
-    result in total of 1.0 when sides are switched.
+    Ranks start at one. NaNs are ranked after all other values of their
+    column (in no particular order), so ranks of defined values are not
+    affected by them.
     """
-    scores0_len = len(scores0)
-    scores1_len = len(scores1)
+    num_rows, num_cols = values.shape
+    order = np.argsort(values, axis=0, kind='mergesort')
+    cols = np.arange(num_cols)
+    sorted_values = values[order, cols]
+    positions = np.arange(num_rows)[:, None]
+
+    # first and last sorted position of the run of ties each position is in
+    is_first = np.ones(values.shape, dtype=bool)
+    is_first[1:] = sorted_values[1:] != sorted_values[:-1]
+    is_last = np.ones(values.shape, dtype=bool)
+    is_last[:-1] = is_first[1:]
+    firsts = np.maximum.accumulate(np.where(is_first, positions, 0), axis=0)
+    lasts = np.minimum.accumulate(
+        np.where(is_last, positions, num_rows)[::-1], axis=0)[::-1]
+
+    ranks = np.empty(values.shape, dtype=np.float64)
+    ranks[order, cols] = 0.5 * (firsts + lasts) + 1.0
+    return ranks
+
+
+def dist_auc_many(scores0, scores1):
+    """AUC scores for pairs of distributions, with NaN correction
+
+    Batched version of ``dist_auc``: each column of ``scores0`` is compared
+    with the corresponding column of ``scores1``, so that all metrics in a
+    pair of result matrices (samples in rows, metrics in columns) are scored
+    in one call. The two matrices may have different numbers of rows.
+
+    ::
+
+        >>> nan = float('nan')
+        >>> scores0 = [[10, 1], [20, 2], [30, 3], [33, nan]]
+        >>> scores1 = [[nan, 2], [40, 2], [50, 2], [60, 2]]
+        >>> dist_auc_many(scores0, scores1)
+        array([0.9375, 0.5   ])
+
+    Parameters
+    ----------
+    scores0 : array_like
+        scores of the first (negative) distribution, one column per metric
+
+    scores1 : array_like
+        scores of the second (positive) distribution, one column per metric
 
-    scores0p = [x for x in scores0 if not np.isnan(x)]
-    scores1p = [x for x in scores1 if not np.isnan(x)]
+    Returns
+    -------
 
-    scores0n_len = scores0_len - len(scores0p)
-    scores1n_len = scores1_len - len(scores1p)
+    auc_scores : numpy.ndarray
+        one score per column
+    """
+    scores0 = np.asarray(scores0, dtype=np.float64)
+    scores1 = np.asarray(scores1, dtype=np.float64)
+    if scores0.ndim == 1:
+        scores0 = scores0.reshape(-1, 1)
+    if scores1.ndim == 1:
+        scores1 = scores1.reshape(-1, 1)
+    if scores0.shape[1] != scores1.shape[1]:
+        raise ValueError("Score matrices must have the same number of columns")
+
+    scores0_len = len(scores0)
+    scores1_len = len(scores1)
+    defined0 = ~np.isnan(scores0)
+    defined1 = ~np.isnan(scores1)
+    scores0d_len = defined0.sum(axis=0).astype(np.float64)
+    scores1d_len = defined1.sum(axis=0).astype(np.float64)
+
+    # Mann-Whitney U statistic for each column, obtained from the sum of ranks
+    # of the second distribution in the pooled sample. Since NaNs are ranked
+    # last, ranks of defined scores are the same as when NaNs are left out.
+    ranks = _column_ranks(np.vstack((scores0, scores1)))
+    rank_sums = np.where(defined1, ranks[scores0_len:], 0.0).sum(axis=0)
+    u_stats = rank_sums - 0.5 * scores1d_len * (scores1d_len + 1.0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        auc_scores = u_stats / (scores0d_len * scores1d_len)
 
     # ``nan_pairs`` are pairs for which it is impossible to define order, due
     # to at least one of the members of each being a NaN. ``def_pairs`` are
     # pairs for which order can be established.
-    all_pairs = 2 * scores0_len * scores1_len
-    nan_pairs = scores0n_len * scores1_len + scores1n_len * scores0_len
+    all_pairs = 2.0 * scores0_len * scores1_len
+    nan_pairs = (scores0_len - scores0d_len) * scores1_len + \
+        (scores1_len - scores1d_len) * scores0_len
     def_pairs = all_pairs - nan_pairs
 
     # the final score is the average of the score for the defined portion and
     # of random-chance AUC (0.5), weighted according to the number of pairs in
     # each group.
-    auc_score = RocCurve.from_scores(scores0p, scores1p).auc_score()
-    return np.average([auc_score, 0.5], weights=[def_pairs, nan_pairs])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (auc_scores * def_pairs + 0.5 * nan_pairs) / all_pairs
+
+
+def dist_auc(scores0, scores1):
+    """AUC score for two distributions, with NaN correction
+
+    The AUC of the defined (non-NaN) scores is computed from the Mann-Whitney
+    U statistic, which counts ties as half-correct and is equal to the area
+    under the ROC curve with ``scores1`` taken as positives.
+
+    Note: arithmetic mean appears to be appropriate here, as other means don't
+    result in total of 1.0 when sides are switched.
+    """
+    scores0 = np.asarray(scores0, dtype=np.float64).reshape(-1, 1)
+    scores1 = np.asarray(scores1, dtype=np.float64).reshape(-1, 1)
+    return dist_auc_many(scores0, scores1)[0]
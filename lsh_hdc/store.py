@@ -0,0 +1,155 @@
+"""
+Compact storage of hashed feature sets for exact similarity computation
+
+LSH candidate generation is probabilistic, and when candidates are merged
+through union-find, a single false positive joins two otherwise unrelated
+clusters. Verifying candidate pairs against exact Jaccard similarity prevents
+this, but requires keeping the feature sets of all documents seen so far.
+``ShingleStore`` keeps them as sorted arrays of 64-bit feature hashes laid out
+back to back in one growing buffer, with a second buffer of offsets marking
+where each document begins, so that memory overhead per document is constant
+regardless of the number of documents.
+"""
+
+import numpy as np
+from lsh_hdc import HASH_FUNC_TABLE, create_hash_factory
+
+
+def sorted_intersection_size(a, b):
+    """Size of intersection of two sorted arrays of unique values
+
+    ::
+
+        >>> a = np.array([1, 3, 5, 7], dtype=np.uint64)
+        >>> b = np.array([3, 4, 5, 8, 9], dtype=np.uint64)
+        >>> sorted_intersection_size(a, b)
+        2
+
+    """
+    if len(a) > len(b):
+        a, b = b, a
+    if len(a) == 0:
+        return 0
+    # binary-search elements of the shorter array in the longer one
+    pos = np.searchsorted(b, a)
+    pos[pos == len(b)] = len(b) - 1
+    return int(np.count_nonzero(b[pos] == a))
+
+
+def sorted_jaccard(a, b):
+    """Jaccard similarity of two sorted arrays of unique values
+
+    Two empty sets are considered identical.
+
+    ::
+
+        >>> a = np.array([1, 3, 5, 7], dtype=np.uint64)
+        >>> b = np.array([3, 4, 5, 8, 9], dtype=np.uint64)
+        >>> sorted_jaccard(a, b)
+        0.2857142857142857
+
+    """
+    intersection = sorted_intersection_size(a, b)
+    union = len(a) + len(b) - intersection
+    if union == 0:
+        return 1.0
+    return intersection / float(union)
+
+
+class ShingleStore(object):
+    """Arena of sorted feature hash arrays keyed by document label
+
+    ::
+
+        >>> store = ShingleStore(hashfun='builtin')
+        >>> store.add('x', ['a', 'b', 'c'])
+        >>> store.add('y', ['b', 'c', 'd'])
+        >>> store.jaccard('x', 'y')
+        0.5
+
+    """
+    def __init__(self, hashfun='metrohash', seed=0, capacity=1024):
+        """
+        :param hashfun: name of hash function to use for features
+        :type hashfun: str
+        :param seed: seed for hash function
+        :type seed: int
+        :param capacity: initial number of feature hashes to allocate space for
+        :type capacity: int
+        """
+        hash_factory = create_hash_factory(*HASH_FUNC_TABLE[hashfun])
+        self.hashfun = hash_factory(seed)
+        self.labels = {}
+        self.data = np.empty(max(1, capacity), dtype=np.uint64)
+        self.offsets = np.zeros(1024, dtype=np.int64)
+        self.size = 0
+
+    def __len__(self):
+        return len(self.labels)
+
+    def __contains__(self, label):
+        return label in self.labels
+
+    def _reserve(self, num_items):
+        """Ensure space for another document with num_items features
+        """
+        num_docs = len(self.labels)
+        if num_docs + 2 > len(self.offsets):
+            self.offsets = np.resize(self.offsets, 2 * len(self.offsets))
+        end = self.offsets[num_docs]
+        required = end + num_items
+        if required > len(self.data):
+            self.data = np.resize(self.data, max(required, 2 * len(self.data)))
+
+    def add(self, label, features):
+        """Store features of a document
+
+        Adding a label that is already present is a no-op.
+
+        :param label: document label
+        :param features: an iterable of features (e.g. shingles)
+        :type features: collections.Iterable
+        """
+        if label in self.labels:
+            return
+        hashfun = self.hashfun
+        self.add_hashes(label, np.fromiter(
+            (hashfun(feature) for feature in features), dtype=np.uint64))
+
+    def add_hashes(self, label, hashes):
+        """Store precomputed 64-bit feature hashes of a document
+
+        Hashes of all documents in a store must come from the same source
+        (either this method or ``add``) to be comparable. Adding a label that
+        is already present is a no-op.
+
+        :param label: document label
+        :param hashes: an array of feature hashes (duplicates allowed)
+        :type hashes: numpy.ndarray
+        """
+        if label in self.labels:
+            return
+        hashes = np.unique(np.asarray(hashes, dtype=np.uint64))
+        num_items = len(hashes)
+        self._reserve(num_items)
+        idx = len(self.labels)
+        start = self.offsets[idx]
+        self.data[start:start + num_items] = hashes
+        self.offsets[idx + 1] = start + num_items
+        self.labels[label] = idx
+        self.size = start + num_items
+
+    def get(self, label):
+        """Return sorted feature hashes for a label
+
+        :rtype: numpy.ndarray
+        """
+        idx = self.labels[label]
+        return self.data[self.offsets[idx]:self.offsets[idx + 1]]
+
+    def jaccard(self, label1, label2):
+        """Exact Jaccard similarity between two stored documents
+
+        :rtype: float
+        """
+        return sorted_jaccard(self.get(label1), self.get(label2))
@@ -0,0 +1,113 @@
+"""
+Rank registered hash functions by throughput and avalanche quality
+
+::
+
+    python scripts/bench_hashes.py --input data.txt --field 1
+    python scripts/bench_hashes.py --num_values 100000
+
+Throughput is measured on batch interfaces in ``HASH_MANY_TABLE`` and on
+scalar functions in ``HASH_FUNC_TABLE`` called through hash factories (as
+``MinHashSignature`` does). Avalanche bias is the mean absolute deviation
+from 0.5 of the probability that an output bit flips when a single input bit
+is flipped; lower is better.
+"""
+import sys
+import random
+import string
+import argparse
+import numpy as np
+from timeit import default_timer
+from lsh_hdc import HASH_FUNC_TABLE, HASH_MANY_TABLE, create_hash_factory
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', type=str, default=None,
+                        help='file to read values from (one per line)')
+    parser.add_argument('--field', type=int, default=None,
+                        help='use this space-separated field of each line')
+    parser.add_argument('--num_values', type=int, default=100000,
+                        help='number of values to hash')
+    parser.add_argument('--num_avalanche', type=int, default=1000,
+                        help='number of values to use for avalanche test')
+    parser.add_argument('--num_tests', type=int, default=3,
+                        help='how many timing runs (best is reported)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='hash seed')
+    namespace = parser.parse_args(args)
+    return namespace
+
+
+def read_values(args):
+    if args.input is None:
+        rng = random.Random(0)
+        alphabet = string.ascii_letters + string.digits
+        return [''.join(rng.choice(alphabet) for _ in xrange(rng.randint(4, 32)))
+                for _ in xrange(args.num_values)]
+    values = []
+    with open(args.input, 'r') as fhandle:
+        for line in fhandle:
+            line = line.rstrip('\n')
+            if args.field is not None:
+                line = line.split(' ')[args.field]
+            values.append(line)
+            if len(values) >= args.num_values:
+                break
+    return values
+
+
+def best_time(func, num_tests):
+    times = []
+    for _ in xrange(num_tests):
+        start = default_timer()
+        func()
+        times.append(default_timer() - start)
+    return min(times)
+
+
+def flip_bit(value, bit):
+    byte_idx, bit_idx = divmod(bit, 8)
+    return value[:byte_idx] + chr(ord(value[byte_idx]) ^ (1 << bit_idx)) + \
+        value[byte_idx + 1:]
+
+
+def avalanche_bias(hash_many, values, seed):
+    """Mean absolute deviation of output bit flip probability from 0.5
+    """
+    original = []
+    flipped = []
+    for value in values:
+        for bit in xrange(min(len(value), 8) * 8):
+            original.append(value)
+            flipped.append(flip_bit(value, bit))
+    diff = hash_many(original, seed) ^ hash_many(flipped, seed)
+    bits = np.unpackbits(diff.view(np.uint8)).reshape(len(diff), 64)
+    return np.mean(np.abs(bits.mean(axis=0) - 0.5))
+
+
+def run(args):
+    values = read_values(args)
+    num_values = len(values)
+    avalanche_values = values[:args.num_avalanche]
+    rows = []
+    for name, (hashfun, complex_types) in HASH_FUNC_TABLE.iteritems():
+        hash_many = HASH_MANY_TABLE[name]
+        scalar_fun = create_hash_factory(hashfun, complex_types)(args.seed)
+        batch_time = best_time(lambda: hash_many(values, args.seed),
+                               args.num_tests)
+        scalar_time = best_time(lambda: [scalar_fun(v) for v in values],
+                                args.num_tests)
+        bias = avalanche_bias(hash_many, avalanche_values, args.seed)
+        rows.append((name, num_values / batch_time / 1e6,
+                     num_values / scalar_time / 1e6, bias))
+
+    rows.sort(key=lambda row: row[1], reverse=True)
+    sys.stdout.write("%-12s %14s %14s %14s\n" % (
+        "hashfun", "batch Mval/s", "scalar Mval/s", "avalanche bias"))
+    for row in rows:
+        sys.stdout.write("%-12s %14.3f %14.3f %14.4f\n" % row)
+
+
+if __name__ == "__main__":
+    run(parse_args())
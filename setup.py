@@ -156,7 +156,8 @@ setup(
                 "include/assignmentoptimal.h",
             ],
             language="c",
-            extra_compile_args=CXXFLAGS,
+            extra_compile_args=CXXFLAGS + ["-fopenmp"],
+            extra_link_args=["-fopenmp"],
             include_dirs=[
                 numpy.get_include(),
                 "include",
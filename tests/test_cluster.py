@@ -2,7 +2,7 @@ import unittest
 from lsh_hdc.utils import randset
 from lsh_hdc import get_bandwidth
 from lsh_hdc.metrics import jaccard_similarity
-from lsh_hdc.cluster import MinHashCluster as Cluster
+from lsh_hdc.cluster import MinHashCluster as Cluster, Cluster as KeyCluster
 
 
 class TestCluster(unittest.TestCase):
@@ -40,6 +40,49 @@ class TestCluster(unittest.TestCase):
         num_clusters = len(cluster.get_clusters())
         self.assertEqual(2, num_clusters)
 
+    def test_verify_similar_sets(self):
+        """Verification should keep sets above threshold together"""
+        cluster = Cluster(width=10, bandwidth=2, verify_threshold=0.7)
+        cluster.add_item("abcdefg")
+        cluster.add_item("abcdefghi")
+        self.assertEqual(1, len(cluster.get_clusters()))
+
+    def test_verify_rejects_candidates(self):
+        """Verification should split candidates below threshold"""
+        cluster = Cluster(width=10, bandwidth=1, verify_threshold=0.9)
+        cluster.add_item("abcdefg")
+        cluster.add_item("abcdefghi")
+        self.assertEqual(2, len(cluster.get_clusters()))
+        self.assertEqual(1, len(cluster._verified))
+
+    def test_verify_add_key(self):
+        """Verification should apply to labels added by single keys"""
+        cluster = KeyCluster(verify_threshold=0.5)
+        cluster.add_key('k', label=1, features=['a', 'b', 'c'])
+        cluster.add_key('k', label=2, features=['a', 'b', 'd'])
+        cluster.add_key('k', label=3, features=['x', 'y', 'z'])
+        self.assertEqual([[1, 2], [3]],
+                         sorted(sorted(c) for c in cluster.get_clusters()))
+        with self.assertRaises(ValueError):
+            cluster.add_key('k', label=4)
+
+    def test_min_support(self):
+        """Labels should be merged only if they share min_support keys"""
+        cluster = KeyCluster(min_support=2)
+        cluster.add_item(['a', 'b', 'c'], label=1)
+        cluster.add_item(['a', 'x', 'y'], label=2)
+        cluster.add_item(['a', 'b', 'z'], label=3)
+        # re-adding an item should not inflate support
+        cluster.add_item(['x', 'p', 'q'], label=2)
+        cluster.add_item(['x', 'r', 's'], label=4)
+        self.assertEqual([[1, 3], [2], [4]],
+                         sorted(sorted(c) for c in cluster.get_clusters()))
+        # buckets should hold each label id once, also after new labels
+        # were added to a bucket that a label was re-added to
+        cluster.add_item(['x', 'b'], label=4)
+        self.assertEqual([1, 3], list(cluster.buckets['x']))
+        self.assertEqual([0, 2, 3], list(cluster.buckets['b']))
+
     def test_cluster_threshold(self):
         """Expected error for threshold to similarity should be reasonable"""
         n_tests = 50
@@ -0,0 +1,78 @@
+import random
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+from pymaptools.unionfind import UnionFind
+from lsh_hdc.components import DiskComponents
+
+
+class TestComponents(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_same_as_unionfind(self):
+        """Components should match those found by in-memory union-find"""
+        random.seed(0)
+        num_nodes = 500
+        edges = [(random.randrange(num_nodes), random.randrange(num_nodes))
+                 for _ in xrange(400)]
+        uf = UnionFind()
+        dc = DiskComponents(tmpdir=self.tmpdir, run_size=37, chunk_size=53)
+        for label in xrange(num_nodes):
+            uf[label]
+            dc[label]
+        for u, v in edges:
+            uf.union(u, v)
+            dc.union(u, v)
+        self.assertGreater(len(dc.runs), 1)
+        expected = sorted(sorted(s) for s in uf.sets())
+        self.assertEqual(expected, sorted(dc.sets()))
+        dc.close()
+
+    def test_batch_edges(self):
+        """Batched edges should give the same result as single ones"""
+        dc = DiskComponents(tmpdir=self.tmpdir, chunk_size=2)
+        dc.add_edges([5, 1, 3], [4, 2, 5])
+        dc.union(0, 2)
+        self.assertEqual([[0, 1, 2], [3, 4, 5]], sorted(sorted(s) for s in dc.sets()))
+        dc.close()
+
+    def test_chain(self):
+        """Long chains should collapse to the first registered label"""
+        dc = DiskComponents(tmpdir=self.tmpdir, run_size=10, chunk_size=7)
+        for label in xrange(99, 0, -1):
+            dc.union(label, label - 1)
+        components = set(component for _, component in dc.iter_components())
+        self.assertEqual({99}, components)
+        dc.close()
+
+    def test_write_components(self):
+        """Components should be written one label per line"""
+        dc = DiskComponents(tmpdir=self.tmpdir)
+        dc.union(2, 3)
+        dc[4]
+        fhandle = StringIO()
+        dc.write_components(fhandle)
+        self.assertEqual("2\t2\n3\t2\n4\t4\n", fhandle.getvalue())
+        dc.close()
+
+    def test_sparse_labels(self):
+        """Only registered labels should be output, whatever their type"""
+        dc = DiskComponents(tmpdir=self.tmpdir)
+        dc.union(0, 5)
+        dc.union(10, 12)
+        dc.union('doc-a', ('doc', 'b'))
+        self.assertEqual('doc-c', dc['doc-c'])
+        self.assertEqual(7, len(dc.compute()))
+        self.assertEqual([[0, 5], [10, 12], ['doc-a', ('doc', 'b')], ['doc-c']],
+                         dc.sets())
+        dc.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,12 +1,16 @@
+import os
 import unittest
 import sys
 import yaml
 from operator import itemgetter
 from functools import partial
 from itertools import islice
+from collections import defaultdict
+from StringIO import StringIO
 from pkg_resources import resource_filename
 from lsh_hdc import Shingler
 from lsh_hdc.cluster import MinHashCluster as Cluster, HDClustering
+from lsh_hdc.mapreduce import LocalMRDriver
 from lsh_hdc.preprocess import RegexTokenizer
 
 get_resource_name = partial(resource_filename, __name__)
@@ -135,6 +139,111 @@ class TestFiles(unittest.TestCase):
         # is_label_positive = lambda lbl: ':' in lbl
         self.assertEqual(177, len([c for c in clusters if len(c) > 1]))
 
+    @staticmethod
+    def load_simulated_cfg(**kwargs):
+        with open(get_resource_name('test_files.simulated.yaml'), 'r') as fhandle:
+            cfg = yaml.load(fhandle)['model']
+        cfg.update(kwargs)
+        return cfg
+
+    def test_simulated_hd_external(self):
+        """External-memory components should match in-memory clusters"""
+
+        with open(get_resource_name('data/simulated.txt'), 'r') as fhandle:
+            data = [line.rstrip().split(' ') for line in fhandle]
+
+        hdc = HDClustering(self.load_simulated_cfg(), content_field=1, get_body=itemgetter(1),
+                           get_label=itemgetter(0), seed=SEED)
+        expected = sorted(sorted(c) for c in hdc.clusters_from_iter(data))
+
+        fhandle = StringIO()
+        with HDClustering(self.load_simulated_cfg(), content_field=1,
+                          get_body=itemgetter(1), get_label=itemgetter(0),
+                          seed=SEED, external_memory=True) as hdc:
+            hdc.components_from_iter(data, fhandle)
+            tmpdir = hdc.cluster_builder.union_find.tmpdir
+        self.assertFalse(os.path.exists(tmpdir))
+        components = defaultdict(list)
+        for line in fhandle.getvalue().splitlines():
+            label, component = line.split('\t')
+            components[component].append(label)
+        self.assertEqual(len(data), sum(map(len, components.values())))
+        self.assertEqual(expected, sorted(sorted(c) for c in components.values()))
+
+    def test_hd_verify(self):
+        """Verification should reject candidates using pipeline shingle hashes"""
+        data = [(str(idx), "the quick brown fox jumps over the lazy dog "
+                           "number %d" % idx) for idx in xrange(20)]
+        hdc = HDClustering(self.load_simulated_cfg(), content_field=1,
+                           get_label=itemgetter(0), seed=SEED)
+        self.assertEqual(1, len(hdc.clusters_from_iter(data)))
+
+        # near-duplicates share 9 of 11 distinct shingles
+        hdc = HDClustering(self.load_simulated_cfg(), content_field=1,
+                           get_label=itemgetter(0), seed=SEED,
+                           verify_threshold=0.9)
+        self.assertEqual(20, len(hdc.clusters_from_iter(data)))
+        self.assertEqual(20, len(hdc.cluster_builder.store))
+        self.assertGreater(len(hdc.cluster_builder._verified), 0)
+        with self.assertRaises(RuntimeError):
+            list(hdc.mapper(data[0]))
+
+    def test_simulated_hd_universal(self):
+        """Hashing features once should give comparable clustering"""
+
+        with open(get_resource_name('data/simulated.txt'), 'r') as fhandle:
+            data = [line.rstrip().split(' ') for line in fhandle]
+
+        hdc = HDClustering(self.load_simulated_cfg(permutations='universal'),
+                           content_field=1, get_body=itemgetter(1),
+                           get_label=itemgetter(0), seed=SEED)
+        self.assertTrue(hdc.pipeline.hash_once)
+        self.assertTrue(hdc.pipeline.sketch_hash_once)
+        clusters = hdc.clusters_from_iter(data)
+        num_clusters = len([c for c in clusters if len(c) > 1])
+        self.assertGreater(num_clusters, 150)
+        self.assertLess(num_clusters, 250)
+
+    def test_edge_reducer_star(self):
+        """Edge reducer should emit a star rooted at the smallest label"""
+        cfg = self.load_simulated_cfg()
+        cfg['sketch']['enabled'] = False
+        hdc = HDClustering(cfg)
+        edges = list(hdc.edge_reducer('key', [(5, None), (2, None), (7, None), (5, None)]))
+        self.assertEqual([(2, 5), (2, 7)], edges)
+
+    def test_edge_reducer_support_window(self):
+        """Candidate pairs per bucket should be capped by support window"""
+        cfg = self.load_simulated_cfg(min_support=2)
+        cfg['sketch']['enabled'] = False
+        bucket = [(label, None) for label in xrange(10)]
+        pairs = list(HDClustering(cfg).edge_reducer('key', bucket))
+        self.assertEqual(45, len(pairs))
+        pairs = list(HDClustering(cfg, support_window=2).edge_reducer('key', bucket))
+        self.assertEqual(17, len(pairs))
+        self.assertEqual([((0, 1), True), ((0, 2), True), ((1, 2), True)], pairs[:3])
+
+    def test_simulated_hd_mr(self):
+        """Local MR driver should find the same clusters as in-memory run"""
+
+        with open(get_resource_name('data/simulated.txt'), 'r') as fhandle:
+            data = [line.rstrip().split(' ') for line in fhandle]
+
+        for min_support in (1, 2):
+            hdc = HDClustering(self.load_simulated_cfg(min_support=min_support),
+                               content_field=1, get_body=itemgetter(1),
+                               get_label=itemgetter(0), seed=SEED)
+            expected = sorted(sorted(c) for c in hdc.clusters_from_iter(data))
+
+            hdc = HDClustering(self.load_simulated_cfg(min_support=min_support),
+                               content_field=1, get_body=itemgetter(1),
+                               get_label=itemgetter(0), seed=SEED)
+            # small run size makes candidate pairs spill in several runs
+            driver = LocalMRDriver(hdc, num_procs=2, num_partitions=3,
+                                   chunk_size=1000, run_size=2000)
+            clusters = sorted(sorted(c) for c in driver.clusters_from_iter(data))
+            self.assertEqual(expected, clusters)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,72 @@
+import random
+import unittest
+import shutil
+import tempfile
+import numpy as np
+from lsh_hdc import MinHashSignature
+from lsh_hdc.utils import randset
+from lsh_hdc.forest import LSHForest, get_minhash_matrix, get_prefix_length
+
+
+class TestForest(unittest.TestCase):
+
+    def setUp(self):
+        random.seed(42)
+        self.signer = MinHashSignature(64, seed=42)
+        sets = [randset(value_range=(0, 1000), sample_range=(50, 100))
+                for _ in xrange(50)]
+        # add a near-duplicate of the first set
+        sets.append(set(list(sets[0])[:-1]))
+        self.sets = sets
+        self.sigs = get_minhash_matrix(self.signer, sets)
+
+    def test_matrix_shape(self):
+        """Minhash matrix should have one row per document"""
+        self.assertEqual((51, 64), self.sigs.shape)
+        self.assertEqual(np.uint64, self.sigs.dtype)
+
+    def test_prefix_length(self):
+        """Prefix length should decrease with decreasing threshold"""
+        self.assertGreater(get_prefix_length(8, 0.9),
+                           get_prefix_length(8, 0.5))
+        self.assertEqual(0, get_prefix_length(8, 0.0))
+
+    def test_query_self(self):
+        """Querying an indexed document should return it first"""
+        forest = LSHForest(num_trees=8).fit(self.sigs)
+        indices, sims = forest.query(self.sigs[10], k=5)
+        self.assertEqual(10, indices[0])
+        self.assertEqual(1.0, sims[0])
+        self.assertEqual(5, len(indices))
+        self.assertTrue(np.all(np.diff(sims) <= 0.0))
+
+    def test_query_near_duplicate(self):
+        """Near-duplicates should be found by top-k and threshold queries"""
+        forest = LSHForest(num_trees=8).fit(self.sigs)
+        indices, _ = forest.query(self.sigs[0], k=2)
+        self.assertEqual({0, 50}, set(indices))
+        indices, sims = forest.query_threshold(self.sigs[0], 0.8)
+        self.assertEqual({0, 50}, set(indices))
+        self.assertTrue(np.all(sims >= 0.8))
+
+    def test_save_load(self):
+        """Memory-mapped index should answer queries like the original"""
+        forest = LSHForest(num_trees=4, depth=8, seed=1).fit(self.sigs)
+        tmpdir = tempfile.mkdtemp()
+        try:
+            forest.save(tmpdir)
+            loaded = LSHForest.load(tmpdir)
+            self.assertEqual(len(forest), len(loaded))
+            self.assertEqual(forest.depth, loaded.depth)
+            self.assertIsInstance(loaded.keys, np.memmap)
+            for idx in (0, 5, 20):
+                expected = forest.query(self.sigs[idx], k=3)
+                actual = loaded.query(self.sigs[idx], k=3)
+                self.assertEqual(list(expected[0]), list(actual[0]))
+                self.assertEqual(list(expected[1]), list(actual[1]))
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,6 @@
 import unittest
 import random
+from lsh_hdc import HASH_FUNC_TABLE, create_hash_factory, hash_many
 from lsh_hdc.hashes import XORHashFamily, MultiplyHashFamily
 
 
@@ -21,3 +22,15 @@ class TestHashes(unittest.TestCase):
         value = random.randint(0, 2 ** 32 - 1)
         results = list(mh.hashn(value))
         self.assertEqual(1, len(set(results)))
+
+    def test_hash_many(self):
+        """Batch hashing should agree with scalar hash functions
+        """
+        values = ['abc', '', 'xyz' * 10, ('a', 'b'), 12345]
+        for name, (hashfun, complex_types) in HASH_FUNC_TABLE.iteritems():
+            for seed in (0, 42):
+                fun = create_hash_factory(hashfun, complex_types)(seed)
+                expected = [fun(value) for value in values]
+                actual = hash_many(values, seed=seed, hashfun=name)
+                self.assertEqual(len(values), len(actual))
+                self.assertEqual(expected, actual.tolist(), name)
@@ -106,3 +106,20 @@ def test_linear_sum_assignment_input_validation():
                        linear_sum_assignment(np.asarray(C)))
     assert_array_equal(linear_sum_assignment(C),
                        linear_sum_assignment(np.matrix(C)))
+
+
+def test_linear_sum_assignment_random():
+    random_state = np.random.RandomState(0)
+    for idx in xrange(200):
+        n, m = random_state.randint(1, 12, size=2)
+        if idx % 2:
+            # integer costs with many ties
+            cost_matrix = random_state.randint(0, 5, size=(n, m))
+        else:
+            cost_matrix = random_state.rand(n, m)
+        row_ind, col_ind = linear_sum_assignment(cost_matrix)
+        assert_equal(min(n, m), len(row_ind))
+        assert_array_equal(row_ind, np.sort(row_ind))
+        assert_equal(len(col_ind), len(set(col_ind)))
+        assert_almost_equal(assignment_cost(cost_matrix),
+                            cost_matrix[row_ind, col_ind].sum())
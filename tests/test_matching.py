@@ -0,0 +1,58 @@
+import numpy as np
+from nose.tools import assert_equal, assert_almost_equal
+from lsh_hdc.entropy import assignment_cost
+from lsh_hdc.matching import sparse_max_weight_matching, sparse_assignment_cost
+from lsh_hdc.metrics import ClusteringMetrics
+
+
+def _random_sparse(random_state, num_rows, num_cols, density):
+    dense = random_state.randint(1, 20, size=(num_rows, num_cols))
+    dense[random_state.rand(num_rows, num_cols) > density] = 0
+    row_idx, col_idx = np.nonzero(dense)
+    return dense, dense[row_idx, col_idx], row_idx, col_idx
+
+
+def test_sparse_matching_vs_dense():
+    """Sparse matching should find the same cost as dense Hungarian solver
+    """
+    random_state = np.random.RandomState(0)
+    for num_rows, num_cols, density in [(5, 5, 0.5), (12, 7, 0.3),
+                                        (7, 12, 0.3), (30, 30, 0.1),
+                                        (40, 25, 0.6)]:
+        dense, weights, row_idx, col_idx = _random_sparse(
+            random_state, num_rows, num_cols, density)
+        expected = assignment_cost(dense, maximize=True)
+        rows, cols = sparse_max_weight_matching(weights, row_idx, col_idx)
+        assert_equal(len(set(cols)), len(cols))
+        assert_equal(expected, dense[rows, cols].sum())
+        for dense_limit in [0, 10 ** 6]:
+            assert_almost_equal(expected, sparse_assignment_cost(
+                weights, row_idx, col_idx, dense_limit=dense_limit))
+
+
+def test_sparse_assignment_parallel():
+    """Components solved in worker processes should add up to the same cost
+    """
+    random_state = np.random.RandomState(1)
+    dense = np.zeros((60, 60), dtype=np.int64)
+    for start in xrange(0, 60, 10):
+        block, _, _, _ = _random_sparse(random_state, 10, 10, 0.4)
+        dense[start:start + 10, start:start + 10] = block
+    row_idx, col_idx = np.nonzero(dense)
+    weights = dense[row_idx, col_idx]
+    expected = assignment_cost(dense, maximize=True)
+    assert_almost_equal(expected, sparse_assignment_cost(
+        weights, row_idx, col_idx, dense_limit=0, num_procs=2))
+
+
+def test_assignment_score_sparse():
+    """Assignment score of a large sparse table
+    """
+    random_state = np.random.RandomState(2)
+    ltrue = random_state.randint(0, 500, size=2000)
+    lpred = np.where(random_state.rand(2000) < 0.8, ltrue,
+                     random_state.randint(0, 500, size=2000))
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    score = cm.assignment_score(normalize=False, model=None)
+    assert_equal(type(score), int)
+    assert_equal(score, assignment_cost(cm.to_rows(), maximize=True))
@@ -3,14 +3,19 @@ import numpy as np
 from numpy.testing import assert_array_almost_equal
 from math import sqrt
 from itertools import izip
+from StringIO import StringIO
 from nose.tools import assert_almost_equal, assert_true, assert_equal, assert_greater
 from lsh_hdc.metrics import adjusted_rand_score, \
     homogeneity_completeness_v_measure, fentropy, \
     jaccard_similarity, ClusteringMetrics, \
     ConfusionMatrix2, gmean, hmean, _div, cohen_kappa, \
     product_moment, mutual_info_score, \
-    adjusted_mutual_info_score, emi_from_margins as emi_cython
+    adjusted_mutual_info_score, emi_from_margins as emi_cython, \
+    crosstab_coo, ContingencyAccumulator, emi_monte_carlo, ConfusionMatrices, \
+    ReferenceLabeling, _batch_summaries, _batch_scores
 from lsh_hdc.fent import emi_from_margins as emi_fortran
+from lsh_hdc.entropy import fsum_pairs, emi_from_margins_fast
+from lsh_hdc.monte_carlo.predictions import Grid
 
 
 def check_with_nans(num1, num2, places=None, msg=None, delta=None, ensure_nans=True):
@@ -159,6 +164,157 @@ def test_adjusted_mutual_info_score():
     assert_almost_equal(ami, 0.37, 2)  # not accurate to more than 2 places
 
 
+def _crosstab_dict(labels_true, labels_pred):
+    """Reference implementation of label co-occurrence counting
+    """
+    result = {}
+    for t, p in izip(labels_true, labels_pred):
+        result[t, p] = result.get((t, p), 0) + 1
+    return result
+
+
+def test_crosstab_coo():
+    """COO counts should not depend on label types or chunking
+    """
+    rng = np.random.RandomState(42)
+    ltrue = rng.randint(0, 50, size=2000)
+    lpred = rng.randint(0, 3000, size=2000)
+    expected = _crosstab_dict(ltrue.tolist(), lpred.tolist())
+    for chunk_size in [7, 100, 10 ** 7]:
+        rows, cols, counts = crosstab_coo(ltrue, lpred, chunk_size=chunk_size)
+        assert_equal(expected, dict(izip(izip(rows.tolist(), cols.tolist()),
+                                         counts.tolist())))
+
+    ltrue = ['a', 1, '1', 'a', (2, 3), 1]
+    lpred = [1.5, 'x', 'x', 1.5, None, 'y']
+    rows, cols, counts = crosstab_coo(ltrue, lpred, chunk_size=4)
+    assert_equal(_crosstab_dict(ltrue, lpred),
+                 dict(izip(izip(rows, cols), counts.tolist())))
+
+
+def test_from_labels_large():
+    """Vectorized table construction should agree with scalar metrics
+    """
+    rng = np.random.RandomState(0)
+    ltrue = rng.randint(0, 20, size=100000)
+    lpred = (ltrue + rng.randint(0, 3, size=100000)) * 7
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    assert_equal(cm.grand_total, 100000)
+    assert_equal(cm.shape, (20, 22))
+    assert_almost_equal(cm.adjusted_mutual_info(),
+                        adjusted_mutual_info_score(ltrue.tolist(), lpred.tolist()))
+    cm2 = ClusteringMetrics.from_labels(iter(ltrue), iter(lpred))
+    assert_almost_equal(cm.adjusted_rand_index(), cm2.adjusted_rand_index())
+
+
+def test_table_summary():
+    """Single-scan summary should agree with per-iterable kernels
+    """
+    rng = np.random.RandomState(2)
+    ltrue = rng.randint(0, 30, size=3000)
+    lpred = ltrue // 3 + rng.randint(0, 5, size=3000)
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    summary = cm.summary()
+    assert_equal(summary.N, cm.grand_total)
+    assert_almost_equal(summary.H_row, fentropy(list(cm.iter_row_totals())))
+    assert_almost_equal(summary.H_col, fentropy(list(cm.iter_col_totals())))
+    assert_almost_equal(summary.H_joint, fentropy(list(cm.itervalues())))
+    assert_almost_equal(summary.cell_pairs, fsum_pairs(list(cm.itervalues())))
+    assert_almost_equal(summary.row_pairs, fsum_pairs(np.array(list(cm.iter_row_totals()))))
+
+    N = float(cm.grand_total)
+    chisq = 0.0
+    for rm, km, observed in cm.iter_all_with_margins():
+        expected = rm * km / N
+        chisq += (observed - expected) ** 2 / expected
+    assert_almost_equal(summary.chisq, chisq, places=6)
+
+    # COO cells are ordered as arguments of from_coo
+    cm2 = ClusteringMetrics.from_coo(*cm.to_coo())
+    assert_equal(cm2.grand_total, cm.grand_total)
+    assert_equal(cm2.shape, cm.shape)
+    assert_almost_equal(cm2.adjusted_rand_index(), cm.adjusted_rand_index())
+
+
+def test_accumulator_chunks():
+    """Accumulating chunks (and merging accumulators) is the same as counting once
+    """
+    rng = np.random.RandomState(1)
+    ltrue = rng.randint(0, 40, size=5000)
+    lpred = ltrue // 2 + rng.randint(0, 4, size=5000)
+    expected = ClusteringMetrics.from_labels(ltrue, lpred)
+
+    acc1 = ContingencyAccumulator(chunk_size=300)
+    acc1.update_from_chunks((ltrue[i:i + 1000], lpred[i:i + 1000])
+                            for i in xrange(0, 3000, 1000))
+    acc2 = ContingencyAccumulator(chunk_size=300)
+    acc2.update_from_files([
+        StringIO(''.join("%d\t%d\n" % pair for pair in izip(ltrue[3000:], lpred[3000:])))
+    ], dtype=int)
+    acc1.merge(acc2)
+    assert_equal(acc1.grand_total, 5000)
+    actual = acc1.to_table()
+    assert_equal(expected.to_rows(), actual.to_rows())
+    assert_almost_equal(expected.adjusted_mutual_info(), actual.adjusted_mutual_info())
+
+
+def test_accumulator_files():
+    """Empty lines should be skipped and lines without delimiter reported
+    """
+    acc = ContingencyAccumulator(chunk_size=2)
+    acc.update_from_files([StringIO("a\tx\n\na\tx\nb\ty\n\n")])
+    assert_equal(acc.grand_total, 3)
+    assert_equal({('a', 'x'): 2, ('b', 'y'): 1}, dict(acc.to_table().iteritems()))
+
+    fhandle = StringIO("a\tx\nb y\n")
+    fhandle.name = 'labels.tsv'
+    try:
+        ContingencyAccumulator().update_from_files([fhandle])
+    except ValueError as exc:
+        assert_true('line 2 of labels.tsv' in str(exc))
+    else:
+        raise AssertionError("ValueError not raised")
+
+
+def test_emi_fast():
+    """Fast EMI should agree with reference implementation
+    """
+    rng = np.random.RandomState(3)
+    for num_rows, num_cols, size in [(3, 3, 17), (20, 30, 500), (100, 5, 2000)]:
+        row_totals = np.bincount(rng.randint(0, num_rows, size=size))
+        col_totals = np.bincount(rng.randint(0, num_cols, size=size))
+        row_totals = row_totals[row_totals > 0].astype(np.int64)
+        col_totals = col_totals[col_totals > 0].astype(np.int64)
+        expected = emi_cython(row_totals, col_totals)
+        assert_almost_equal(emi_from_margins_fast(row_totals, col_totals), expected, places=6)
+        assert_almost_equal(emi_from_margins_fast(row_totals, col_totals, tol=1e-12),
+                            expected, places=4)
+        assert_almost_equal(emi_from_margins_fast(row_totals, col_totals, num_threads=1),
+                            expected, places=6)
+    assert_equal(emi_from_margins_fast([], []), 0.0)
+
+
+def test_ami_approx():
+    """Sampled EMI should be within a few standard errors of exact EMI
+    """
+    rng = np.random.RandomState(4)
+    ltrue = rng.randint(0, 50, size=2000)
+    lpred = np.where(rng.rand(2000) < 0.5, ltrue, rng.randint(0, 300, size=2000))
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    row_totals = np.fromiter(cm.iter_row_totals(), dtype=np.int64)
+    col_totals = np.fromiter(cm.iter_col_totals(), dtype=np.int64)
+    exact_emi = emi_cython(row_totals, col_totals)
+    emi, stderr = emi_monte_carlo(row_totals, col_totals, num_samples=200, num_procs=2)
+    assert_greater(stderr, 0.0)
+    assert_true(abs(emi - exact_emi) < 4 * stderr)
+
+    exact_ami = cm.adjusted_mutual_info()
+    ami, stderr = cm.adjusted_mutual_info(method='approx', num_samples=50,
+                                          return_stderr=True)
+    assert_true(abs(ami - exact_ami) < 4 * stderr)
+    assert_equal(cm.adjusted_mutual_info(return_stderr=True), (exact_ami, 0.0))
+
+
 def test_jaccard_nan():
     """Returns NaN for empty set
     """
@@ -305,6 +461,131 @@ def test_bc_metrics():
     assert_array_almost_equal(cm.muc_scores()[:2], [0.9, 1.0], 4)
 
 
+def test_compute_many():
+    """Batch evaluation should agree with evaluating metrics one by one
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 20, 500)
+    lpred = np.where(rs.rand(500) < 0.7, ltrue, rs.randint(0, 25, 500))
+    metrics = ['split_join_similarity', 'split_join_similarity_m3',
+               'split_join_distance', 'vi_similarity_m2r', 'entropy_scores',
+               'g_score', 'assignment_score_m3', 'adjusted_rand_index',
+               'matthews_corr', 'talburt_wang_index', 'bc_metrics']
+    scores = ClusteringMetrics.from_labels(ltrue, lpred).compute_many(metrics)
+    assert_equal(sorted(scores), sorted(metrics))
+    for metric in metrics:
+        expected = ClusteringMetrics.from_labels(ltrue, lpred).get_score(metric)
+        assert_array_almost_equal(scores[metric], expected, 10)
+
+
+def test_clear_cache():
+    """Clearing cache should discard intermediates and give the same scores
+    """
+    cm = ClusteringMetrics(rows=[[40, 5, 1], [3, 30, 2], [0, 4, 25]])
+    metrics = ['split_join_similarity', 'vi_similarity', 'assignment_score_m3',
+               'adjusted_rand_index']
+    scores = cm.compute_many(metrics)
+    cm.clear_cache()
+    for attr in ['_coo', '_summary', '_maxima', '_assignment_cost', '_pairwise']:
+        assert_true(getattr(cm, attr) is None)
+    assert_equal({}, cm._expected_tables)
+    rescored = cm.compute_many(metrics)
+    for metric in metrics:
+        assert_almost_equal(scores[metric], rescored[metric], 10)
+
+
+def test_reference_labeling():
+    """Scores against a reference should match those of individual tables
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 20, 500)
+    candidates = [np.where(rs.rand(500) < p, ltrue, rs.randint(0, 25, 500))
+                  for p in (0.2, 0.5, 0.9)]
+    metrics = ['vi_similarity', 'entropy_scores', 'split_join_similarity',
+               'assignment_score', 'adjusted_rand_index', 'chisq_score']
+    ref = ReferenceLabeling(ltrue)
+    assert_almost_equal(ref.entropy, fentropy(np.bincount(ltrue)), 10)
+    for lpred in candidates:
+        expected = ClusteringMetrics.from_labels(ltrue, lpred).summary()
+        actual = ref.crosstab(lpred).summary()
+        for field, value in izip(expected._fields, expected):
+            assert_almost_equal(getattr(actual, field), value, 6, msg=field)
+    for num_procs in (1, 2):
+        results = ref.score_many(candidates, metrics, num_procs=num_procs)
+        for lpred, scores in izip(candidates, results):
+            cm = ClusteringMetrics.from_labels(ltrue, lpred)
+            for metric in metrics:
+                assert_array_almost_equal(
+                    scores[metric], cm.get_score(metric), 10)
+
+
+def test_bootstrap():
+    """Bootstrap intervals should be reproducible and cover the estimate
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 10, 400)
+    lpred = np.where(rs.rand(400) < 0.7, ltrue, rs.randint(0, 12, 400))
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    metrics = ['adjusted_rand_index', 'vi_similarity', 'entropy_scores',
+               'split_join_similarity']
+    intervals = cm.bootstrap(metrics, n_boot=100, seed=1)
+    intervals_mp = cm.bootstrap(metrics, n_boot=100, seed=1, num_procs=2)
+    for metric in metrics:
+        low, high = intervals[metric]
+        assert_array_almost_equal(low, intervals_mp[metric][0], 12)
+        assert_array_almost_equal(high, intervals_mp[metric][1], 12)
+        estimate = np.asarray(cm.get_score(metric))
+        assert_true(np.all(low <= estimate) and np.all(estimate <= high))
+
+
+def test_batch_scores():
+    """Batched scores of replicate tables should match per-table scores
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 6, 200)
+    lpred = np.where(rs.rand(200) < 0.6, ltrue, rs.randint(0, 8, 200))
+    row_idx, col_idx, values = ClusteringMetrics.from_labels(ltrue, lpred).to_coo()
+    samples = rs.multinomial(200, values / values.sum(), size=5)
+    metrics = ['chisq_score', 'g_score', 'mutual_info_score', 'entropy_scores',
+               'vi_distance', 'vi_similarity', 'vi_similarity_m2r',
+               'vi_similarity_m2c', 'vi_similarity_m3', 'mirkin_match_coeff',
+               'mirkin_mismatch_coeff', 'adjusted_rand_index', 'rand_index',
+               'fowlkes_mallows', 'adjusted_fowlkes_mallows', 'mic_scores',
+               'split_join_similarity']
+    scores = _batch_scores(ClusteringMetrics, *_batch_summaries(samples, row_idx, col_idx),
+                           metrics=metrics)
+    assert_equal(set(metrics) - {'split_join_similarity'}, set(scores))
+    for idx, sample in enumerate(samples):
+        keep = np.flatnonzero(sample)
+        cm = ClusteringMetrics.from_coo(row_idx[keep], col_idx[keep], sample[keep])
+        for metric in scores:
+            assert_array_almost_equal(scores[metric][idx], cm.get_score(metric), 10)
+
+
+def test_permutation_test():
+    """Permutation test should detect agreement and stop early without it
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 5, 300)
+    lpred = np.where(rs.rand(300) < 0.5, ltrue, rs.randint(0, 5, 300))
+    metrics = ['adjusted_rand_index', 'muc_scores']
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    results = cm.permutation_test(metrics, max_permutations=200)
+    assert_equal(results['adjusted_rand_index'].num_permutations, 200)
+    assert_almost_equal(results['adjusted_rand_index'].p_value, 1.0 / 201)
+    assert_greater(results['adjusted_rand_index'].z_score, 5.0)
+
+    cm = ClusteringMetrics.from_labels(ltrue, rs.randint(0, 5, 300))
+    results = cm.permutation_test(metrics, max_permutations=1000, batch_size=20)
+    results_mp = cm.permutation_test(metrics, max_permutations=1000,
+                                     batch_size=20, num_procs=3)
+    for metric in metrics:
+        assert_greater(1000, results[metric].num_permutations)
+        assert_array_almost_equal(results[metric].p_value,
+                                  results_mp[metric].p_value, 12)
+    assert_greater(results['adjusted_rand_index'].p_value, 0.05)
+
+
 def test_mt_metrics():
     """Table 1 in Vilain et al. (1995)
     """
@@ -410,6 +691,23 @@ def test_IR_example():
     assert_almost_equal(exp_tw, act_tw, 6)
 
 
+def test_expected_table():
+    """Lazy expected tables should agree with materialized ones
+    """
+    rs = np.random.RandomState(0)
+    ltrue = rs.randint(0, 15, 300)
+    lpred = rs.randint(0, 20, 300)
+    cm = ClusteringMetrics.from_labels(ltrue, lpred)
+    for model in ['m1', 'm2r', 'm2c', 'm3']:
+        lazy = cm.expected_table(model)
+        table = cm.expected(model)
+        for (ri, ci), value in table.iteritems():
+            assert_almost_equal(lazy[ri, ci], value, 10)
+        assert_almost_equal(
+            lazy.assignment_cost(),
+            table.assignment_score(model=None, normalize=False), 10)
+
+
 def test_adjustment_for_chance():
     """Check that adjusted scores are almost zero on random labels
     """
@@ -502,6 +800,43 @@ def test_twoway_confusion_phi():
     assert_almost_equal(cm.chisq_score(), 5.50, 2)
 
 
+def test_confusion_matrices():
+    """Vectorized metrics should match those of individual 2x2 tables
+    """
+    rs = np.random.RandomState(0)
+    # all tables with cells in {0, 1, 2} cover degenerate cases
+    matrices = np.vstack([
+        np.indices((3, 3, 3, 3)).reshape(4, -1).T,
+        rs.randint(0, 100, size=(200, 4))])
+    cms = ConfusionMatrices.from_array(matrices)
+    metrics = ['ACC', 'PLL', 'DOR', 'fscore', 'overlap_coeff',
+               'ochiai_coeff', 'ochiai_coeff_adj', 'informedness',
+               'markedness', 'xcoeff', 'pairwise_hcv', 'kappas',
+               'loevinger_coeff', 'mp_corr', 'matthews_corr', 'yule_q',
+               'yule_y', 'cole_coeff', 'chisq_score', 'entropy_scores']
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for metric in metrics:
+            scores = cms.get_score(metric)
+            for idx, ccw in enumerate(matrices):
+                expected = ConfusionMatrix2.from_ccw(*ccw).get_score(metric)
+                actual = [s[idx] for s in scores] \
+                    if isinstance(scores, tuple) else scores[idx]
+                assert_array_almost_equal(actual, expected, 10)
+
+
+def test_grid_matrices():
+    """Matrix grids should compute both vectorized and inherited scores
+    """
+    grid = Grid.with_matrices(n=20, max_counts=50, seed=0)
+    result = grid.compute(['matthews_corr', 'vi_distance'],
+                          dtype=np.float64)
+    for idx, ccw in enumerate(grid.grid[0]):
+        cm = ConfusionMatrix2.from_ccw(*ccw)
+        check_with_nans(result['matthews_corr'][idx], cm.matthews_corr(), 10)
+        check_with_nans(result['vi_distance'][idx], cm.vi_distance(), 10)
+
+
 def test_kappa_precalculated():
     # from literature
     assert_almost_equal(cohen_kappa(22, 4, 11, 2),
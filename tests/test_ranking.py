@@ -1,9 +1,11 @@
 import numpy as np
 from itertools import chain
 from pymaptools.containers import clusters_to_labels
-from lsh_hdc.ranking import RocCurve, LiftCurve, dist_auc, \
-    aul_score_from_clusters, aul_score_from_labels, roc_auc_score
-from nose.tools import assert_almost_equal
+from lsh_hdc.ranking import RocCurve, LiftCurve, dist_auc, dist_auc_many, \
+    aul_score_from_clusters, aul_score_from_labels, roc_auc_score, \
+    aul_score_from_counts
+from numpy.testing import assert_array_almost_equal
+from nose.tools import assert_almost_equal, assert_equal
 from pymaptools.sample import discrete_sample, random_seed
 from lsh_hdc.monte_carlo.predictions import simulate_clustering
 from sklearn.metrics.ranking import roc_auc_score as auc_sklearn
@@ -42,6 +44,66 @@ def test_simulated():
         assert_almost_equal(expected_score, actual_score, 4)
 
 
+def test_aul_counts():
+    """AUL from counts, including plot series, for known cluster sets
+    """
+    # expected values were obtained with the original pure-Python
+    # implementation of LiftCurve.aul_score
+    clusters = [[1, 1, 0], [1], [0, 0, 1], [0], [1, 1], [0, 1, 1, 1]]
+    counts_pred = [len(cluster) for cluster in clusters]
+    counts_true = [sum(cluster) for cluster in clusters]
+    aul, xs, ys = aul_score_from_counts(counts_true, counts_pred, plot=True)
+    assert_almost_equal(aul, 0.4230769231, 10)
+    assert_almost_equal(aul_score_from_counts(counts_true, counts_pred), aul, 10)
+    assert_almost_equal(LiftCurve.from_clusters(clusters).aul_score(), aul, 10)
+    assert_array_almost_equal(
+        xs, np.array([0, 4, 4, 7, 7, 10, 10, 12, 12, 13, 13, 14]) / 14.0)
+    assert_array_almost_equal(
+        ys, np.array([6, 6, 9, 9, 12, 12, 16, 16, 17, 17, 18, 18]) / 26.0)
+
+    # ties in cluster size, with clusters of size one counted as predicted
+    clusters = [[1, 1], [0, 1], [0, 0], [1], [0], [1, 0, 1], [1, 1, 1]]
+    counts_pred = [len(cluster) for cluster in clusters]
+    counts_true = [sum(cluster) for cluster in clusters]
+    aul, xs, ys = aul_score_from_counts(counts_true, counts_pred, threshold=0,
+                                        plot=True)
+    assert_almost_equal(aul, 0.4183673469, 10)
+    assert_almost_equal(
+        aul_score_from_counts(counts_true, counts_pred, threshold=0), aul, 10)
+    assert_array_almost_equal(
+        xs, np.array([0, 3, 3, 6, 6, 8, 8, 10, 10, 12, 12, 13, 13, 14]) / 14.0)
+    assert_array_almost_equal(
+        ys, np.array([5, 5, 10, 10, 12, 12, 14, 14, 16, 16, 17, 17, 18, 18]) / 28.0)
+
+    # clusters grouped by size should give the same curve
+    lc_aul, lc_xs, lc_ys = LiftCurve.from_clusters(iter(clusters)).aul_score(
+        threshold=0, plot=True)
+    assert_almost_equal(lc_aul, aul, 10)
+    assert_array_almost_equal(lc_xs, xs)
+    assert_array_almost_equal(lc_ys, ys)
+
+
+def test_roc_counts():
+    """ROC curve from per-size counts should match one from all points
+    """
+    clusters = [[1, 1, 0], [1], [0, 0, 1], [0], [1, 1], [0, 1, 1, 1]]
+    y_true = [point for cluster in clusters for point in cluster]
+    y_score = [len(cluster) for cluster in clusters for _ in cluster]
+    rc1 = RocCurve.from_clusters(clusters)
+    rc2 = RocCurve.from_labels(y_true, y_score)
+    assert_array_almost_equal(rc1.fprs, rc2.fprs)
+    assert_array_almost_equal(rc1.tprs, rc2.tprs)
+    assert_equal(len(rc1.fprs), 5)
+    assert_almost_equal(rc1.auc_score(), auc_sklearn(y_true, y_score), 10)
+
+    # scoring methods that only work on scalars
+    def informedness(fpr, tpr):
+        return max(tpr - fpr, 0.0)
+
+    assert_almost_equal(rc1.optimal_cutoff(informedness)[1],
+                        rc1.max_informedness(), 10)
+
+
 def _auc(fpr, tpr, reorder=False):
     """Compute area under ROC curve
 
@@ -293,3 +355,23 @@ def test_scores_5():
     scores1 = [25, 40, 50, 60]
     auc = dist_auc(scores0, scores1)
     assert_almost_equal(auc, 0.8125, 4)
+
+
+def test_scores_many():
+    """Batched AUC equals AUC computed column by column
+    """
+    nan = float('nan')
+    scores0 = [[10, 10, 10, 1],
+               [20, 20, 20, 2],
+               [30, 30, 30, 2],
+               [33, nan, 45, nan]]
+    scores1 = [[36, nan, nan, 2],
+               [40, 40, 40, 2],
+               [50, 50, 50, 3],
+               [60, 60, 60, nan]]
+    aucs = dist_auc_many(scores0, scores1)
+    assert_array_almost_equal(aucs, [1.0, 0.875, 0.8646, 0.7083], 4)
+    for idx, auc in enumerate(aucs):
+        expected = dist_auc([row[idx] for row in scores0],
+                            [row[idx] for row in scores1])
+        assert_almost_equal(auc, expected, 10)
@@ -1,8 +1,9 @@
 # -*- coding: utf-8 -*-
 import unittest
+from math import log1p
 from pymaptools.bitwise import hamming
 from lsh_hdc import MinHashSignature, SimHashSignature, \
-    MinHashSketchSignature, Shingler
+    MinHashSketchSignature, Shingler, FeatureHashContext
 from lsh_hdc.metrics import jaccard_similarity
 from lsh_hdc.utils import randset, sigsim
 from lsh_hdc.preprocess import RegexTokenizer
@@ -38,6 +39,81 @@ class TestSig(unittest.TestCase):
         s = randset()
         self.assertEqual(mh.get_signature(s), mh.get_signature(s))
 
+    def test_universal_signature(self):
+        """Universal permutations should give consistent signatures"""
+        for kmin in (1, 3):
+            mh = MinHashSignature(10 * 9, kmin=kmin, permutations='universal')
+            s = randset()
+            sig = mh.get_signature(s)
+            self.assertEqual(90, len(sig))
+            self.assertEqual(sig, mh.get_signature(s))
+            self.assertEqual(90, len(mh.get_signature([])))
+
+    def test_universal_minhash_kmin(self):
+        """k smallest hashes from universal permutations should be sorted"""
+        mh = MinHashSignature(8, kmin=4, permutations='universal')
+        minhashes = mh._get_minhashes(["a", "b", "c", "d", "e", "f"])
+        for idx in xrange(0, 8, 4):
+            group = minhashes[idx:idx + 4]
+            self.assertEqual(sorted(group), group)
+        # fewer features than kmin fills with last value
+        minhashes = mh._get_minhashes(["a", "b"])
+        self.assertEqual(minhashes[1], minhashes[3])
+
+    def test_universal_similarity(self):
+        """Universal permutations should estimate Jaccard similarity"""
+        mh = MinHashSignature(400, permutations='universal', seed=1)
+        a = set(xrange(0, 100))
+        b = set(xrange(50, 150))
+        sig1 = mh._get_minhashes(a)
+        sig2 = mh._get_minhashes(b)
+        sim = sum(x == y for x, y in zip(sig1, sig2)) / 400.0
+        self.assertAlmostEqual(jaccard_similarity(a, b), sim, delta=0.1)
+        self.assertNotEqual(sig1, MinHashSignature(
+            400, permutations='universal', seed=2)._get_minhashes(a))
+
+    def test_signature_from_hashes(self):
+        """Signatures from cached base hashes should match direct ones"""
+        shingler = Shingler(span=3)
+        features = shingler.get_shingles("the quick brown fox jumps".split())
+        ctx = FeatureHashContext()
+        base_hashes = ctx.hash_features(features)
+        for kmin in (1, 2):
+            mh = MinHashSignature(12, kmin=kmin, seed=7, permutations='universal')
+            self.assertEqual(mh.get_signature(features),
+                             mh.get_signature_from_hashes(base_hashes))
+        mh = MinHashSketchSignature(32, seed=7, permutations='universal')
+        self.assertEqual(mh.get_signature(features),
+                         mh.get_signature_from_hashes(base_hashes))
+
+    def test_hashfun_signature_from_hashes(self):
+        """Seeded hashes derived from base hashes should estimate Jaccard"""
+        ctx = FeatureHashContext()
+        a = set(xrange(0, 100))
+        b = set(xrange(30, 130))
+        for kmin in (1, 2):
+            mh = MinHashSignature(400, kmin=kmin, seed=7)
+            sig1 = mh._minhashes_from_hashes(ctx.hash_features(sorted(a)))
+            sig2 = mh._minhashes_from_hashes(ctx.hash_features(sorted(b)))
+            self.assertEqual(400, len(sig1))
+            sim = sum(x == y for x, y in zip(sig1, sig2)) / 400.0
+            self.assertAlmostEqual(jaccard_similarity(a, b), sim, delta=0.1)
+        self.assertEqual(
+            MinHashSignature(12, seed=7).get_signature_from_hashes(ctx.hash_features([])),
+            MinHashSignature(12, seed=7).get_signature_from_hashes(ctx.hash_features([])))
+
+    def test_simhash_from_hashes(self):
+        """SimHash from base hashes should reflect feature overlap"""
+        ctx = FeatureHashContext()
+        sh = SimHashSignature(128)
+        features1 = list("abcdefghijklmnop")
+        features2 = list("abcdefghijklmnoq")
+        features3 = list("qrstuvwxyz012345")
+        sigs = [sh.get_signature_from_hashes(ctx.hash_features(f), [1.0] * len(f))
+                for f in (features1, features2, features3)]
+        self.assertLess(hamming(sigs[0], sigs[1]), hamming(sigs[0], sigs[2]))
+        self.assertEqual(0, sh.get_signature_from_hashes(ctx.hash_features([]), []))
+
     def test_simhash64_1(self):
         sh = SimHashSignature(64)
         sig1 = sh.get_signature("")
@@ -79,6 +155,26 @@ class TestSig(unittest.TestCase):
         sig6 = sh.get_signature(str2)
         self.assertNotEqual(sig5, sig6)
 
+    def test_simhash_wide(self):
+        """Wide SimHash signatures should be consistent and bounded"""
+        for bit_depth in (200, 256, 512):
+            sh = SimHashSignature(bit_depth)
+            sig1 = sh.get_signature("abracadabra")
+            self.assertEqual(sig1, sh.get_signature("abracadabra"))
+            self.assertLess(sig1, 1 << bit_depth)
+            self.assertEqual(0, sh.get_signature(""))
+            sig2 = sh.get_signature("abracadabrx")
+            sig3 = sh.get_signature("xyzuvwpqrst")
+            self.assertLess(hamming(sig1, sig2), hamming(sig1, sig3))
+
+    def test_simhash_wide_scalar(self):
+        """Scalar wide hash should agree with the batch version"""
+        sh = SimHashSignature(256, seed=5)
+        sig1 = sh.get_signature(["ab", "cd"])
+        sig2 = sh._sig_with_weights([sh.hashfun("ab", 5), sh.hashfun("cd", 5)],
+                                    [log1p(2), log1p(2)])
+        self.assertEqual(sig1, sig2)
+
     def test_simhash_similarity_1(self):
         sh = SimHashSignature(64)
         sig1 = sh.get_signature("abracadabra")
@@ -0,0 +1,40 @@
+import random
+import unittest
+import numpy as np
+from lsh_hdc.store import ShingleStore, sorted_jaccard
+from lsh_hdc.metrics import jaccard_similarity
+from lsh_hdc.utils import randset
+
+
+class TestStore(unittest.TestCase):
+
+    def test_jaccard_exact(self):
+        """Stored Jaccard similarity should equal set Jaccard similarity"""
+        random.seed(0)
+        store = ShingleStore(hashfun='builtin', capacity=4)
+        sets = [randset(value_range=(0, 100), sample_range=(1, 50))
+                for _ in xrange(100)]
+        for idx, s in enumerate(sets):
+            store.add(idx, s)
+        self.assertEqual(100, len(store))
+        for i, j in zip(xrange(0, 100, 2), xrange(1, 100, 2)):
+            self.assertAlmostEqual(jaccard_similarity(sets[i], sets[j]),
+                                   store.jaccard(i, j))
+
+    def test_sorted_unique(self):
+        """Stored hashes should be sorted and unique"""
+        store = ShingleStore(hashfun='builtin')
+        store.add('a', ['x', 'y', 'x', 'z'])
+        hashes = store.get('a')
+        self.assertEqual(3, len(hashes))
+        self.assertEqual(sorted(set(hashes)), list(hashes))
+
+    def test_empty(self):
+        """Empty sets should be identical"""
+        empty = np.array([], dtype=np.uint64)
+        self.assertEqual(1.0, sorted_jaccard(empty, empty))
+        self.assertEqual(0.0, sorted_jaccard(empty, np.array([1], dtype=np.uint64)))
+
+
+if __name__ == '__main__':
+    unittest.main()